@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_follow_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notification_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
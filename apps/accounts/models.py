@@ -38,6 +38,13 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized follow counters, maintained by followUser/unfollowUser and
+    # repaired by `manage.py reconcile_follow_counters`
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Unread notification groups, maintained by apps.social.notifications
+    unread_notification_count = models.PositiveIntegerField(default=0)
+
     USERNAME_FIELD = "username"
     REQUIRED_FIELDS = ["email"]
 
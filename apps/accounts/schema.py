@@ -4,6 +4,8 @@ from django.contrib.auth import get_user_model
 from graphql_jwt.utils import jwt_encode
 from graphql_jwt import ObtainJSONWebToken, Verify, Refresh
 
+from apps.posts import aio
+
 User = get_user_model()
 
 
@@ -13,7 +15,7 @@ User = get_user_model()
 class UserType(DjangoObjectType):
     class Meta:
         model = User
-        fields = ("id", "username", "email", "is_active")
+        fields = ("id", "username", "email", "is_active", "follower_count", "following_count")
 
 
 # -----------------------------
@@ -60,4 +62,5 @@ class AuthQuery(graphene.ObjectType):
         user = info.context.user
         if user.is_anonymous:
             raise Exception("Authentication required")
-        return user
+        # The full row; a JWT request's user is only a snapshot until loaded (see social_feed.auth)
+        return aio.fetch_one(info, User.objects, pk=user.id)
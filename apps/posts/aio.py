@@ -0,0 +1,85 @@
+# apps/posts/aio.py
+"""
+Dual-mode resolver helpers.
+
+The same schema is executed synchronously behind WSGI and asynchronously behind
+ASGI (``social_feed.views.AsyncFeedGraphQLView`` sets ``context.is_async``).
+Resolvers build their querysets as usual and hand the final database call to
+these helpers: under WSGI the call runs inline, under ASGI it returns an
+awaitable that uses Django's async ORM, so graphql-core can run independent
+root fields concurrently without blocking the event loop.
+"""
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist
+from graphql import OperationType
+
+
+def is_async(info):
+    return getattr(info.context, "is_async", False)
+
+
+def then(result, fn):
+    """Apply ``fn`` to ``result``, awaiting it first if needed (and ``fn``'s result too)."""
+    if inspect.isawaitable(result):
+        async def chain():
+            value = fn(await result)
+            return (await value) if inspect.isawaitable(value) else value
+        return chain()
+    return fn(result)
+
+
+def run(info, fn, *args, **kwargs):
+    """Call the synchronous ``fn``; under ASGI run it on the request's ORM thread."""
+    if is_async(info):
+        return sync_to_async(fn)(*args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+# -------------------------
+# Queryset evaluation
+# -------------------------
+def fetch_all(info, qs):
+    if is_async(info):
+        async def collect():
+            return [obj async for obj in qs]
+        return collect()
+    return list(qs)
+
+
+def fetch_first(info, qs):
+    return qs.afirst() if is_async(info) else qs.first()
+
+
+def fetch_one(info, qs, **lookup):
+    """``qs.get(**lookup)``, or ``None`` when there is no such row."""
+    if is_async(info):
+        async def get():
+            try:
+                return await qs.aget(**lookup)
+            except ObjectDoesNotExist:
+                return None
+        return get()
+    try:
+        return qs.get(**lookup)
+    except ObjectDoesNotExist:
+        return None
+
+
+def fetch_count(info, qs):
+    return qs.acount() if is_async(info) else qs.count()
+
+
+class SyncMutationMiddleware:
+    """
+    Run root mutation resolvers on the request's ORM thread under ASGI.
+
+    Mutations (ours and graphql_jwt's) are written against the sync ORM and
+    transaction API; graphql-core already executes them one at a time.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        if info.path.prev is None and info.operation.operation == OperationType.MUTATION:
+            return sync_to_async(next)(root, info, **kwargs)
+        return next(root, info, **kwargs)
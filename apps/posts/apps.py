@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.posts'
+
+    def ready(self):
+        from .models import Post
+        from .search import on_post_saved
+
+        post_save.connect(on_post_saved, sender=Post, dispatch_uid="posts.search.index_post")
@@ -0,0 +1,209 @@
+# apps/posts/benchmarks.py
+"""
+Query-count, latency and allocation benchmarks (``manage.py benchmark``).
+
+Each scenario is a representative document run through the schema with
+``graphene.test.Client`` against a dataset from ``apps.posts.seeding`` (same
+seed, same rows). Every iteration starts with an empty cache, so what is
+measured is the database path, not the read-through cache. Per scenario:
+
+- ``queries``: the most SQL statements any iteration ran,
+- ``p50_ms`` / ``p99_ms``: latency percentiles over the iterations,
+- ``peak_kib``: peak Python allocations of one extra run under ``tracemalloc``.
+
+``compare`` checks results against stored baselines (one set per database
+vendor): a query count must not grow at all; latency and allocations may grow
+by the given tolerances, since they depend on the machine.
+"""
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+
+from social_feed.schema import schema
+from .models import Post
+from .pagination import encode_cursor
+
+User = get_user_model()
+
+BASELINE_METRICS = ("queries", "p50_ms", "p99_ms", "peak_kib")
+
+
+class Dataset:
+    """Handles on the interesting rows of a seeded database."""
+
+    def __init__(self):
+        self.celebrity = User.objects.order_by("-follower_count", "id").first()
+        self.prolific = (
+            Post.live.values("author_id").order_by().annotate(n=Count("id")).order_by("-n", "author_id").first()
+        )
+        self.prolific_id = self.prolific["author_id"]
+        posts = Post.live.filter(author_id=self.prolific_id).order_by("-created_at", "-id")
+        # A page from the middle of the author's history
+        deep = posts[max(0, self.prolific["n"] // 2 - 1)]
+        self.deep_cursor = encode_cursor(deep.created_at, deep.pk)
+        self.discussed = Post.live.order_by("-comment_count", "id").first()
+        self.viral = Post.live.order_by("-like_count", "id").first()
+        self.likers = list(
+            User.objects.exclude(likes__post=self.viral).exclude(pk=self.viral.author_id).order_by("id")
+        )
+
+
+class Scenario:
+    def __init__(self, name, query, variables=lambda data: {}, user=lambda data, i: None):
+        self.name = name
+        self.query = query
+        self.variables = variables
+        self.user = user
+
+
+SCENARIOS = [
+    Scenario(
+        "global_feed_with_authors",
+        "{ globalFeed(limit: 20) { hasNext items { id content likeCount author { username } } } }",
+    ),
+    Scenario(
+        "deep_author_feed_page",
+        """
+        query($author: UUID!, $after: String) {
+            authorFeed(authorId: $author, limit: 20, after: $after) { endCursor items { id content author { username } } }
+        }
+        """,
+        lambda data: {"author": str(data.prolific_id), "after": data.deep_cursor},
+        lambda data, i: data.celebrity,
+    ),
+    Scenario(
+        "post_with_comment_tree",
+        """
+        query($id: UUID!) {
+            post(id: $id) { content commentCount author { username } }
+            commentTree(postId: $id, depth: 2, limit: 20) {
+                hasMore items { comment { content author { username } } replies { comment { content author { username } } } }
+            }
+        }
+        """,
+        lambda data: {"id": str(data.discussed.id)},
+    ),
+    Scenario(
+        "celebrity_followers",
+        "query($id: UUID!) { followerCount(userId: $id) followers(userId: $id, limit: 50) { hasNext items { username } } }",
+        lambda data: {"id": str(data.celebrity.id)},
+    ),
+    Scenario(
+        # One like per iteration on the same post, each by a new user
+        "like_storm",
+        "mutation($id: UUID!) { likePost(postId: $id) { like { id } } }",
+        lambda data: {"id": str(data.viral.id)},
+        lambda data, i: data.likers[i],
+    ),
+]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _runner(scenario, data):
+    client = Client(schema)
+    variables = scenario.variables(data)
+
+    def run(i):
+        request = RequestFactory().post("/graphql")
+        request.user = scenario.user(data, i) or AnonymousUser()
+        result = client.execute(scenario.query, variables=variables, context_value=request)
+        if result.get("errors"):
+            raise Exception(f"{scenario.name}: {result['errors']}")
+        return result
+
+    return run
+
+
+def measure(scenario, data, iterations):
+    run = _runner(scenario, data)
+    timings, queries = [], []
+
+    cache.clear()
+    run(iterations)  # warm-up (imports, connection, first-time setup)
+    for i in range(iterations):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            run(i)
+            timings.append(time.perf_counter() - started)
+        queries.append(len(ctx.captured_queries))
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        run(iterations + 1)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "queries": max(queries),
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p99_ms": round(_percentile(timings, 99) * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_all(iterations, names=None, progress=None):
+    """``{scenario name: measurements}`` for the seeded database."""
+    data = Dataset()
+    if len(data.likers) < iterations + 2:
+        raise Exception(f"The dataset needs at least {iterations + 2} users who have not liked the most liked post")
+    results = {}
+    for scenario in SCENARIOS:
+        if names and scenario.name not in names:
+            continue
+        results[scenario.name] = measure(scenario, data, iterations)
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return results
+
+
+# -------------------------
+# Baselines
+# -------------------------
+def load_baselines(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(path, baselines):
+    with open(path, "w") as fh:
+        json.dump(baselines, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+
+
+def compare(results, baselines, latency_tolerance=1.0, alloc_tolerance=0.25):
+    """Human-readable regressions of ``results`` against ``baselines`` (empty when none)."""
+    failures = []
+    for name, measured in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        limits = {
+            "queries": baseline["queries"],
+            "p50_ms": baseline["p50_ms"] * (1 + latency_tolerance),
+            "p99_ms": baseline["p99_ms"] * (1 + latency_tolerance),
+            "peak_kib": baseline["peak_kib"] * (1 + alloc_tolerance),
+        }
+        for metric in BASELINE_METRICS:
+            if measured[metric] > limits[metric]:
+                failures.append(f"{name}: {metric} {measured[metric]} > {round(limits[metric], 3)} (baseline {baseline[metric]})")
+    return failures
@@ -0,0 +1,109 @@
+# apps/posts/caching.py
+"""
+Versioned read-through cache for hot post, thread and feed reads.
+
+Every cached value belongs to a scope (``post:<id>``, ``replies:<id>``,
+``comments:<id>``, ``feed:global``) whose current version number is part of the
+cache key. Mutations call ``invalidate()`` with the scopes they touched; bumping
+a version makes the old entries unreachable, so invalidation is precise and
+stale entries simply age out.
+
+Keys also include a digest of the GraphQL selection being resolved, because the
+computed querysets are shaped by ``optimize()`` for that selection.
+
+Hot keys are protected from stampedes: on a miss, only the caller that wins a
+short-lived lock recomputes; others wait briefly for the fresh value.
+
+Engagement counters on cached posts are refreshed by expiry only
+(``POST_CACHE_SECONDS``), so a like storm does not turn into a recompute storm.
+
+Under async execution hits are served inline; only a miss moves to the
+request's ORM thread to run ``compute``.
+
+Requests pinned to the primary after their client's mutation (see
+``social_feed.replicas``) skip the lookup and refill the entry, which a
+client reading from a lagging replica may have filled with older rows.
+"""
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from graphql import print_ast
+
+from social_feed import replicas
+from . import aio
+
+LOCK_SECONDS = 5
+_MISSING = object()
+
+
+def _version_key(scope):
+    return f"ver:{scope}"
+
+
+def _version(scope):
+    version = cache.get(_version_key(scope))
+    if version is None:
+        # Seed from the clock so an evicted version never reuses old keys
+        cache.add(_version_key(scope), time.time_ns(), None)
+        version = cache.get(_version_key(scope))
+    return version
+
+
+def selection_key(info):
+    parts = [print_ast(node) for node in info.field_nodes]
+    parts += [print_ast(fragment) for _, fragment in sorted(info.fragments.items())]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:16]
+
+
+def read_through(info, scope, compute, *key_parts, timeout=None):
+    """Return the cached result of ``compute()`` for ``scope`` and the current selection."""
+    if timeout is None:
+        timeout = getattr(settings, "POST_CACHE_SECONDS", 30)
+    key = ":".join(str(part) for part in (scope, _version(scope), selection_key(info), *key_parts))
+
+    value = _MISSING if replicas.pinned() else cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    if aio.is_async(info):
+        return sync_to_async(_fill)(key, compute, timeout)
+    return _fill(key, compute, timeout)
+
+
+def _fill(key, compute, timeout):
+    lock = f"lock:{key}"
+    if cache.add(lock, 1, LOCK_SECONDS):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock)
+        return value
+
+    # Another request is recomputing this key; wait for its result
+    delay = 0.005
+    deadline = time.monotonic() + LOCK_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        delay = min(delay * 2, 0.1)
+    return compute()
+
+
+def _bump(scopes):
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.add(_version_key(scope), time.time_ns(), None)
+
+
+def invalidate(*scopes):
+    """Bump ``scopes`` once the current transaction commits."""
+    scopes = [scope for scope in scopes if scope]
+    transaction.on_commit(lambda: _bump(scopes))
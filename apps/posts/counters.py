@@ -0,0 +1,62 @@
+# apps/posts/counters.py
+"""
+Denormalized engagement counters on ``Post``.
+
+Mutations adjust counters with single ``UPDATE ... SET x = x + n`` statements so
+concurrent writers never lose increments. ``reconcile`` locks a batch of
+posts, then sets them to their real counts with one ``UPDATE`` whose subqueries
+count the rows. A write that took the lock first has committed by the time the
+counts are read (each statement sees what committed before it started); one that
+comes later waits and applies its delta on top. Either way it is counted once,
+so reconciling is safe while traffic is flowing.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Post, Comment, Like, Share
+
+COUNTER_FIELDS = ("like_count", "share_count", "comment_count", "reply_count")
+
+
+def adjust(post, field, delta):
+    """Add ``delta`` to ``post.<field>``; ``post`` may be an instance or a primary key."""
+    adjust_many([post], field, delta)
+
+
+def adjust_many(posts, field, delta):
+    """``adjust`` for several posts (instances or primary keys) with one UPDATE."""
+    post_ids = [getattr(post, "pk", post) for post in posts]
+    if not post_ids:
+        return
+    qs = Post.objects.filter(pk__in=post_ids)
+    if delta < 0:
+        # never drive a drifted counter below zero
+        qs = qs.filter(**{f"{field}__gte": -delta})
+    qs.update(**{field: F(field) + delta})
+
+    for post in posts:
+        if isinstance(post, Post):
+            setattr(post, field, max(getattr(post, field) + delta, 0))
+
+
+def _count(qs, field):
+    return Coalesce(Subquery(
+        qs.filter(**{field: OuterRef("pk")}).order_by().values(field).annotate(n=Count("*")).values("n")
+    ), 0)
+
+
+def reconcile(post_ids):
+    """Repair counter drift for ``post_ids``; returns the number of posts corrected."""
+    actual = {
+        "like_count": _count(Like.objects, "post"),
+        "share_count": _count(Share.objects, "post"),
+        "comment_count": _count(Comment.live, "post"),
+        "reply_count": _count(Post.live, "reply_to_post"),
+    }
+    drifted = Q()
+    for field, count in actual.items():
+        drifted |= ~Q(**{field: count})
+    with transaction.atomic():
+        list(Post.objects.filter(pk__in=post_ids).order_by("pk").select_for_update().values_list("pk"))
+        return Post.objects.filter(drifted, pk__in=post_ids).update(**actual)
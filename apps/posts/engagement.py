@@ -0,0 +1,191 @@
+# apps/posts/engagement.py
+"""
+Like and share writes, one post or many at a time.
+
+Only live (not soft-deleted) posts the user may see (``apps.posts.visibility``)
+are engaged with; the others are skipped, as missing posts are.
+
+On PostgreSQL each call is a single statement: a data-modifying CTE that picks
+the target posts, upserts the rows with ``INSERT ... ON CONFLICT
+(user_id, post_id) DO UPDATE ... RETURNING``, and bumps the counters of the posts
+that gained a row (``xmax = 0`` marks a fresh insert). Concurrent double-taps
+resolve inside the database: one insert wins, the other becomes an update, and
+the counter moves once. Unlike/unshare are ``DELETE ... RETURNING`` CTEs.
+
+Other databases (SQLite for local work and tests) run the portable sequence:
+one SELECT of the posts, one of the viewer's existing rows, a
+``bulk_create(update_conflicts=True)`` upsert and one counter UPDATE.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.social import notifications
+from . import counters, realtime
+from .models import Post, Like, Share
+from .visibility import visible_sql, visible_to
+
+MAX_BULK_POSTS = 100
+
+_VERBS = {Like: "like", Share: "share"}
+_COUNTERS = {Like: "like_count", Share: "share_count"}
+
+
+def like(user, post_ids, reaction=None):
+    """
+    Like the live, visible posts among ``post_ids``; returns their ``Like`` rows.
+
+    Re-liking refreshes the timestamp and, when ``reaction`` is given, the reaction.
+    """
+    return _upsert(Like, user, post_ids, reaction)
+
+
+def share(user, post_ids):
+    """Share the live, visible posts among ``post_ids`` (re-sharing refreshes the timestamp)."""
+    return _upsert(Share, user, post_ids)
+
+
+def unlike(user, post_ids):
+    """Remove the user's likes on ``post_ids``; returns the ids that were liked."""
+    return _remove(Like, user, post_ids)
+
+
+def unshare(user, post_ids):
+    """Remove the user's shares of ``post_ids``; returns the ids that were shared."""
+    return _remove(Share, user, post_ids)
+
+
+def _check_size(post_ids):
+    post_ids = list(dict.fromkeys(post_ids))
+    if len(post_ids) > MAX_BULK_POSTS:
+        raise Exception(f"At most {MAX_BULK_POSTS} posts per call")
+    return post_ids
+
+
+def _upsert(model, user, post_ids, reaction=None):
+    post_ids = _check_size(post_ids)
+    if not post_ids:
+        return []
+    upsert = _upsert_postgres if connection.vendor == "postgresql" else _upsert_portable
+    rows, added = upsert(model, user, post_ids, reaction)
+
+    # `added` maps post id -> author id for posts that gained a row
+    for post_id, author_id in added.items():
+        realtime.engagement_changed(post_id)
+        notifications.notify(author_id, _VERBS[model], user.id, post_id)
+    return rows
+
+
+def _remove(model, user, post_ids):
+    post_ids = _check_size(post_ids)
+    if not post_ids:
+        return []
+    remove = _remove_postgres if connection.vendor == "postgresql" else _remove_portable
+    removed = remove(model, user, post_ids)
+    for post_id in removed:
+        realtime.engagement_changed(post_id)
+    return removed
+
+
+def _row(model, user, **values):
+    row = model(user=user, **values)
+    row._state.adding = False
+    row._state.db = connection.alias
+    return row
+
+
+# -------------------------
+# PostgreSQL: one statement per call
+# -------------------------
+def _upsert_postgres(model, user, post_ids, reaction):
+    table, posts, counter = model._meta.db_table, Post._meta.db_table, _COUNTERS[model]
+    is_like = model is Like
+    columns = "user_id, post_id, created_at" + (", reaction" if is_like else "")
+    values = "%(user)s::uuid, t.id, %(now)s" + (", COALESCE(%(reaction)s, 'like')" if is_like else "")
+    updates = "created_at = EXCLUDED.created_at" + (
+        f", reaction = COALESCE(%(reaction)s, {table}.reaction)" if is_like else ""
+    )
+    sql = f"""
+        WITH target AS (
+            SELECT id, author_id FROM {posts} p
+            WHERE id = ANY(%(ids)s::uuid[]) AND deleted_at IS NULL AND {visible_sql("p", "%(user)s::uuid")}
+        ), upserted AS (
+            INSERT INTO {table} ({columns})
+            SELECT {values} FROM target t
+            ON CONFLICT (user_id, post_id) DO UPDATE SET {updates}
+            RETURNING id, post_id, created_at, {"reaction" if is_like else "NULL"} AS reaction, (xmax = 0) AS inserted
+        ), bumped AS (
+            UPDATE {posts} p SET {counter} = p.{counter} + 1
+            FROM upserted u WHERE p.id = u.post_id AND u.inserted
+        )
+        SELECT u.id, u.post_id, u.created_at, u.reaction, u.inserted, t.author_id
+        FROM upserted u JOIN target t ON t.id = u.post_id
+    """
+    params = {"user": str(user.pk), "ids": [str(pk) for pk in post_ids], "now": timezone.now(), "reaction": reaction}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        result = cursor.fetchall()
+
+    rows, added = [], {}
+    for pk, post_id, created_at, row_reaction, inserted, author_id in result:
+        values = {"id": pk, "post_id": post_id, "created_at": created_at}
+        if is_like:
+            values["reaction"] = row_reaction
+        rows.append(_row(model, user, **values))
+        if inserted:
+            added[post_id] = author_id
+    return rows, added
+
+
+def _remove_postgres(model, user, post_ids):
+    table, posts, counter = model._meta.db_table, Post._meta.db_table, _COUNTERS[model]
+    sql = f"""
+        WITH removed AS (
+            DELETE FROM {table} WHERE user_id = %(user)s::uuid AND post_id = ANY(%(ids)s::uuid[])
+            RETURNING post_id
+        ), bumped AS (
+            UPDATE {posts} p SET {counter} = p.{counter} - 1
+            FROM removed r WHERE p.id = r.post_id AND p.{counter} > 0
+        )
+        SELECT post_id FROM removed
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"user": str(user.pk), "ids": [str(pk) for pk in post_ids]})
+        return [post_id for (post_id,) in cursor.fetchall()]
+
+
+# -------------------------
+# Portable fallback
+# -------------------------
+def _upsert_portable(model, user, post_ids, reaction):
+    is_like = model is Like
+    with transaction.atomic():
+        posts = list(Post.live.filter(visible_to(user.pk), id__in=post_ids))
+        if not posts:
+            return [], {}
+        existing = model.objects.filter(user=user, post__in=posts)
+        existing = dict(existing.values_list("post_id", "reaction")) if is_like else set(existing.values_list("post_id", flat=True))
+
+        now = timezone.now()
+        rows = [model(user=user, post=post, created_at=now) for post in posts]
+        if is_like:
+            for row in rows:
+                row.reaction = reaction or existing.get(row.post_id) or "like"
+        model.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["user", "post"],
+            update_fields=["reaction", "created_at"] if is_like else ["created_at"],
+        )
+
+        added = [post for post in posts if post.id not in existing]
+        counters.adjust_many(added, _COUNTERS[model], 1)
+    return rows, {post.id: post.author_id for post in added}
+
+
+def _remove_portable(model, user, post_ids):
+    with transaction.atomic():
+        removed = list(model.objects.filter(user=user, post_id__in=post_ids).values_list("post_id", flat=True))
+        if removed:
+            model.objects.filter(user=user, post_id__in=removed).delete()
+            counters.adjust_many(removed, _COUNTERS[model], -1)
+    return removed
@@ -0,0 +1,195 @@
+# apps/posts/loaders.py
+"""
+Per-request batching loaders for GraphQL relations.
+
+Resolvers run synchronously, so a loader cannot wait for sibling resolvers to
+ask for their keys. Instead, every list of model instances handed to GraphQL is
+passed through ``Loaders.track``, which queues the foreign keys those rows will
+need. The first ``load()`` that misses fetches the whole queue with one
+``IN (...)`` query, so each relation costs one query per level of the document.
+
+Under async execution a miss is loaded on the request's ORM thread while other
+resolvers keep queueing keys, so the queue is guarded by a lock.
+"""
+import threading
+from collections import defaultdict
+from functools import cached_property
+
+from django.contrib.auth import get_user_model
+
+from apps.social.models import Follow, Notification
+from . import aio
+from .models import Post, Comment, Like, Share
+from .pagination import first_per_parent, nested_list_size
+
+User = get_user_model()
+
+
+class BatchLoader:
+    def __init__(self, batch_load_fn, many=False):
+        # batch_load_fn(keys) -> {key: value}; missing keys resolve to None (or [] when many)
+        self.batch_load_fn = batch_load_fn
+        self.many = many
+        self._cache = {}
+        self._queue = set()
+        self._lock = threading.Lock()
+
+    def enqueue(self, keys):
+        with self._lock:
+            for key in keys:
+                if key is not None and key not in self._cache:
+                    self._queue.add(key)
+
+    def is_loaded(self, key):
+        return key is None or key in self._cache
+
+    def prime(self, key, value):
+        self._cache.setdefault(key, value)
+
+    def load(self, key):
+        if key is None:
+            return None
+        if key not in self._cache:
+            with self._lock:
+                keys = {k for k in self._queue if k not in self._cache} | {key}
+                self._queue = set()
+            found = self.batch_load_fn(keys)
+            for k in keys:
+                self._cache[k] = found.get(k, [] if self.many else None)
+        return self._cache[key]
+
+
+class Loaders:
+    def __init__(self, viewer=None):
+        self.viewer = viewer
+        self.users = BatchLoader(self._load_users)
+        self.posts = BatchLoader(self._load_posts)
+        self.comments = BatchLoader(self._load_comments)
+        self.replies_by_post = BatchLoader(self._load_post_replies, many=True)
+        self.replies_by_comment = BatchLoader(self._load_comment_replies, many=True)
+        # The viewer's own engagement, keyed by post id
+        self.viewer_reactions = BatchLoader(self._load_viewer_reactions)
+        self.viewer_shares = BatchLoader(self._load_viewer_shares)
+        # Whether the viewer follows an author, keyed by author id
+        self.viewer_follows = BatchLoader(self._load_viewer_follows)
+
+    @cached_property
+    def viewer_id(self):
+        # Read on first use, so a JWT is only verified when a field needs the viewer
+        viewer = self.viewer
+        return viewer.pk if viewer is not None and viewer.is_authenticated else None
+
+    # -------------------------
+    # Key tracking
+    # -------------------------
+    def track(self, objs):
+        """Queue the relation keys of ``objs`` and return them as a list."""
+        objs = list(objs)
+        for obj in objs:
+            if isinstance(obj, Post):
+                self.posts.prime(obj.id, obj)
+                self.users.enqueue([obj.author_id])
+                self.posts.enqueue([obj.reply_to_post_id])
+                self.replies_by_post.enqueue([obj.id])
+                self.viewer_reactions.enqueue([obj.id])
+                self.viewer_shares.enqueue([obj.id])
+            elif isinstance(obj, Comment):
+                self.comments.prime(obj.id, obj)
+                self.users.enqueue([obj.author_id])
+                self.posts.enqueue([obj.post_id])
+                self.comments.enqueue([obj.parent_comment_id])
+                self.replies_by_comment.enqueue([obj.id])
+            elif isinstance(obj, (Like, Share)):
+                self.users.enqueue([obj.user_id])
+                self.posts.enqueue([obj.post_id])
+            elif isinstance(obj, Follow):
+                self.users.enqueue([obj.follower_id, obj.followed_id])
+            elif isinstance(obj, Notification):
+                self.users.enqueue([obj.actor_id, *obj.actor_ids])
+                self.posts.enqueue([obj.target_id])
+        return objs
+
+    # -------------------------
+    # Batch functions
+    # -------------------------
+    def _load_users(self, keys):
+        return User.objects.in_bulk(keys)
+
+    def _load_posts(self, keys):
+        posts = Post.live.in_bulk(keys)
+        self.track(posts.values())
+        return posts
+
+    def _load_comments(self, keys):
+        comments = Comment.live.in_bulk(keys)
+        self.track(comments.values())
+        return comments
+
+    def _load_post_replies(self, keys):
+        qs = first_per_parent(Post.live.filter(reply_to_post_id__in=keys), "reply_to_post_id", nested_list_size())
+        return _group(self.track(qs), "reply_to_post_id")
+
+    def _load_comment_replies(self, keys):
+        qs = first_per_parent(Comment.live.filter(parent_comment_id__in=keys), "parent_comment_id", nested_list_size())
+        return _group(self.track(qs), "parent_comment_id")
+
+
+    def _load_viewer_reactions(self, keys):
+        if self.viewer_id is None:
+            return {}
+        return dict(Like.objects.filter(user_id=self.viewer_id, post_id__in=keys).values_list("post_id", "reaction"))
+
+    def _load_viewer_shares(self, keys):
+        if self.viewer_id is None:
+            return {}
+        return dict.fromkeys(Share.objects.filter(user_id=self.viewer_id, post_id__in=keys).values_list("post_id", flat=True), True)
+
+
+    def _load_viewer_follows(self, keys):
+        if self.viewer_id is None:
+            return {}
+        return dict.fromkeys(Follow.objects.filter(follower_id=self.viewer_id, followed_id__in=keys).values_list("followed_id", flat=True), True)
+
+
+def _group(objs, attr):
+    grouped = defaultdict(list)
+    for obj in objs:
+        grouped[getattr(obj, attr)].append(obj)
+    return grouped
+
+
+def load_one(info, obj, field_name, loader_name):
+    """Resolve a forward relation, reusing a ``select_related`` row when present."""
+    field = obj._meta.get_field(field_name)
+    if field.is_cached(obj):
+        return getattr(obj, field_name)
+    return _load(info, getattr(get_loaders(info), loader_name), getattr(obj, field.attname))
+
+
+def load_many(info, obj, accessor, loader_name):
+    """Resolve a reverse relation, reusing a ``prefetch_related`` result when present."""
+    prefetched = getattr(obj, "_prefetched_objects_cache", {}).get(accessor)
+    if prefetched is not None:
+        return get_loaders(info).track(prefetched)
+    return _load(info, getattr(get_loaders(info), loader_name), obj.pk)
+
+
+def load_key(info, loader_name, key):
+    """Resolve a bare ``key`` (not a model field) through the named loader."""
+    return _load(info, getattr(get_loaders(info), loader_name), key)
+
+
+def _load(info, loader, key):
+    if loader.is_loaded(key):
+        return loader.load(key)
+    return aio.run(info, loader.load, key)
+
+
+def get_loaders(info):
+    """Return the loader registry for the current request, creating it on first use."""
+    context = info.context
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = Loaders(getattr(context, "user", None))
+        context.loaders = loaders
+    return loaders
@@ -0,0 +1,81 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_databases, teardown_databases
+
+from apps.posts import benchmarks
+from apps.posts.seeding import Plan, generate
+
+BASELINES = os.path.join(os.path.dirname(benchmarks.__file__), "benchmark_baselines.json")
+
+# Dataset at --scale 1
+DATASET = {"users": 2000, "posts": 20000, "comments": 10000, "likes": 40000, "shares": 2000, "follows": 20}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and measure query counts, latency and allocations of representative "
+        "GraphQL documents; fails when a stored baseline is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenarios", nargs="*", help="Run only these scenarios")
+        parser.add_argument("--scale", type=float, default=1.0, help="Multiply the dataset size")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--baselines", default=BASELINES)
+        parser.add_argument("--update", action="store_true", help="Store the results as the new baselines")
+        parser.add_argument("--latency-tolerance", type=float, default=1.0, help="Allowed p50/p99 growth (1.0 = up to twice the baseline)")
+        parser.add_argument("--alloc-tolerance", type=float, default=0.25, help="Allowed peak allocation growth")
+
+    def handle(self, *args, scenarios, scale, seed, iterations, **options):
+        dataset = {kind: int(size * scale) for kind, size in DATASET.items()}
+        dataset["follows"] = DATASET["follows"]
+        names = {scenario.name for scenario in benchmarks.SCENARIOS}
+        if set(scenarios) - names:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(set(scenarios) - names))}")
+
+        # Never touch the configured database: seed a test database, as the test runner does
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            vendor = connection.vendor
+            self.stdout.write(f"Seeding {vendor} test database: {dataset}")
+            generate(Plan(**dataset, seed=seed))
+
+            self.stdout.write(f"{'scenario':<28}{'queries':>8}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>10}")
+            with transaction.atomic():
+                results = benchmarks.run_all(iterations, set(scenarios), progress=self.report)
+                transaction.set_rollback(True)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        stored = benchmarks.load_baselines(options["baselines"])
+        params = {"dataset": dataset, "seed": seed, "iterations": iterations}
+        if options["update"]:
+            entry = stored.get(vendor, {"scenarios": {}})
+            stored[vendor] = {**params, "scenarios": {**entry.get("scenarios", {}), **results}}
+            benchmarks.save_baselines(options["baselines"], stored)
+            self.stdout.write(self.style.SUCCESS(f"Stored {vendor} baselines in {options['baselines']}"))
+            return
+
+        baseline = stored.get(vendor)
+        if baseline is None:
+            self.stdout.write(self.style.WARNING(f"No {vendor} baselines yet; record them with --update"))
+            return
+        if {k: baseline.get(k) for k in params} != params:
+            self.stdout.write(self.style.WARNING("Baselines were recorded with other --scale/--seed/--iterations"))
+
+        failures = benchmarks.compare(
+            results, baseline["scenarios"], options["latency_tolerance"], options["alloc_tolerance"]
+        )
+        for failure in failures:
+            self.stderr.write(self.style.ERROR(failure))
+        if failures:
+            raise CommandError(f"{len(failures)} benchmark regression(s)")
+        self.stdout.write(self.style.SUCCESS("All benchmarks within their baselines"))
+
+    def report(self, name, measured):
+        self.stdout.write(
+            f"{name:<28}{measured['queries']:>8}{measured['p50_ms']:>10.2f}{measured['p99_ms']:>10.2f}{measured['peak_kib']:>10.1f}"
+        )
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.posts.seeding import Plan, generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic users, posts, comments, likes, shares, power-law follows and their home timelines in bulk. "
+        "Run it on an empty database; the same --seed always produces the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--comments", type=int, default=20000)
+        parser.add_argument("--likes", type=int, default=50000, help="Approximate total")
+        parser.add_argument("--shares", type=int, default=5000, help="Approximate total")
+        parser.add_argument("--follows", type=float, default=20, help="Average accounts followed per user")
+        parser.add_argument("--days", type=int, default=365, help="Spread posts over this many past days")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per transaction (and per COPY)")
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (PostgreSQL only)")
+        parser.add_argument("--prefix", default="user", help="Usernames are <prefix><n>")
+        parser.add_argument("--password", default="password", help="Password of every generated user")
+
+    def handle(self, *args, workers, **options):
+        if workers > 1 and connection.vendor != "postgresql":
+            self.stdout.write(self.style.WARNING(f"{connection.vendor} takes one writer at a time; using 1 worker"))
+            workers = 1
+
+        plan = Plan(
+            users=options["users"],
+            posts=options["posts"],
+            comments=options["comments"],
+            likes=options["likes"],
+            shares=options["shares"],
+            follows=options["follows"],
+            seed=options["seed"],
+            days=options["days"],
+            chunk_size=options["chunk_size"],
+            password=options["password"],
+            prefix=options["prefix"],
+        )
+        started = time.monotonic()
+        totals = generate(plan, workers, progress=lambda totals: self.stdout.write(
+            "  " + ", ".join(f"{count} {kind}" for kind, count in totals.items()), ending="\r"
+        ))
+
+        elapsed = time.monotonic() - started
+        rows = sum(totals.values())
+        self.stdout.write("")
+        for kind, count in totals.items():
+            self.stdout.write(f"{kind:<14}{count:>12}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s), counters included"
+        ))
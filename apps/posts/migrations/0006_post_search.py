@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Post.language code -> Postgres text search configuration. Anything else uses
+# the language-neutral 'simple' configuration.
+LANGUAGE_CONFIGS = {
+    "da": "danish", "de": "german", "en": "english", "es": "spanish", "fi": "finnish",
+    "fr": "french", "hu": "hungarian", "it": "italian", "nl": "dutch", "no": "norwegian",
+    "pt": "portuguese", "ro": "romanian", "ru": "russian", "sv": "swedish", "tr": "turkish",
+}
+
+
+def add_search_vector(apps, schema_editor):
+    # Generated columns and GIN indexes are Postgres-only; other databases use
+    # the PostSearchToken table instead.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    cases = " ".join(
+        f"WHEN '{code}' THEN to_tsvector('{config}'::regconfig, content)"
+        for code, config in LANGUAGE_CONFIGS.items()
+    )
+    schema_editor.execute(
+        "ALTER TABLE posts_post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        f"CASE lower(split_part(coalesce(language, ''), '-', 1)) {cases} "
+        "ELSE to_tsvector('simple'::regconfig, content) END"
+        ") STORED"
+    )
+    schema_editor.execute("CREATE INDEX posts_post_search_vector_gin ON posts_post USING gin (search_vector)")
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS posts_post_search_vector_gin")
+    schema_editor.execute("ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearchToken',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='posts.post')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('token', 'post'), name='unique_search_token')],
+            },
+        ),
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
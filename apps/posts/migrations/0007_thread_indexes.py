@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent_comment', 'created_at'], name='posts_comme_parent__f6f2e4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['reply_to_post', 'created_at'], name='posts_post_reply_t_9080f5_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_thread_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='posts_comme_post_id_7929fe_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='posts_comme_parent__f6f2e4_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_post_author__85d846_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_post_created_a7e5d4_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_post_reply_t_9080f5_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('parent_comment__isnull', True)), fields=['post', '-created_at', '-id'], name='comments_live_top_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['parent_comment', 'created_at'], name='comments_live_replies_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['author', '-created_at', '-id'], name='posts_live_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='posts_live_global_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['reply_to_post', 'created_at'], name='posts_live_replies_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_live_partial_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_live_global_idx',
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('is_private', False), ('visibility', 'public')), fields=['-created_at', '-id'], name='posts_public_global_idx'),
+        ),
+    ]
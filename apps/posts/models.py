@@ -4,6 +4,19 @@ from django.conf import settings
 from django.utils import timezone
 
 
+# Not soft-deleted
+LIVE = models.Q(deleted_at__isnull=True)
+# Visible to everyone (see apps.posts.visibility)
+PUBLIC = models.Q(visibility="public", is_private=False)
+
+
+class LiveManager(models.Manager):
+    """Rows that are not soft-deleted. Read paths use ``Model.live``; ``objects`` sees everything."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(LIVE)
+
+
 class Post(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
@@ -22,13 +35,25 @@ class Post(models.Model):
     # Threaded replies
     reply_to_post = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="replies")
 
+    # Denormalized engagement counters, maintained with F() updates by the
+    # mutations and repaired by `manage.py reconcile_post_counters`
+    like_count = models.PositiveIntegerField(default=0)
+    share_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    reply_count = models.PositiveIntegerField(default=0)
+
+    objects = models.Manager()
+    live = LiveManager()
 
     class Meta:
+        # Read paths only ever see live rows, so the ordering indexes skip deleted ones
         indexes = [
-            # Per-author timeline index
-            models.Index(fields=["author", "-created_at"]),
-            # Global timeline index
-            models.Index(fields=["-created_at"]),
+            # Per-author timeline index (id breaks ties for keyset pagination)
+            models.Index(fields=["author", "-created_at", "-id"], condition=LIVE, name="posts_live_author_idx"),
+            # Global timeline index (the global feed shows public posts only)
+            models.Index(fields=["-created_at", "-id"], condition=LIVE & PUBLIC, name="posts_public_global_idx"),
+            # Replies in order; also each step of the thread walk
+            models.Index(fields=["reply_to_post", "created_at"], condition=LIVE, name="posts_live_replies_idx"),
         ]
 
     def __str__(self):
@@ -47,10 +72,20 @@ class Comment(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = models.Manager()
+    live = LiveManager()
+
     class Meta:
         indexes = [
-            models.Index(fields=["post", "-created_at"]),
+            # Top-level comments of a post, newest first
+            models.Index(
+                fields=["post", "-created_at", "-id"],
+                condition=LIVE & models.Q(parent_comment__isnull=True),
+                name="comments_live_top_idx",
+            ),
             models.Index(fields=["author"]),
+            # Comment replies in order; also each step of the comment tree walk
+            models.Index(fields=["parent_comment", "created_at"], condition=LIVE, name="comments_live_replies_idx"),
         ]
 
     def __str__(self):
@@ -98,3 +133,56 @@ class Share(models.Model):
 
     def __str__(self):
         return f"Share({self.user_id} → {self.post_id})"
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline row: one per (follower, post), written on fan-out.
+
+    ``created_at`` mirrors the post's timestamp so a home timeline page is a single
+    range scan over (owner, -created_at) without touching the posts table ordering.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    # Denormalized so unfollow can drop an author's posts without joining posts
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "post"], name="unique_timeline_entry")
+        ]
+        indexes = [
+            # Home timeline range scan
+            models.Index(fields=["owner", "-created_at", "-post"]),
+            # Unfollow cleanup
+            models.Index(fields=["owner", "author"]),
+        ]
+
+    def __str__(self):
+        return f"TimelineEntry({self.owner_id} ← {self.post_id})"
+
+
+class PostSearchToken(models.Model):
+    """
+    Inverted index used for search on databases without Postgres full-text search.
+
+    On Postgres, posts are searched through the generated ``search_vector`` column
+    (see migration 0006) and this table stays empty.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="search_tokens")
+    token = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["token", "post"], name="unique_search_token")
+        ]
+
+    def __str__(self):
+        return f"PostSearchToken({self.token} → {self.post_id})"
@@ -0,0 +1,133 @@
+# apps/posts/optimizer.py
+"""
+Selection-aware queryset optimizer.
+
+``optimize(qs, info)`` reads the GraphQL selection set of the field being
+resolved and shapes ``qs`` to match it:
+
+- ``.only()`` the columns the client selected (plus primary key, foreign key
+  ids and ``created_at``, which loaders and cursors always need),
+- ``select_related()`` forward relations that have a sub-selection,
+- ``prefetch_related()`` reverse relations listed in ``PREFETCH_QUERYSETS``.
+
+Type resolvers pick up joined and prefetched rows through
+``apps.posts.loaders.load_one`` / ``load_many`` before falling back to loaders.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+from .models import Post, Comment
+from .pagination import first_per_parent, nested_list_size
+
+# Reverse relations exposed in the schema, with the filtering/ordering/cap their
+# resolvers apply. Relations not listed here are left to the loaders.
+PREFETCH_QUERYSETS = {
+    (Post, "replies"): lambda: first_per_parent(Post.live.all(), "reply_to_post_id", nested_list_size()),
+    (Comment, "replies"): lambda: first_per_parent(Comment.live.all(), "parent_comment_id", nested_list_size()),
+}
+
+
+class _Plan:
+    def __init__(self):
+        self.only = set()
+        self.select_related = set()
+        self.prefetch = []
+
+    def apply(self, qs):
+        if self.select_related:
+            qs = qs.select_related(*sorted(self.select_related))
+        if self.prefetch:
+            qs = qs.prefetch_related(*self.prefetch)
+        return qs.only(*sorted(self.only))
+
+
+def optimize(qs, info, path=(), prefix=""):
+    """
+    Shape ``qs`` for the current field's selection.
+
+    ``path`` descends into wrapper types first (e.g. ``"items"`` for ``PostPage``).
+    ``prefix`` targets a related model instead of ``qs.model`` itself, e.g.
+    ``prefix="post"`` when the queryset is of timeline entries joined to posts.
+    """
+    if isinstance(path, str):
+        path = (path,)
+
+    nodes = list(info.field_nodes)
+    for name in path:
+        nodes = _selected(info, nodes).get(name, [])
+    if not nodes:
+        return qs
+
+    plan = _Plan()
+    model = qs.model
+    if prefix:
+        plan.only.update(_always(model))
+        plan.select_related.add(prefix)
+        plan.only.add(prefix)
+        model = model._meta.get_field(prefix).related_model
+        prefix += "__"
+    _collect(model, nodes, info, prefix, plan)
+    return plan.apply(qs)
+
+
+def _collect(model, nodes, info, prefix, plan):
+    opts = model._meta
+    plan.only.update(prefix + name for name in _always(model))
+
+    for name, sub_nodes in _selected(info, nodes).items():
+        try:
+            field = opts.get_field(to_snake_case(name))
+        except FieldDoesNotExist:
+            continue  # computed field; only needs the primary key
+
+        has_selection = any(node.selection_set for node in sub_nodes)
+        if field.many_to_one or (field.one_to_one and field.concrete):
+            plan.only.add(prefix + field.name)
+            if has_selection:
+                plan.select_related.add(prefix + field.name)
+                _collect(field.related_model, sub_nodes, info, f"{prefix}{field.name}__", plan)
+        elif field.one_to_many:
+            make_qs = PREFETCH_QUERYSETS.get((model, field.name))
+            if make_qs is not None and has_selection:
+                sub_plan = _Plan()
+                _collect(field.related_model, sub_nodes, info, "", sub_plan)
+                plan.prefetch.append(
+                    Prefetch(prefix + field.get_accessor_name(), queryset=sub_plan.apply(make_qs()))
+                )
+        elif field.concrete and not field.is_relation:
+            plan.only.add(prefix + field.name)
+
+
+# Needed by cursors and by the visibility (and soft-delete) check whatever the selection
+ALWAYS_FIELDS = ("created_at", "visibility", "is_private", "deleted_at")
+
+
+def _always(model):
+    fields = [model._meta.pk.attname]
+    for field in model._meta.concrete_fields:
+        if field.many_to_one or field.one_to_one or field.name in ALWAYS_FIELDS:
+            fields.append(field.attname)
+    return fields
+
+
+def _selected(info, nodes):
+    """Group the sub-fields selected under ``nodes`` by name, expanding fragments."""
+    grouped = {}
+    for node in nodes:
+        for field_node in _flatten(info, node.selection_set):
+            grouped.setdefault(field_node.name.value, []).append(field_node)
+    return grouped
+
+
+def _flatten(info, selection_set):
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _flatten(info, selection.selection_set)
+        elif isinstance(selection, FragmentSpreadNode):
+            yield from _flatten(info, info.fragments[selection.name.value].selection_set)
@@ -0,0 +1,110 @@
+# apps/posts/pagination.py
+"""
+Keyset (cursor) pagination helpers.
+
+Cursors are opaque base64 strings encoding the ``(created_at, id)`` of the last
+row on a page. The next page filters strictly below that key (above it for
+oldest-first lists such as replies), so every page is a bounded index range
+scan no matter how deep the client has scrolled.
+"""
+import base64
+import binascii
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils.dateparse import parse_datetime
+
+# Largest page any list resolver returns, whatever `limit` the client asks for
+MAX_PAGE_SIZE = 100
+
+
+def clamp_limit(limit):
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def nested_list_size():
+    """Rows a nested list without a ``limit`` argument returns per parent (what ``social_feed.cost`` charges for it)."""
+    return clamp_limit(getattr(settings, "GRAPHQL_COST_LIST_SIZE", 20))
+
+
+def first_per_parent(qs, parent_field, limit):
+    """The oldest ``limit`` rows of ``qs`` for each ``parent_field``, in one windowed query."""
+    rank = Window(RowNumber(), partition_by=F(parent_field), order_by=(F("created_at").asc(), F("id").asc()))
+    return qs.alias(_rank=rank).filter(_rank__lte=limit).order_by("created_at", "id")
+
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _parse_pk(pk):
+    # UUID keys (posts, comments, users) or big integers (follows, notifications)
+    try:
+        return uuid.UUID(pk)
+    except ValueError:
+        return int(pk)
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, pk = raw.split("|", 1)
+        created_at = parse_datetime(created_at)
+        pk = _parse_pk(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise Exception("Invalid cursor")
+
+    if created_at is None:
+        raise Exception("Invalid cursor")
+    return created_at, pk
+
+
+def keyset_filter(qs, after, created_field="created_at", pk_field="id", oldest_first=False):
+    """Restrict ``qs`` to rows strictly after the cursor in (-created_at, -id) order, or (created_at, id)."""
+    if not after:
+        return qs
+    created_at, pk = decode_cursor(after)
+    op = "gt" if oldest_first else "lt"
+    return qs.filter(
+        Q(**{f"{created_field}__{op}": created_at})
+        | Q(**{created_field: created_at, f"{pk_field}__{op}": pk})
+    )
+
+
+def keyset_window(qs, after, limit, created_field="created_at", pk_field="id"):
+    """The unevaluated ``limit + 1`` rows after the cursor; feed them to ``page_of``."""
+    qs = keyset_filter(qs, after, created_field, pk_field)
+    return qs.order_by(f"-{created_field}", f"-{pk_field}")[: limit + 1]
+
+
+def keyset_page(qs, after, limit, created_field="created_at", pk_field="id"):
+    """
+    Return ``(rows, has_next, end_cursor)`` for one page of ``qs``.
+
+    Fetches ``limit + 1`` rows so ``has_next`` needs no COUNT.
+    """
+    return page_of(list(keyset_window(qs, after, limit, created_field, pk_field)), limit, created_field)
+
+
+def page_of(rows, limit, created_field="created_at"):
+    """Split an over-fetched, already ordered list into ``(rows, has_next, end_cursor)``."""
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    end_cursor = encode_cursor(getattr(rows[-1], created_field), rows[-1].pk) if rows else None
+    return rows, has_next, end_cursor
+
+
+def cached_count(key, qs):
+    """Approximate total: a COUNT that is reused for ``FEED_TOTAL_CACHE_SECONDS``."""
+    timeout = getattr(settings, "FEED_TOTAL_CACHE_SECONDS", 60)
+    return cache.get_or_set(f"count:{key}", qs.count, timeout)
+
+
+def lazy_count(key, qs):
+    """Defer ``cached_count`` until a client actually selects the total."""
+    return partial(cached_count, key, qs)
@@ -0,0 +1,143 @@
+# apps/posts/realtime.py
+"""
+Real-time events for GraphQL subscriptions.
+
+Mutations publish small events (ids only) to channel layer groups once their
+transaction commits:
+
+- ``author.<user_id>``: posts created by that author (``postCreated``),
+- ``post.<post_id>.engagement``: counter changes (``postEngagementChanged``),
+- ``post.<post_id>.comments``: new comments (``commentAdded``).
+
+Subscribers (``social_feed.consumers.GraphQLWSConsumer``) join the groups they
+need and turn events back into objects. Per-post subscriptions are open only to
+viewers who may see the post, and end when it is deleted or hidden from them. Payload rows are cached briefly so a
+burst of subscribers costs one query per process, and engagement events are
+throttled to at most one message per ``REALTIME_COALESCE_SECONDS``.
+"""
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.social.models import Follow
+from .counters import COUNTER_FIELDS
+from .models import Post, Comment
+from .visibility import visible_to
+
+PAYLOAD_CACHE_SECONDS = 60
+
+
+def author_group(author_id):
+    return f"author.{author_id}"
+
+
+def engagement_group(post_id):
+    return f"post.{post_id}.engagement"
+
+
+def comments_group(post_id):
+    return f"post.{post_id}.comments"
+
+
+def coalesce_interval():
+    return getattr(settings, "REALTIME_COALESCE_SECONDS", 1.0)
+
+
+# -------------------------
+# Publishing
+# -------------------------
+def _send(group, event):
+    layer = get_channel_layer()
+    if layer is not None:
+        async_to_sync(layer.group_send)(group, {"type": "feed.event", "group": group, "event": event})
+
+
+def publish(group, **event):
+    """Send ``event`` to ``group`` after the current transaction commits."""
+    transaction.on_commit(lambda: _send(group, event), robust=True)
+
+
+def post_created(post):
+    publish(author_group(post.author_id), post_id=str(post.id))
+
+
+def engagement_changed(post_id):
+    # `at` identifies the change, so subscribers woken by it can share one read
+    publish(engagement_group(post_id), post_id=str(post_id), at=time.time_ns())
+
+
+def comment_added(comment):
+    publish(comments_group(comment.post_id), comment_id=str(comment.id))
+
+
+# -------------------------
+# Subscribing
+# -------------------------
+async def events(info, groups, interval=None):
+    """Yield the events published to ``groups``; with ``interval``, throttled to one per interval."""
+    async with info.context.listen(groups) as queue:
+        source = _throttle(queue, interval) if interval else _drain(queue)
+        async for event in source:
+            info.context.loaders = None  # each message is batched on its own
+            yield event
+
+
+async def _drain(queue):
+    while True:
+        yield await queue.get()
+
+
+async def _throttle(queue, interval):
+    # Leading edge goes out at once; whatever arrives during the pause is
+    # collapsed into its latest event and sent when the pause ends.
+    while True:
+        latest = await queue.get()
+        while True:
+            yield latest
+            await asyncio.sleep(interval)
+            if queue.empty():
+                break
+            while not queue.empty():
+                latest = queue.get_nowait()
+
+
+@sync_to_async
+def followed_author_ids(user_id):
+    return [user_id, *Follow.objects.filter(follower_id=user_id).values_list("followed_id", flat=True)]
+
+
+@sync_to_async
+def can_see_post(post_id, user_id):
+    return Post.live.filter(visible_to(user_id), id=post_id).exists()
+
+
+@sync_to_async
+def load_post(post_id):
+    return cache.get_or_set(
+        f"realtime:post:{post_id}",
+        lambda: Post.live.select_related("author").filter(id=post_id).first(),
+        PAYLOAD_CACHE_SECONDS,
+    )
+
+
+@sync_to_async
+def load_comment(comment_id):
+    return cache.get_or_set(
+        f"realtime:comment:{comment_id}",
+        lambda: Comment.live.select_related("author").filter(id=comment_id).first(),
+        PAYLOAD_CACHE_SECONDS,
+    )
+
+
+@sync_to_async
+def load_engagement(event):
+    def fetch():
+        row = Post.objects.filter(id=event["post_id"]).values(*COUNTER_FIELDS).first()
+        return row and {"post_id": event["post_id"], **row}
+
+    return cache.get_or_set(f"realtime:engagement:{event['post_id']}:{event['at']}", fetch, PAYLOAD_CACHE_SECONDS)
@@ -3,11 +3,16 @@ import graphene
 from graphene_django import DjangoObjectType
 from django.conf import settings
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
 from graphql_jwt.decorators import login_required
 
+from apps.social import notifications
 from .models import Post, Comment, Like, Share
-from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from . import aio, caching, counters, engagement, realtime, search, tasks, threads, timeline, visibility
+from .pagination import clamp_limit, encode_cursor, keyset_filter, keyset_page, keyset_window, lazy_count, page_of
+from .loaders import get_loaders, load_key, load_one, load_many
+from .optimizer import optimize
 
 
 # -------------------------
@@ -16,13 +21,69 @@ from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
 class PostType(DjangoObjectType):
     class Meta:
         model = Post
-        fields = ("id", "author", "content", "language", "is_private", "visibility", "created_at", "updated_at", "deleted_at", "reply_to_post", "replies", )
+        fields = ("id", "author", "content", "language", "is_private", "visibility", "created_at", "updated_at", "deleted_at", "reply_to_post", "replies",
+                  "like_count", "share_count", "comment_count", "reply_count", )
+
+    viewer_reaction = graphene.String(description="The viewer's reaction to this post, or null.")
+    viewer_has_shared = graphene.Boolean()
+    cursor = graphene.String(
+        description="Pass as `after` to continue the list this post came from (on `searchPosts` items, a relevance cursor)."
+    )
+
+    def resolve_author(self, info):
+        return load_one(info, self, "author", "users")
+
+    def resolve_reply_to_post(self, info):
+        return aio.then(load_one(info, self, "reply_to_post", "posts"), lambda post: _visible_one(info, post))
+
+    def resolve_replies(self, info):
+        return aio.then(load_many(info, self, "replies", "replies_by_post"), lambda replies: _visible(info, replies))
+
+    def resolve_cursor(self, info):
+        # Search results page by (rank, id), not (created_at, id)
+        rank = getattr(self, "rank", None)
+        if rank is not None:
+            return search.encode_cursor(rank, self.pk)
+        return encode_cursor(self.created_at, self.pk)
+
+    # One query per page for the viewer's likes/shares across all posts in it
+    def resolve_viewer_reaction(self, info):
+        if not info.context.user.is_authenticated:
+            return None
+        return load_key(info, "viewer_reactions", self.id)
+
+    def resolve_viewer_has_shared(self, info):
+        if not info.context.user.is_authenticated:
+            return False
+        return aio.then(load_key(info, "viewer_shares", self.id), bool)
 
 
 class CommentType(DjangoObjectType):
+    replies = graphene.List(
+        lambda: CommentType,
+        description="The oldest replies, a page's worth; continue with `commentReplies(commentId, after: <last reply's cursor>)`.",
+    )
+    cursor = graphene.String(description="Pass as `after` to continue the list this comment came from.")
+
     class Meta:
         model = Comment
-        fields = ("id", "post", "author", "content", "parent_comment", "created_at", "deleted_at")
+        fields = ("id", "post", "author", "content", "parent_comment", "created_at", "deleted_at",)
+
+    def resolve_post(self, info):
+        return aio.then(load_one(info, self, "post", "posts"), lambda post: _visible_one(info, post))
+
+    def resolve_author(self, info):
+        return load_one(info, self, "author", "users")
+
+    def resolve_parent_comment(self, info):
+        parent = load_one(info, self, "parent_comment", "comments")
+        return aio.then(parent, lambda parent: parent if parent is not None and parent.deleted_at is None else None)
+
+    def resolve_replies(self, info):
+        return load_many(info, self, "replies", "replies_by_comment")
+
+    def resolve_cursor(self, info):
+        return encode_cursor(self.created_at, self.pk)
 
 
 class LikeType(DjangoObjectType):
@@ -30,17 +91,28 @@ class LikeType(DjangoObjectType):
         model = Like
         fields = ("id", "user", "post", "reaction", "created_at")
 
+    def resolve_user(self, info):
+        return load_one(info, self, "user", "users")
+
+    def resolve_post(self, info):
+        return aio.then(load_one(info, self, "post", "posts"), lambda post: _visible_one(info, post))
+
 
 class ShareType(DjangoObjectType):
+    cursor = graphene.String(description="Pass as `after` to continue the list this share came from.")
+
     class Meta:
         model = Share
         fields = ("id", "user", "post", "created_at")
 
+    def resolve_user(self, info):
+        return load_one(info, self, "user", "users")
 
-class CommentType(DjangoObjectType):
-    class Meta:
-        model = Comment
-        fields = ("id", "post", "author", "content", "parent_comment", "created_at", "deleted_at",)
+    def resolve_post(self, info):
+        return aio.then(load_one(info, self, "post", "posts"), lambda post: _visible_one(info, post))
+
+    def resolve_cursor(self, info):
+        return encode_cursor(self.created_at, self.pk)
 
 
 # -------------------------
@@ -84,18 +156,28 @@ class CreatePost(graphene.Mutation):
         reply_to = None
         if input.reply_to_post_id:
             try:
-                reply_to = Post.objects.get(id=input.reply_to_post_id, deleted_at__isnull=True)
+                reply_to = Post.live.get(id=input.reply_to_post_id)
             except Post.DoesNotExist:
                 raise Exception("Reply-to post not found or deleted")
 
-        post = Post.objects.create(
-            author=user,
-            content=input.content,
-            language=input.language or None,
-            is_private=input.is_private if input.is_private is not None else False,
-            visibility=input.visibility or "public",
-            reply_to_post=reply_to,
-        )
+        with transaction.atomic():
+            post = Post.objects.create(
+                author=user,
+                content=input.content,
+                language=input.language or None,
+                is_private=input.is_private if input.is_private is not None else False,
+                visibility=input.visibility or "public",
+                reply_to_post=reply_to,
+            )
+            if reply_to is not None:
+                counters.adjust(reply_to, "reply_count", 1)
+                caching.invalidate(f"replies:{reply_to.id}", f"post:{reply_to.id}")
+                realtime.engagement_changed(reply_to.id)
+                notifications.notify(reply_to.author_id, "reply", user.id, reply_to.id)
+            caching.invalidate("feed:global")
+            realtime.post_created(post)
+            timeline.push_own_post(post)
+            tasks.fan_out_post.delay_on_commit(str(post.id))
         return CreatePost(post=post)
     
 
@@ -109,7 +191,7 @@ class UpdatePost(graphene.Mutation):
     def mutate(self, info, input: UpdatePostInput):
         user = info.context.user
         try:
-            post = Post.objects.get(id=input.post_id, deleted_at__isnull=True)
+            post = Post.live.get(id=input.post_id)
         except Post.DoesNotExist:
             raise Exception("Post not found or deleted")
 
@@ -126,7 +208,9 @@ class UpdatePost(graphene.Mutation):
             post.visibility = input.visibility
 
         post.updated_at = timezone.now()
-        post.save()
+        # update_fields keeps this save from overwriting concurrent counter updates
+        post.save(update_fields=["content", "language", "is_private", "visibility", "updated_at"])
+        caching.invalidate(f"post:{post.id}", "feed:global", post.reply_to_post_id and f"replies:{post.reply_to_post_id}")
         return UpdatePost(post=post)
     
 
@@ -140,15 +224,21 @@ class DeletePost(graphene.Mutation):
     def mutate(self, info, post_id):
         user = info.context.user
         try:
-            post = Post.objects.get(id=post_id, deleted_at__isnull=True)
+            post = Post.live.get(id=post_id)
         except Post.DoesNotExist:
             raise Exception("Post not found or already deleted")
 
         if post.author_id != user.id and not user.is_staff:
             raise Exception("Permission denied")
 
-        post.deleted_at = timezone.now()  # soft delete
-        post.save()
+        with transaction.atomic():
+            post.deleted_at = timezone.now()  # soft delete
+            post.save(update_fields=["deleted_at", "updated_at"])
+            if post.reply_to_post_id:
+                counters.adjust(post.reply_to_post_id, "reply_count", -1)
+                realtime.engagement_changed(post.reply_to_post_id)
+            caching.invalidate(f"post:{post.id}", "feed:global", post.reply_to_post_id and f"replies:{post.reply_to_post_id}")
+            tasks.remove_post.delay_on_commit(str(post.id))
         return DeletePost(ok=True)
     
 
@@ -161,22 +251,30 @@ class LikePost(graphene.Mutation):
 
     @login_required
     def mutate(self, info, post_id, reaction=None):
-        user = info.context.user
-        try:
-            post = Post.objects.get(id=post_id, deleted_at__isnull=True)
-        except Post.DoesNotExist:
+        # Upsert behavior - create if not exists, else refresh timestamp & reaction.
+        # The post is checked (exists, not deleted, visible) by the same statement.
+        likes = engagement.like(info.context.user, [post_id], reaction)
+        if not likes:
             raise Exception("Post not found")
-
-        # Upsert behavior - create if not exists
-        like, created = Like.objects.get_or_create(user=user, post=post, defaults={"reaction": reaction or "like"})
-        if not created:
-            # update reaction timestamp & reaction if different
-            if reaction and like.reaction != reaction:
-                like.reaction = reaction
-            like.created_at = timezone.now()
-            like.save()
+        like = likes[0]
+        _prime_viewer(info, [like])
         return LikePost(like=like)
-    
+
+
+class LikePosts(graphene.Mutation):
+    likes = graphene.List(LikeType)
+
+    class Arguments:
+        post_ids = graphene.List(graphene.NonNull(graphene.UUID), required=True)
+        reaction = graphene.String(required=False)
+
+    @login_required
+    def mutate(self, info, post_ids, reaction=None):
+        # Missing, deleted and hidden posts are skipped
+        likes = engagement.like(info.context.user, post_ids, reaction)
+        _prime_viewer(info, likes)
+        return LikePosts(likes=likes)
+
 
 class UnlikePost(graphene.Mutation):
     ok = graphene.Boolean()
@@ -186,35 +284,50 @@ class UnlikePost(graphene.Mutation):
 
     @login_required
     def mutate(self, info, post_id):
-        user = info.context.user
-        deleted, _ = Like.objects.filter(user=user, post_id=post_id).delete()
-        return UnlikePost(ok=deleted > 0)
-    
+        removed = engagement.unlike(info.context.user, [post_id])
+        return UnlikePost(ok=bool(removed))
+
+
+class UnlikePosts(graphene.Mutation):
+    post_ids = graphene.List(graphene.UUID, description="Posts that were liked before the call.")
+
+    class Arguments:
+        post_ids = graphene.List(graphene.NonNull(graphene.UUID), required=True)
+
+    @login_required
+    def mutate(self, info, post_ids):
+        return UnlikePosts(post_ids=engagement.unlike(info.context.user, post_ids))
+
 
 class SharePost(graphene.Mutation):
     share = graphene.Field(ShareType)
-    
+
     class Arguments:
         post_id = graphene.UUID(required=True)
 
     @login_required
     def mutate(self, info, post_id):
-        user = info.context.user
-
-        try:
-            post = Post.objects.get(id=post_id, deleted_at__isnull=True)
-        except Post.DoesNotExist:
+        # already shared → timestamp is refreshed
+        shares = engagement.share(info.context.user, [post_id])
+        if not shares:
             raise Exception("Post not found")
-        
-        share, created = Share.objects.get_or_create(user=user, post=post)
+        share = shares[0]
+        _prime_viewer(info, [share])
+        return SharePost(share=share)
 
-        if not created:
-            # already shared → update timestamp
-            share.created_at = timezone.now()
-            share.save()
 
-        return SharePost(share=share)
-    
+class SharePosts(graphene.Mutation):
+    shares = graphene.List(ShareType)
+
+    class Arguments:
+        post_ids = graphene.List(graphene.NonNull(graphene.UUID), required=True)
+
+    @login_required
+    def mutate(self, info, post_ids):
+        shares = engagement.share(info.context.user, post_ids)
+        _prime_viewer(info, shares)
+        return SharePosts(shares=shares)
+
 
 class UnsharePost(graphene.Mutation):
     ok = graphene.Boolean()
@@ -224,11 +337,29 @@ class UnsharePost(graphene.Mutation):
 
     @login_required
     def mutate(self, info, post_id):
-        user = info.context.user
+        removed = engagement.unshare(info.context.user, [post_id])
+        return UnsharePost(ok=bool(removed))
 
-        deleted, _ = Share.objects.filter(user=user, post_id=post_id).delete()
 
-        return UnsharePost(ok=deleted > 0)
+class UnsharePosts(graphene.Mutation):
+    post_ids = graphene.List(graphene.UUID, description="Posts that were shared before the call.")
+
+    class Arguments:
+        post_ids = graphene.List(graphene.NonNull(graphene.UUID), required=True)
+
+    @login_required
+    def mutate(self, info, post_ids):
+        return UnsharePosts(post_ids=engagement.unshare(info.context.user, post_ids))
+
+
+def _prime_viewer(info, rows):
+    # The mutation already knows the viewer's state for these posts
+    loaders = get_loaders(info)
+    for row in rows:
+        if isinstance(row, Like):
+            loaders.viewer_reactions.prime(row.post_id, row.reaction)
+        else:
+            loaders.viewer_shares.prime(row.post_id, True)
 
 
 class CreateComment(graphene.Mutation):
@@ -242,23 +373,29 @@ class CreateComment(graphene.Mutation):
         user = info.context.user
 
         try:
-            post = Post.objects.get(id=input.post_id, deleted_at__isnull=True)
+            post = Post.live.filter(visibility.visible_to(user.id)).get(id=input.post_id)
         except Post.DoesNotExist:
             raise Exception("Post not found")
 
         parent = None
         if input.parent_comment_id:
             try:
-                parent = Comment.objects.get(id=input.parent_comment_id, deleted_at__isnull=True)
+                parent = Comment.live.get(id=input.parent_comment_id)
             except Comment.DoesNotExist:
                 raise Exception("Parent comment not found")
 
-        comment = Comment.objects.create(
-            post=post,
-            author=user,
-            content=input.content,
-            parent_comment=parent,
-        )
+        with transaction.atomic():
+            comment = Comment.objects.create(
+                post=post,
+                author=user,
+                content=input.content,
+                parent_comment=parent,
+            )
+            counters.adjust(post, "comment_count", 1)
+            caching.invalidate(f"comments:{post.id}")
+            realtime.comment_added(comment)
+            realtime.engagement_changed(post.id)
+            notifications.notify(post.author_id, "comment", user.id, post.id)
 
         return CreateComment(comment=comment)
     
@@ -274,15 +411,19 @@ class DeleteComment(graphene.Mutation):
         user = info.context.user
 
         try:
-            comment = Comment.objects.get(id=comment_id, deleted_at__isnull=True)
+            comment = Comment.live.get(id=comment_id)
         except Comment.DoesNotExist:
             raise Exception("Comment not found or already deleted")
 
         if comment.author_id != user.id and not user.is_staff:
             raise Exception("Permission denied")
 
-        comment.deleted_at = timezone.now()
-        comment.save()
+        with transaction.atomic():
+            comment.deleted_at = timezone.now()
+            comment.save()
+            counters.adjust(comment.post_id, "comment_count", -1)
+            caching.invalidate(f"comments:{comment.post_id}")
+            realtime.engagement_changed(comment.post_id)
 
         return DeleteComment(ok=True)
 
@@ -293,9 +434,13 @@ class PostMutations(graphene.ObjectType):
     update_post = UpdatePost.Field()
     delete_post = DeletePost.Field()
     like_post = LikePost.Field()
+    like_posts = LikePosts.Field()
     unlike_post = UnlikePost.Field()
+    unlike_posts = UnlikePosts.Field()
     share_post = SharePost.Field()
+    share_posts = SharePosts.Field()
     unshare_post = UnsharePost.Field()
+    unshare_posts = UnsharePosts.Field()
     create_comment = CreateComment.Field()
     delete_comment = DeleteComment.Field()
 
@@ -305,58 +450,318 @@ class PostMutations(graphene.ObjectType):
 class PostPage(graphene.ObjectType):
     items = graphene.List(PostType)
     has_next = graphene.Boolean()
-    total = graphene.Int()
+    end_cursor = graphene.String(description="Pass as `after` to fetch the next page.")
+    total = graphene.Int(description="Approximate total, cached for a short period. Null for home feeds.")
+
+    def resolve_items(self, info):
+        return get_loaders(info).track(self.items)
+
+    def resolve_total(self, info):
+        # Counting is deferred until a client actually selects `total`
+        return aio.run(info, self.total) if callable(self.total) else self.total
+
+
+def _visible(info, posts):
+    """
+    Drop the posts the viewer may not see.
+
+    For rows served from shared caches, loaders and prefetches; list queries
+    filter with ``visibility.visible_to`` in SQL instead.
+    """
+    user_id = visibility.viewer_id(info)
+    verdicts = [(post, visibility.can_see(post, user_id)) for post in posts]
+    authors = {post.author_id for post, ok in verdicts if ok is None}
+    if not authors:
+        return [post for post, ok in verdicts if ok]
+
+    loader = get_loaders(info).viewer_follows
+    loader.enqueue(authors)
+
+    def decide():
+        return [post for post, ok in verdicts if ok or (ok is None and loader.load(post.author_id))]
+
+    return decide() if all(loader.is_loaded(author) for author in authors) else aio.run(info, decide)
+
+
+def _visible_one(info, post):
+    if post is None:
+        return None
+    return aio.then(_visible(info, [post]), lambda posts: posts[0] if posts else None)
+
+
+def _is_visible(info, post_id):
+    """Whether ``post_id`` is live and the viewer may see it (one indexed lookup)."""
+    qs = Post.live.filter(visibility.visible_to(visibility.viewer_id(info)), id=post_id).values_list("id", flat=True)
+    return aio.then(aio.fetch_first(info, qs), lambda pk: pk is not None)
+
+
+def _post_visible_to(info):
+    """Q for rows (comments, shares) whose live post the viewer may see."""
+    return Q(post__deleted_at__isnull=True) & visibility.visible_to(visibility.viewer_id(info), "post__")
+
+
+class ThreadNode(graphene.ObjectType):
+    post = graphene.Field(PostType)
+    depth = graphene.Int()
+    replies = graphene.List(lambda: ThreadNode)
+    has_more_replies = graphene.Boolean(
+        description="Replies beyond `limit` or `depth` exist; continue with `replies(postId, after: <last reply's post.cursor>)`."
+    )
+
+    def resolve_post(self, info):
+        return self.obj
+
+    def resolve_replies(self, info):
+        return self.children
+
+    def resolve_has_more_replies(self, info):
+        return self.has_more
+
+
+class CommentNode(graphene.ObjectType):
+    comment = graphene.Field(CommentType)
+    depth = graphene.Int()
+    replies = graphene.List(lambda: CommentNode)
+    has_more_replies = graphene.Boolean(
+        description="Replies beyond `limit` or `depth` exist; continue with `commentReplies(commentId, after: <last reply's comment.cursor>)`."
+    )
+
+    def resolve_comment(self, info):
+        return self.obj
+
+    def resolve_replies(self, info):
+        return self.children
+
+    def resolve_has_more_replies(self, info):
+        return self.has_more
+
+
+class CommentTree(graphene.ObjectType):
+    items = graphene.List(CommentNode)
+    has_more = graphene.Boolean(description="More top-level comments exist than `limit`.")
 
 
 class Query(graphene.ObjectType):
     post = graphene.Field(PostType, id=graphene.UUID(required=True))
-    global_feed = graphene.Field(PostPage, limit=graphene.Int(), offset=graphene.Int())
-    author_feed = graphene.Field(PostPage, author_id=graphene.UUID(required=True), limit=graphene.Int(), offset=graphene.Int())
-    replies = graphene.List(PostType, post_id=graphene.UUID(required=True))
-    shares = graphene.List(ShareType, post_id=graphene.UUID(required=True))
+    global_feed = graphene.Field(PostPage, limit=graphene.Int(), after=graphene.String())
+    author_feed = graphene.Field(PostPage, author_id=graphene.UUID(required=True), limit=graphene.Int(), after=graphene.String())
+    home_feed = graphene.Field(PostPage, limit=graphene.Int(), after=graphene.String())
+    search_posts = graphene.Field(PostPage, query=graphene.String(required=True), language=graphene.String(), limit=graphene.Int(), after=graphene.String())
+    replies = graphene.List(
+        PostType, post_id=graphene.UUID(required=True), limit=graphene.Int(), after=graphene.String(),
+        description="Replies oldest first; `after` takes the last reply's `cursor`.",
+    )
+    shares = graphene.List(
+        ShareType, post_id=graphene.UUID(required=True), limit=graphene.Int(), after=graphene.String(),
+        description="Shares newest first; `after` takes the last share's `cursor`.",
+    )
     share_count = graphene.Int(post_id=graphene.UUID(required=True))
-    comments = graphene.List(CommentType, post_id=graphene.UUID(required=True))
-    comment_replies = graphene.List(CommentType, comment_id=graphene.UUID(required=True))
+    comments = graphene.List(
+        CommentType, post_id=graphene.UUID(required=True), limit=graphene.Int(), after=graphene.String(),
+        description="Top-level comments newest first; `after` takes the last comment's `cursor`.",
+    )
+    comment_replies = graphene.List(
+        CommentType, comment_id=graphene.UUID(required=True), limit=graphene.Int(), after=graphene.String(),
+        description="Replies oldest first; `after` takes the last reply's `cursor`.",
+    )
     comment_count = graphene.Int(post_id=graphene.UUID(required=True))
-
+    thread = graphene.Field(
+        ThreadNode, post_id=graphene.UUID(required=True), depth=graphene.Int(), limit=graphene.Int(),
+        description="A post and its replies down to `depth` levels, at most `limit` replies per post.",
+    )
+    comment_tree = graphene.Field(
+        CommentTree, post_id=graphene.UUID(required=True), depth=graphene.Int(), limit=graphene.Int(),
+        description="Top-level comments and their replies down to `depth` levels, at most `limit` per level.",
+    )
 
     def resolve_post(self, info, id):
-        try:
-            return Post.objects.get(id=id, deleted_at__isnull=True)
-        except Post.DoesNotExist:
-            return None
+        def fetch():
+            try:
+                return optimize(Post.live.all(), info).get(id=id)
+            except Post.DoesNotExist:
+                return None
+
+        post = caching.read_through(info, f"post:{id}", fetch)
+        post = aio.then(post, lambda post: _visible_one(info, post))
+        return aio.then(post, lambda post: get_loaders(info).track([post])[0] if post else None)
         
-    def resolve_global_feed(self, info, limit=20, offset=0):
-        qs = Post.objects.filter(deleted_at__isnull=True).order_by("-created_at")
-        total = qs.count()
-        items = qs[offset : offset + limit]
-        has_next = offset + limit < total
-        return PostPage(items=items, has_next=has_next, total=total)
+    def resolve_global_feed(self, info, limit=20, after=None):
+        limit = clamp_limit(limit)
+        # Public posts only, so every viewer shares the cached first page
+        qs = Post.live.filter(visibility.PUBLIC)
+        total = lazy_count("global_feed", qs)
+
+        if after is None:
+            # The first page is what everyone opens the app on
+            page = caching.read_through(
+                info, "feed:global", lambda: keyset_page(optimize(qs, info, "items"), None, limit),
+                limit, timeout=getattr(settings, "FEED_CACHE_SECONDS", 10),
+            )
+            return aio.then(page, lambda page: PostPage(*page, total=total))
+
+        rows = aio.fetch_all(info, keyset_window(optimize(qs, info, "items"), after, limit))
+        return aio.then(rows, lambda rows: PostPage(*page_of(rows, limit), total=total))
         
-    def resolve_author_feed(self, info, author_id, limit=20, offset=0):
-        qs = Post.objects.filter(author_id=author_id, deleted_at__isnull=True).order_by("-created_at")
-        total = qs.count()
-        items = qs[offset : offset + limit]
-        has_next = offset + limit < total
-        return PostPage(items=items, has_next=has_next, total=total)
+    def resolve_author_feed(self, info, author_id, limit=20, after=None):
+        limit = clamp_limit(limit)
+        viewer_id = visibility.viewer_id(info)
+        qs = Post.live.filter(visibility.visible_to(viewer_id), author_id=author_id)
+        total = lazy_count(f"author_feed:{author_id}:{viewer_id}", qs)
+        rows = aio.fetch_all(info, keyset_window(optimize(qs, info, "items"), after, limit))
+        return aio.then(rows, lambda rows: PostPage(*page_of(rows, limit), total=total))
+
+    @login_required
+    def resolve_home_feed(self, info, limit=20, after=None):
+        limit = clamp_limit(limit)
+        page = aio.run(
+            info, timeline.home_feed, info.context.user.id, limit, after,
+            prepare=lambda qs, prefix="": optimize(qs, info, "items", prefix),
+        )
+        return aio.then(page, lambda page: PostPage(*page))
     
-    def resolve_replies(self, info, post_id):
-        return Post.objects.filter(reply_to_post_id=post_id, deleted_at__isnull=True).order_by("created_at")
+    def resolve_search_posts(self, info, query, language=None, limit=20, after=None):
+        limit = clamp_limit(limit)
+        # Ranked by relevance; `after` takes the previous page's endCursor
+        page = aio.run(
+            info, search.search, query, after, limit, language,
+            prepare=lambda qs: optimize(qs.filter(visibility.visible_to(visibility.viewer_id(info))), info, "items"),
+        )
+        return aio.then(page, lambda page: PostPage(*page))
+
+    def resolve_replies(self, info, post_id, limit=20, after=None):
+        limit = clamp_limit(limit)
+        qs = keyset_filter(optimize(Post.live.filter(reply_to_post_id=post_id), info), after, oldest_first=True)
+        window = qs.order_by("created_at", "id")[:limit]
+        if after is None:
+            replies = caching.read_through(info, f"replies:{post_id}", lambda: list(window), limit)
+        else:
+            replies = aio.fetch_all(info, window)
+        replies = aio.then(replies, lambda replies: _visible(info, replies))
+        return aio.then(replies, get_loaders(info).track)
     
-    def resolve_shares(self, info, post_id):
-        return Share.objects.filter(post_id=post_id)
+    # Per-post lists and counters are empty for posts the viewer may not see
+    def resolve_shares(self, info, post_id, limit=20, after=None):
+        limit = clamp_limit(limit)
+        qs = keyset_filter(optimize(Share.objects.filter(_post_visible_to(info), post_id=post_id), info), after)
+        shares = aio.fetch_all(info, qs.order_by("-created_at", "-id")[:limit])
+        return aio.then(shares, get_loaders(info).track)
 
     def resolve_share_count(self, info, post_id):
-        return Share.objects.filter(post_id=post_id).count()
+        qs = Post.live.filter(visibility.visible_to(visibility.viewer_id(info)), id=post_id)
+        count = aio.fetch_first(info, qs.values_list("share_count", flat=True))
+        return aio.then(count, lambda count: count or 0)
     
-    def resolve_comments(self, info, post_id):
-        return Comment.objects.filter(post_id=post_id, parent_comment__isnull=True, deleted_at__isnull=True).order_by("-created_at")
-
-    def resolve_comment_replies(self, info, comment_id):
-        return Comment.objects.filter(parent_comment_id=comment_id, deleted_at__isnull=True).order_by("created_at")
+    def resolve_comments(self, info, post_id, limit=20, after=None):
+        limit = clamp_limit(limit)
+        qs = keyset_filter(optimize(Comment.live.filter(post_id=post_id, parent_comment__isnull=True), info), after)
+        window = qs.order_by("-created_at", "-id")[:limit]
+
+        def comments(visible):
+            if not visible:
+                return []
+            if after is None:
+                # The first page is shared by every viewer who may see the post
+                comments = caching.read_through(info, f"comments:{post_id}", lambda: list(window), limit)
+            else:
+                comments = aio.fetch_all(info, window)
+            return aio.then(comments, get_loaders(info).track)
+
+        return aio.then(_is_visible(info, post_id), comments)
+
+    def resolve_comment_replies(self, info, comment_id, limit=20, after=None):
+        limit = clamp_limit(limit)
+        qs = Comment.live.filter(_post_visible_to(info), parent_comment_id=comment_id)
+        qs = keyset_filter(optimize(qs, info), after, oldest_first=True)
+        return aio.then(aio.fetch_all(info, qs.order_by("created_at", "id")[:limit]), get_loaders(info).track)
 
     def resolve_comment_count(self, info, post_id):
-        return Comment.objects.filter(post_id=post_id, deleted_at__isnull=True).count()
+        qs = Post.live.filter(visibility.visible_to(visibility.viewer_id(info)), id=post_id)
+        count = aio.fetch_first(info, qs.values_list("comment_count", flat=True))
+        return aio.then(count, lambda count: count or 0)
+
+    # Whole subtrees in one recursive query (see apps/posts/threads.py)
+    def resolve_thread(self, info, post_id, depth=3, limit=10):
+        root = aio.run(info, threads.post_thread, post_id, depth, limit, visibility.viewer_id(info))
+        return aio.then(root, lambda root: _track_tree(info, [root])[0] if root else None)
+
+    def resolve_comment_tree(self, info, post_id, depth=3, limit=20):
+        tree = aio.run(info, threads.comment_tree, post_id, depth, limit, visibility.viewer_id(info))
+        return aio.then(tree, lambda tree: CommentTree(items=_track_tree(info, tree[0]), has_more=tree[1]))
+
+
+def _track_tree(info, nodes):
+    # Queue the relations of every node at once, so authors cost one query for the whole tree
+    pending, objs = list(nodes), []
+    while pending:
+        node = pending.pop()
+        objs.append(node.obj)
+        pending.extend(node.children)
+    get_loaders(info).track(objs)
+    return nodes
+
+
+# -------------------------
+# Subscriptions
+# -------------------------
+class PostEngagementType(graphene.ObjectType):
+    post_id = graphene.UUID()
+    like_count = graphene.Int()
+    share_count = graphene.Int()
+    comment_count = graphene.Int()
+    reply_count = graphene.Int()
+
+
+class PostSubscriptions(graphene.ObjectType):
+    post_created = graphene.Field(PostType, description="New posts by the viewer and the authors they follow.")
+    post_engagement_changed = graphene.Field(
+        PostEngagementType, post_id=graphene.UUID(required=True),
+        description="Current counters, at most once per coalescing interval.",
+    )
+    comment_added = graphene.Field(CommentType, post_id=graphene.UUID(required=True))
+
+    @login_required
+    async def subscribe_post_created(root, info):
+        user_id = info.context.user.id
+        author_ids = await realtime.followed_author_ids(user_id)
+        groups = [realtime.author_group(author_id) for author_id in author_ids]
+        async for event in realtime.events(info, groups):
+            post = await realtime.load_post(event["post_id"])
+            if post is None:
+                continue
+            # Every author here is the viewer or followed by them; only private posts are withheld
+            if visibility.can_see(post, user_id) is not False:
+                yield post
+
+    async def subscribe_post_engagement_changed(root, info, post_id):
+        await _check_post(info, post_id)
+        group = realtime.engagement_group(post_id)
+        async for event in realtime.events(info, [group], interval=realtime.coalesce_interval()):
+            if not await _still_visible(info, post_id):
+                return
+            engagement = await realtime.load_engagement(event)
+            if engagement is not None:
+                yield engagement
+
+    async def subscribe_comment_added(root, info, post_id):
+        await _check_post(info, post_id)
+        async for event in realtime.events(info, [realtime.comments_group(post_id)]):
+            if not await _still_visible(info, post_id):
+                return
+            comment = await realtime.load_comment(event["comment_id"])
+            if comment is not None:
+                yield comment
+
+
+async def _check_post(info, post_id):
+    if not await realtime.can_see_post(post_id, visibility.viewer_id(info)):
+        raise Exception("Post not found")
+
+
+async def _still_visible(info, post_id):
+    # The cached row (at most PAYLOAD_CACHE_SECONDS old) catches deletes and visibility
+    # changes; the follow was checked on subscribing
+    post = await realtime.load_post(post_id)
+    return post is not None and visibility.can_see(post, visibility.viewer_id(info)) is not False
 
     
 # -------------------------
@@ -0,0 +1,136 @@
+# apps/posts/search.py
+"""
+Full-text search over posts.
+
+On Postgres, posts are matched against the stored generated ``search_vector``
+column (language-aware via ``Post.language``, GIN-indexed; see migration 0006)
+and ranked with ``ts_rank_cd``. Other databases (SQLite in local development
+and tests) use the ``PostSearchToken`` inverted index, rebuilt by a Celery
+task that a ``post_save`` handler enqueues on commit. Neither path scans post
+content with ``LIKE``.
+
+Results are ordered by ``(rank, id)`` descending and paginated with a keyset
+cursor on that pair.
+"""
+import base64
+import binascii
+import re
+import uuid
+from collections import Counter
+
+from django.db import connection
+from django.db.models import BooleanField, Count, FloatField, Q, Sum
+from django.db.models.expressions import RawSQL
+
+from .models import Post, PostSearchToken
+
+# Mirrors LANGUAGE_CONFIGS in migration 0006
+LANGUAGE_CONFIGS = {
+    "da": "danish", "de": "german", "en": "english", "es": "spanish", "fi": "finnish",
+    "fr": "french", "hu": "hungarian", "it": "italian", "nl": "dutch", "no": "norwegian",
+    "pt": "portuguese", "ro": "romanian", "ru": "russian", "sv": "swedish", "tr": "turkish",
+}
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TOKEN_LENGTH = 64
+
+
+def tokenize(text):
+    return [token[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall((text or "").lower())]
+
+
+def search_config(language):
+    code = (language or "").split("-", 1)[0].lower()
+    return LANGUAGE_CONFIGS.get(code, "english")
+
+
+# -------------------------
+# Cursors
+# -------------------------
+def encode_cursor(rank, pk):
+    return base64.urlsafe_b64encode(f"{rank!r}|{pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return float(rank), uuid.UUID(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise Exception("Invalid cursor")
+
+
+# -------------------------
+# Backends
+# -------------------------
+def _postgres_matches(qs, query, language):
+    # Match against the query stemmed for the requested language and unstemmed
+    # (for posts indexed with the 'simple' configuration).
+    tsquery = "(websearch_to_tsquery(%s::regconfig, %s) || websearch_to_tsquery('simple'::regconfig, %s))"
+    params = (search_config(language), query, query)
+    return qs.filter(
+        RawSQL(f'"posts_post"."search_vector" @@ {tsquery}', params, output_field=BooleanField())
+    ).annotate(
+        rank=RawSQL(f'ts_rank_cd("posts_post"."search_vector", {tsquery})::float8', params, output_field=FloatField())
+    )
+
+
+def _token_matches(qs, query, language):
+    tokens = set(tokenize(query))
+    if not tokens:
+        return qs.none()
+    # Every query token must match (websearch AND semantics); rank by term frequency
+    return qs.filter(search_tokens__token__in=tokens).annotate(
+        rank=Sum("search_tokens__weight", output_field=FloatField()),
+        hits=Count("search_tokens"),
+    ).filter(hits=len(tokens))
+
+
+def search(query, after=None, limit=20, language=None, prepare=None):
+    """
+    Return ``(posts, has_next, end_cursor)`` for live posts matching ``query``.
+
+    ``prepare(qs)`` may reshape the queryset (e.g. with the GraphQL optimizer).
+    """
+    qs = Post.live.all()
+    if prepare is not None:
+        qs = prepare(qs)
+
+    matches = _postgres_matches if connection.vendor == "postgresql" else _token_matches
+    qs = matches(qs, query, language)
+
+    if after:
+        rank, pk = decode_cursor(after)
+        qs = qs.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=pk))
+
+    rows = list(qs.order_by("-rank", "-id")[: limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    end_cursor = encode_cursor(rows[-1].rank, rows[-1].pk) if rows else None
+    return rows, has_next, end_cursor
+
+
+# -------------------------
+# Token index maintenance
+# -------------------------
+def index_post(post):
+    """Rebuild the token rows of ``post``; a no-op on Postgres."""
+    if connection.vendor == "postgresql":
+        return
+    PostSearchToken.objects.filter(post_id=post.pk).delete()
+    if post.deleted_at is not None:
+        return
+    PostSearchToken.objects.bulk_create(
+        PostSearchToken(post_id=post.pk, token=token, weight=weight)
+        for token, weight in Counter(tokenize(post.content)).items()
+    )
+
+
+def on_post_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Counter-only and timestamp-only saves do not change what is searchable
+    if update_fields is not None and not {"content", "deleted_at"} & set(update_fields):
+        return
+    if connection.vendor == "postgresql":
+        return  # the generated column keeps itself up to date
+    from .tasks import index_posts
+
+    index_posts.delay_on_commit([str(instance.pk)])
@@ -0,0 +1,344 @@
+# apps/posts/seeding.py
+"""
+Synthetic data at production scale (``manage.py seed_data``).
+
+Rows are generated in chunks and written with one ``COPY`` per chunk on
+PostgreSQL (``bulk_create`` elsewhere), optionally from several worker
+processes:
+
+- ids are derived from ``(seed, kind, index)``, so any chunk can reference any
+  user or post without reading them back, and every chunk draws from its own
+  RNG seeded by ``(seed, kind, chunk)``: the same ``--seed`` yields the same
+  data whatever ``--workers`` is,
+- follows, likes and shares are generated per follower/user, so their unique
+  pairs never span chunks and need no conflict handling,
+- who gets followed, which posts get engagement and who posts the most follow
+  a Zipf (power-law) distribution, so there are celebrities past
+  ``FEED_FANOUT_THRESHOLD`` and viral posts, as in production,
+- denormalized counters are set at the end with one set-based UPDATE per
+  table, and on databases without full-text search the ``PostSearchToken``
+  rows are written alongside their posts,
+- home timelines are written last, per chunk of posts, as fan-out would have
+  written them: every post in its author's timeline and in its followers'
+  unless the author is past ``FEED_FANOUT_THRESHOLD`` (which needs the
+  follower counts).
+"""
+import csv
+import io
+import multiprocessing
+import random
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.social.models import Follow
+from .models import Post, Comment, Like, Share, PostSearchToken, TimelineEntry
+from .search import tokenize
+from .timeline import fanout_threshold
+
+User = get_user_model()
+
+WORDS = (
+    "graph feed post like share follow reply thread comment social photo video music travel food coffee "
+    "morning weekend city beach mountain book movie game code python django release launch team news "
+    "today tomorrow friends family happy great new first best love idea question update"
+).split()
+VISIBILITIES = ["public"] * 16 + ["followers"] * 3 + ["private"]
+REACTIONS = ["like"] * 6 + ["love", "haha", "wow", "sad"]
+
+# Share of posts that reply to an earlier post, and of comments that reply to a comment
+REPLY_RATIO = 0.15
+COMMENT_REPLY_RATIO = 0.3
+ZIPF_EXPONENT = 1.1
+_SCATTER = 2654435761  # prime; spreads Zipf ranks over indexes (see `_scatter`)
+
+
+class Plan:
+    """What to generate; picklable, so worker processes get their own copy."""
+
+    def __init__(self, users, posts, comments, likes, shares, follows, seed=0, days=365, chunk_size=10000,
+                 password="password", prefix="user"):
+        self.users = users
+        self.posts = posts
+        self.comments = comments
+        self.likes = likes
+        self.shares = shares
+        self.follows = follows
+        self.seed = seed
+        self.days = days
+        self.chunk_size = chunk_size
+        self.prefix = prefix
+        self.password_hash = make_password(password)
+        self.now = timezone.now()
+        rng = random.Random(f"{seed}:ids")
+        # Random high bits per kind; the low 62 bits hold the row index
+        self.id_bases = {kind: rng.getrandbits(128) & ~((1 << 62) - 1) for kind in ("user", "post", "comment")}
+
+    def id(self, kind, index):
+        return uuid.UUID(int=self.id_bases[kind] | index, version=4)
+
+    def rng(self, kind, chunk):
+        return random.Random(f"{self.seed}:{kind}:{chunk}")
+
+    def post_time(self, index):
+        # Posts are spread evenly over `days`, oldest first, so replies follow their parents
+        span = timedelta(days=self.days)
+        return self.now - span + span * (index + 1) / max(self.posts, 1)
+
+
+def _zipf(rng, n):
+    """A rank in ``[0, n)``, rank ``r`` drawn with probability ~ ``1 / (r + 1) ** ZIPF_EXPONENT``."""
+    a = 1 - ZIPF_EXPONENT
+    x = ((n ** a - 1) * rng.random() + 1) ** (1 / a)
+    return min(n - 1, int(x) - 1)
+
+
+def _scatter(rank, n, salt):
+    """Map a popularity rank to an index, so popular users/posts are not simply the first ones."""
+    return (rank * _SCATTER + salt) % n
+
+
+def _degree(rng, mean, cap):
+    """A per-row count with mean ``mean`` (exponential, so a few rows get many)."""
+    return min(cap, int(rng.expovariate(1 / mean))) if mean > 0 else 0
+
+
+def _text(rng, low=5, high=30):
+    return " ".join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+# -------------------------
+# Writing
+# -------------------------
+def _write(model, rows):
+    """Insert model instances; one ``COPY`` on PostgreSQL."""
+    if not rows:
+        return 0
+    if connection.vendor != "postgresql":
+        model.objects.bulk_create(rows, batch_size=2000)
+        return len(rows)
+
+    # Database-generated ids (BigAutoField) are left to their sequence
+    fields = [f for f in model._meta.concrete_fields if not getattr(f, "db_returning", False)]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        values = [f.get_db_prep_save(f.pre_save(row, True), connection) for f in fields]
+        writer.writerow([r"\N" if value is None else value for value in values])
+    buffer.seek(0)
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+    sql = f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    with connection.cursor() as cursor:
+        if hasattr(cursor.cursor, "copy_expert"):  # psycopg2
+            cursor.cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3 (needed for DATABASE_POOL)
+            with cursor.cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    return len(rows)
+
+
+# -------------------------
+# Chunks
+# -------------------------
+def _users(plan, chunk, start, stop):
+    return {"users": _write(User, [
+        User(
+            id=plan.id("user", i),
+            username=f"{plan.prefix}{i}",
+            email=f"{plan.prefix}{i}@example.com",
+            password=plan.password_hash,
+        )
+        for i in range(start, stop)
+    ])}
+
+
+def _posts(plan, chunk, start, stop):
+    rng = plan.rng("post", chunk)
+    posts = []
+    for i in range(start, stop):
+        parent = rng.randrange(start, i) if i > start and rng.random() < REPLY_RATIO else None
+        posts.append(Post(
+            id=plan.id("post", i),
+            author_id=plan.id("user", _scatter(_zipf(rng, plan.users), plan.users, 1)),
+            content=_text(rng),
+            language="en",
+            visibility=rng.choice(VISIBILITIES),
+            created_at=plan.post_time(i),
+            updated_at=plan.post_time(i),
+            reply_to_post_id=plan.id("post", parent) if parent is not None else None,
+        ))
+    written = {"posts": _write(Post, posts)}
+    if connection.vendor != "postgresql":
+        tokens = [
+            PostSearchToken(post_id=post.id, token=token, weight=weight)
+            for post in posts
+            for token, weight in Counter(tokenize(post.content)).items()
+        ]
+        written["search tokens"] = _write(PostSearchToken, tokens)
+    return written
+
+
+def _follows(plan, chunk, start, stop):
+    rng = plan.rng("follow", chunk)
+    rows = []
+    for i in range(start, stop):
+        followed = set()
+        for _ in range(_degree(rng, plan.follows, plan.users - 1)):
+            followed.add(_scatter(_zipf(rng, plan.users), plan.users, 2))
+        followed.discard(i)
+        rows += [
+            Follow(follower_id=plan.id("user", i), followed_id=plan.id("user", j), created_at=plan.now)
+            for j in followed
+        ]
+    return {"follows": _write(Follow, rows)}
+
+
+def _engagement(plan, chunk, start, stop, model, total, salt):
+    rng = plan.rng(model.__name__, chunk)
+    mean = total / max(plan.users, 1)
+    rows = []
+    for i in range(start, stop):
+        posts = {_scatter(_zipf(rng, plan.posts), plan.posts, salt) for _ in range(_degree(rng, mean, plan.posts))}
+        for p in posts:
+            row = model(user_id=plan.id("user", i), post_id=plan.id("post", p), created_at=plan.post_time(p))
+            if model is Like:
+                row.reaction = rng.choice(REACTIONS)
+            rows.append(row)
+    return {model._meta.verbose_name_plural: _write(model, rows)}
+
+
+def _likes(plan, chunk, start, stop):
+    return _engagement(plan, chunk, start, stop, Like, plan.likes, 3)
+
+
+def _shares(plan, chunk, start, stop):
+    return _engagement(plan, chunk, start, stop, Share, plan.shares, 4)
+
+
+def _comments(plan, chunk, start, stop):
+    rng = plan.rng("comment", chunk)
+    comments = []
+    for i in range(start, stop):
+        parent = comments[rng.randrange(len(comments))] if comments and rng.random() < COMMENT_REPLY_RATIO else None
+        if parent:
+            post, since = parent.post_id, parent.created_at
+        else:
+            index = _scatter(_zipf(rng, plan.posts), plan.posts, 5)
+            post, since = plan.id("post", index), plan.post_time(index)
+        comments.append(Comment(
+            id=plan.id("comment", i),
+            post_id=post,
+            author_id=plan.id("user", rng.randrange(plan.users)),
+            content=_text(rng, 2, 15),
+            parent_comment_id=parent.id if parent else None,
+            # after the post (or the comment replied to), never before it
+            created_at=since + (plan.now - since) * rng.random(),
+        ))
+    return {"comments": _write(Comment, comments)}
+
+
+def _timelines(plan, chunk, start, stop):
+    posts = list(
+        Post.live.filter(id__in=[plan.id("post", i) for i in range(start, stop)]).values_list("id", "author_id", "created_at")
+    )
+    followers = defaultdict(list)
+    follows = Follow.objects.filter(
+        followed_id__in={author for _, author, _ in posts}, followed__follower_count__lt=fanout_threshold()
+    )
+    for follower, followed in follows.values_list("follower_id", "followed_id"):
+        followers[followed].append(follower)
+    return {"timeline entries": _write(TimelineEntry, [
+        TimelineEntry(owner_id=owner, post_id=post, author_id=author, created_at=created_at)
+        for post, author, created_at in posts
+        for owner in (author, *followers[author])
+    ])}
+
+
+CHUNKS = {
+    "users": _users, "posts": _posts, "follows": _follows, "likes": _likes, "shares": _shares, "comments": _comments,
+    "timelines": _timelines,
+}
+
+
+def run_chunk(plan, kind, chunk, start, stop):
+    with transaction.atomic():
+        return CHUNKS[kind](plan, chunk, start, stop)
+
+
+# -------------------------
+# Orchestration
+# -------------------------
+def _tasks(plan, kind, rows):
+    size = plan.chunk_size
+    return [(plan, kind, chunk, start, min(start + size, rows)) for chunk, start in enumerate(range(0, rows, size))]
+
+
+def _phases(plan):
+    # Later phases reference rows of earlier ones
+    yield _tasks(plan, "users", plan.users)
+    yield _tasks(plan, "posts", plan.posts)
+    yield [
+        *_tasks(plan, "follows", plan.users if plan.follows else 0),
+        *_tasks(plan, "likes", plan.users if plan.likes and plan.posts else 0),
+        *_tasks(plan, "shares", plan.users if plan.shares and plan.posts else 0),
+        *_tasks(plan, "comments", plan.comments if plan.posts else 0),
+    ]
+
+
+def _run(task):
+    return run_chunk(*task)
+
+
+def generate(plan, workers=1, progress=None):
+    """Write everything ``plan`` describes; returns the number of rows per table."""
+    totals = Counter()
+    pool = None
+    if workers > 1:
+        # Children open their own connections
+        connections.close_all()
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+    def run(tasks):
+        results = pool.map(_run, tasks) if pool else map(_run, tasks)
+        for written in results:
+            totals.update(written)
+            if progress:
+                progress(totals)
+
+    try:
+        for tasks in _phases(plan):
+            run(tasks)
+        set_counters()
+        # Fan-out skips celebrities, so timelines wait for the follower counts
+        run(_tasks(plan, "timelines", plan.posts))
+    finally:
+        if pool:
+            pool.shutdown()
+    return totals
+
+
+def _count(qs, field):
+    return Coalesce(Subquery(
+        qs.filter(**{field: OuterRef("pk")}).order_by().values(field).annotate(n=Count("*")).values("n")
+    ), 0)
+
+
+def set_counters():
+    """Set the denormalized counters from the rows, with one UPDATE per table."""
+    Post.objects.update(
+        like_count=_count(Like.objects, "post"),
+        share_count=_count(Share.objects, "post"),
+        comment_count=_count(Comment.live, "post"),
+        reply_count=_count(Post.live, "reply_to_post"),
+    )
+    User.objects.update(
+        follower_count=_count(Follow.objects, "followed"),
+        following_count=_count(Follow.objects, "follower"),
+    )
@@ -0,0 +1,77 @@
+# apps/posts/tasks.py
+"""
+Celery tasks for post follow-on work.
+
+Mutations commit their primary write and enqueue these with
+``delay_on_commit``, so requests never wait for fan-out or indexing. Tasks take
+ids rather than instances and are idempotent, so retries are harmless.
+"""
+import uuid
+
+from celery import shared_task
+from django.core.cache import cache
+
+from . import counters, search, timeline
+from .models import Post
+
+RECONCILE_BATCH_SIZE = 1000
+RECONCILE_LOCK_KEY = "reconcile:post-counters"
+# Well inside the hourly beat interval, so a crashed run never blocks the next
+# one; a live run renews it after every batch
+RECONCILE_LOCK_SECONDS = 5 * 60
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def fan_out_post(post_id):
+    post = Post.live.filter(pk=post_id).only("id", "author_id", "created_at").first()
+    if post is not None:
+        timeline.fan_out_post(post)
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def remove_post(post_id):
+    timeline.remove_post(post_id)
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def index_posts(post_ids):
+    for post in Post.objects.filter(pk__in=post_ids).only("id", "content", "deleted_at"):
+        search.index_post(post)
+
+
+@shared_task(ignore_result=True)
+def reconcile_post_counters(batch_size=RECONCILE_BATCH_SIZE):
+    """Beat task: reconcile every post, a batch (one short transaction) at a time."""
+    return reconcile_in_batches(Post.objects.all(), counters.reconcile, RECONCILE_LOCK_KEY, batch_size)
+
+
+def reconcile_in_batches(qs, reconcile, lock_key, batch_size):
+    """
+    Call ``reconcile(pks)`` over every row of ``qs`` in primary key order, one
+    run at a time; returns the number of rows fixed (0 when another run holds
+    the lock).
+
+    The lock holds a token of this run: it is renewed after each batch, the run
+    stops if another one took it over, and it is released only while it is
+    still ours, so a run that outlived its lock never deletes the next one's.
+    """
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key, token, RECONCILE_LOCK_SECONDS):
+        return 0  # the previous run is still going
+    try:
+        fixed, last_id = 0, None
+        while True:
+            page = qs.order_by("pk")
+            if last_id is not None:
+                page = page.filter(pk__gt=last_id)
+            batch = list(page.values_list("pk", flat=True)[:batch_size])
+            if not batch:
+                return fixed
+            fixed += reconcile(batch)
+            last_id = batch[-1]
+            if cache.get(lock_key) != token:
+                return fixed  # expired and taken by a newer run, which covers the rest
+            cache.touch(lock_key, RECONCILE_LOCK_SECONDS)
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
@@ -1,3 +1,1323 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from graphql import OperationType, parse
+from graphql_jwt.shortcuts import get_token
+from graphql_jwt.utils import jwt_encode, jwt_payload
+
+from social_feed import auth, cost, metrics, replicas, timeouts
+from social_feed.schema import schema
+from social_feed.views import FeedGraphQLView
+from apps.social.models import Follow
+from . import benchmarks, counters, engagement, tasks, timeline
+from .models import Post, Comment, Like, Share, TimelineEntry
+from .pagination import MAX_PAGE_SIZE, clamp_limit, decode_cursor, encode_cursor
+from .seeding import Plan, generate
+
+User = get_user_model()
+
+
+class GraphQLTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def execute(self, query, user=None, **variables):
+        request = RequestFactory().post("/graphql")
+        request.user = user or AnonymousUser()
+        result = schema.execute(query, context_value=request, variable_values=variables)
+        self.assertIsNone(result.errors)
+        return result.data
+
+
+class FeedQueryCountTests(GraphQLTestCase):
+    """Each relation in a document must cost one query per level, not one per row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [User.objects.create_user(f"author{i}", f"author{i}@mail.com", "pw") for i in range(20)]
+        cls.posts = [Post.objects.create(author=author, content=f"post {i}") for i, author in enumerate(cls.authors)]
+        for i, post in enumerate(cls.posts[:5]):
+            reply = Post.objects.create(author=cls.authors[-1 - i], content="reply", reply_to_post=post)
+            Post.objects.create(author=cls.authors[i], content="reply to reply", reply_to_post=reply)
+        root = cls.posts[0]
+        for i, author in enumerate(cls.authors[:10]):
+            comment = Comment.objects.create(post=root, author=author, content=f"comment {i}")
+            Comment.objects.create(post=root, author=cls.authors[-1 - i], content="nested", parent_comment=comment)
+        for author in cls.authors:
+            Like.objects.create(user=author, post=root)
+
+    def test_global_feed_with_authors(self):
+        # authors are joined into the page query
+        with self.assertNumQueries(1):
+            data = self.execute("{ globalFeed(limit: 20) { items { id author { username } } } }")
+        self.assertEqual(len(data["globalFeed"]["items"]), 20)
+
+    def test_global_feed_with_reply_threads(self):
+        # page (joined with authors and parents) + replies + replies of replies
+        with self.assertNumQueries(3):
+            self.execute("""
+                { globalFeed(limit: 20) { items {
+                    author { username }
+                    replyToPost { id }
+                    replies { author { username } replies { id } }
+                } } }
+            """)
+
+    def test_like_mutation_reuses_loaded_relations(self):
+        # post + existing-like lookups, the upsert and counter update (with their savepoint) and a
+        # single author lookup; the liker and the post held by the mutation are not fetched again
+        liker = User.objects.create_user("liker", "liker@mail.com", "pw")
+        with self.assertNumQueries(7):
+            self.execute(
+                "mutation($id: UUID!) { likePost(postId: $id) { like { user { username } post { author { username } } } } }",
+                user=liker,
+                id=str(self.posts[1].id),
+            )
+
+    def test_bulk_like_costs_the_same_for_any_number_of_posts(self):
+        liker = User.objects.create_user("liker", "liker@mail.com", "pw")
+        ids = [str(post.id) for post in self.posts]
+        # posts, existing likes, upsert, counter update (+ savepoint)
+        with self.assertNumQueries(6):
+            data = self.execute(
+                "mutation($ids: [UUID!]!) { likePosts(postIds: $ids, reaction: \"love\") { likes { reaction } } }",
+                user=liker,
+                ids=ids,
+            )
+        self.assertEqual(len(data["likePosts"]["likes"]), 20)
+        self.assertEqual(Post.objects.get(id=self.posts[1].id).like_count, 1)
+
+        # liking again refreshes rows without touching counters
+        self.execute("mutation($ids: [UUID!]!) { likePosts(postIds: $ids) { likes { reaction } } }", user=liker, ids=ids[:2])
+        self.assertEqual(Post.objects.get(id=self.posts[1].id).like_count, 1)
+        self.assertEqual(Like.objects.get(user=liker, post=self.posts[1]).reaction, "love")
+
+        data = self.execute("mutation($ids: [UUID!]!) { unlikePosts(postIds: $ids) { postIds } }", user=liker, ids=ids[:5])
+        self.assertEqual(len(data["unlikePosts"]["postIds"]), 5)
+        self.assertEqual(Post.objects.get(id=self.posts[1].id).like_count, 0)
+
+    def test_viewer_engagement_is_batched_per_page(self):
+        viewer = self.authors[3]
+        Like.objects.create(user=viewer, post=self.posts[19], reaction="wow")
+        Share.objects.create(user=viewer, post=self.posts[18])
+        # page + the viewer's likes + the viewer's shares
+        with self.assertNumQueries(3):
+            data = self.execute("{ globalFeed(limit: 20) { items { id viewerReaction viewerHasShared } } }", user=viewer)
+        items = {item["id"]: item for item in data["globalFeed"]["items"]}
+        self.assertEqual(items[str(self.posts[19].id)]["viewerReaction"], "wow")
+        self.assertTrue(items[str(self.posts[18].id)]["viewerHasShared"])
+        self.assertIsNone(items[str(self.posts[18].id)]["viewerReaction"])
+
+    def test_comments_with_authors_and_replies(self):
+        # the post's visibility + comments (joined with authors) + prefetched replies (joined with authors)
+        with self.assertNumQueries(3):
+            data = self.execute(
+                "query($id: UUID!) { comments(postId: $id) { author { username } replies { author { username } } } }",
+                id=str(self.posts[0].id),
+            )
+        self.assertEqual(len(data["comments"]), 10)
+
+
+class ThreadTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("author", "author@mail.com", "pw")
+        cls.root = Post.objects.create(author=cls.user, content="root")
+        # a 6-deep chain, with 3 replies at the second level
+        parent = cls.root
+        for i in range(6):
+            parent = Post.objects.create(author=cls.user, content=f"level {i + 1}", reply_to_post=parent)
+        first = Post.objects.get(content="level 1")
+        for i in range(2):
+            Post.objects.create(author=cls.user, content=f"sibling {i}", reply_to_post=first)
+        Post.objects.create(author=cls.user, content="deleted", reply_to_post=first, deleted_at=timezone.now())
+
+        cls.comments = [Comment.objects.create(post=cls.root, author=cls.user, content=f"top {i}") for i in range(3)]
+        parent = cls.comments[0]
+        for i in range(4):
+            parent = Comment.objects.create(post=cls.root, author=cls.user, content=f"nested {i}", parent_comment=parent)
+
+    def test_thread_is_three_queries_at_any_depth(self):
+        query = """
+            query($id: UUID!) { thread(postId: $id, depth: 5, limit: 2) {
+                post { content author { username } }
+                replies { hasMoreReplies post { content } replies { post { content author { username } }
+                    replies { replies { replies { hasMoreReplies post { content } } } } } }
+            } }
+        """
+        # tree walk + rows + authors
+        with self.assertNumQueries(3):
+            data = self.execute(query, id=str(self.root.id))["thread"]
+        level1 = data["replies"][0]
+        self.assertEqual(data["post"]["content"], "root")
+        self.assertEqual(level1["post"]["content"], "level 1")
+        self.assertTrue(level1["hasMoreReplies"])  # 3 live replies, limit 2; the deleted one is pruned
+        self.assertEqual([r["post"]["content"] for r in level1["replies"]], ["level 2", "sibling 0"])
+        leaf = level1["replies"][0]["replies"][0]["replies"][0]["replies"][0]
+        self.assertEqual(leaf["post"]["content"], "level 5")
+        self.assertTrue(leaf["hasMoreReplies"])  # level 6 is below `depth`
+
+    def test_comment_tree(self):
+        query = """
+            query($id: UUID!) { commentTree(postId: $id, depth: 2, limit: 2) {
+                hasMore items { comment { content } replies { comment { content } replies { hasMoreReplies comment { content } } } }
+            } }
+        """
+        data = self.execute(query, id=str(self.root.id))["commentTree"]
+        self.assertTrue(data["hasMore"])
+        self.assertEqual([c["comment"]["content"] for c in data["items"]], ["top 2", "top 1"])
+
+        data = self.execute(query.replace("limit: 2", "limit: 3"), id=str(self.root.id))["commentTree"]
+        (oldest,) = [c for c in data["items"] if c["comment"]["content"] == "top 0"]
+        deepest = oldest["replies"][0]["replies"][0]
+        self.assertEqual(deepest["comment"]["content"], "nested 1")
+        self.assertTrue(deepest["hasMoreReplies"])
+
+    def test_truncated_levels_continue_from_the_last_reply(self):
+        level1 = Post.objects.get(content="level 1")
+        data = self.execute(
+            "query($id: UUID!) { thread(postId: $id, limit: 1) { replies { hasMoreReplies replies { post { cursor } } } } }",
+            id=str(self.root.id),
+        )["thread"]["replies"][0]
+        self.assertTrue(data["hasMoreReplies"])
+        rest = self.execute(
+            "query($id: UUID!, $after: String) { replies(postId: $id, after: $after, limit: 1) { content cursor } }",
+            id=str(level1.id), after=data["replies"][-1]["post"]["cursor"],
+        )["replies"]
+        self.assertEqual([r["content"] for r in rest], ["sibling 0"])
+        rest = self.execute(
+            "query($id: UUID!, $after: String) { replies(postId: $id, after: $after) { content } }",
+            id=str(level1.id), after=rest[-1]["cursor"],
+        )["replies"]
+        self.assertEqual([r["content"] for r in rest], ["sibling 1"])
+
+        top = self.comments[0]
+        Comment.objects.create(post=self.root, author=self.user, content="second reply", parent_comment=top)
+        node = self.execute(
+            "query($id: UUID!) { commentTree(postId: $id, depth: 1, limit: 3) { items { hasMoreReplies replies { comment { cursor } } } } }",
+            id=str(self.root.id),
+        )["commentTree"]["items"][2]  # "top 0", the oldest
+        self.assertEqual(len(node["replies"]), 2)
+        rest = self.execute(
+            "query($id: UUID!, $after: String) { commentReplies(commentId: $id, after: $after) { content } }",
+            id=str(top.id), after=node["replies"][0]["comment"]["cursor"],
+        )["commentReplies"]
+        self.assertEqual([c["content"] for c in rest], ["second reply"])
+
+    def test_per_post_lists_are_bounded(self):
+        for fan in [User.objects.create_user(f"fan{i}", f"fan{i}@mail.com", "pw") for i in range(3)]:
+            Share.objects.create(user=fan, post=self.root)
+        query = "query($id: UUID!, $after: String) { %s(postId: $id, limit: 2, after: $after) { cursor } }"
+        for field, total in (("comments", 3), ("shares", 3)):
+            first = self.execute(query % field, id=str(self.root.id))[field]
+            rest = self.execute(query % field, id=str(self.root.id), after=first[-1]["cursor"])[field]
+            self.assertEqual((len(first), len(rest)), (2, total - 2))
+
+        # Nested lists without a `limit` stop at a page's worth per parent, prefetched or loaded
+        level1 = Post.objects.get(content="level 1")
+        Share.objects.create(user=self.user, post=level1)
+        for _ in range(2):
+            Comment.objects.create(post=self.root, author=self.user, content="more", parent_comment=self.comments[0])
+        with override_settings(GRAPHQL_COST_LIST_SIZE=2):
+            data = self.execute("query($id: UUID!) { replies(postId: $id) { replies { id } } }", id=str(self.root.id))
+            self.assertEqual(len(data["replies"][0]["replies"]), 2)  # "level 2" and "sibling 0", not "sibling 1"
+            data = self.execute("query($id: UUID!) { shares(postId: $id) { post { replies { id } } } }", id=str(level1.id))
+            self.assertEqual(len(data["shares"][0]["post"]["replies"]), 2)
+            comments = self.execute(
+                "query($id: UUID!) { comments(postId: $id) { content replies { id } } }", id=str(self.root.id)
+            )["comments"]
+            self.assertEqual(len(comments[-1]["replies"]), 2)
+
+    @override_settings(THREAD_MAX_NODES=6)
+    def test_capped_walks_report_the_levels_they_cut(self):
+        root = Post.objects.create(author=self.user, content="busy")
+        for i in range(5):
+            child = Post.objects.create(author=self.user, content=f"child {i}", reply_to_post=root)
+            Post.objects.create(author=self.user, content=f"grandchild {i}", reply_to_post=child)
+        data = self.execute(
+            "query($id: UUID!) { thread(postId: $id) { hasMoreReplies replies { hasMoreReplies replies { post { id } } } } }",
+            id=str(root.id),
+        )["thread"]
+        # the 6 rows are the root and its 5 children; every child lost its reply to the cap
+        self.assertEqual(len(data["replies"]), 5)
+        self.assertEqual({(r["hasMoreReplies"], len(r["replies"])) for r in data["replies"]}, {(True, 0)})
+        self.assertTrue(data["hasMoreReplies"])
+
+    def test_comment_tree_of_deleted_or_hidden_post_is_empty(self):
+        stranger = User.objects.create_user("stranger", "stranger@mail.com", "pw")
+        query = "query($id: UUID!) { commentTree(postId: $id) { hasMore items { comment { content } } } }"
+        self.assertEqual(len(self.execute(query, stranger, id=str(self.root.id))["commentTree"]["items"]), 3)
+
+        Post.objects.filter(pk=self.root.pk).update(visibility="private")
+        self.assertEqual(self.execute(query, stranger, id=str(self.root.id))["commentTree"], {"hasMore": False, "items": []})
+        self.assertEqual(len(self.execute(query, self.user, id=str(self.root.id))["commentTree"]["items"]), 3)
+
+        Post.objects.filter(pk=self.root.pk).update(visibility="public", deleted_at=timezone.now())
+        self.assertEqual(self.execute(query, self.user, id=str(self.root.id))["commentTree"]["items"], [])
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    QUERY = "query($after: String) { globalFeed(limit: 4, after: $after) { hasNext endCursor items { id } } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", "author@mail.com", "pw")
+        now = timezone.now()
+        # pairs of posts share a timestamp; the id breaks the tie
+        cls.posts = [
+            Post.objects.create(author=cls.author, content=f"post {i}", created_at=now - timezone.timedelta(seconds=i // 2))
+            for i in range(10)
+        ]
+        cls.ordered = [str(p.id) for p in sorted(cls.posts, key=lambda p: (p.created_at, p.id), reverse=True)]
+
+    def test_pages_walk_every_row_once_in_order(self):
+        ids, after, pages = [], None, 0
+        while True:
+            page = self.execute(self.QUERY, after=after)["globalFeed"]
+            ids.extend(item["id"] for item in page["items"])
+            pages += 1
+            if not page["hasNext"]:
+                break
+            after = page["endCursor"]
+        self.assertEqual(ids, self.ordered)
+        self.assertEqual(pages, 3)
+
+    def test_pages_are_stable_under_new_posts(self):
+        first = self.execute(self.QUERY)["globalFeed"]
+        Post.objects.create(author=self.author, content="newer")
+        second = self.execute(self.QUERY, after=first["endCursor"])["globalFeed"]
+        self.assertEqual([item["id"] for item in second["items"]], self.ordered[4:8])
+
+    def test_limits_are_clamped(self):
+        self.assertEqual((clamp_limit(0), clamp_limit(-5), clamp_limit(20), clamp_limit(10_000)), (1, 1, 20, MAX_PAGE_SIZE))
+        data = self.execute("{ globalFeed(limit: 0) { hasNext items { id } } }")["globalFeed"]
+        self.assertEqual((len(data["items"]), data["hasNext"]), (1, True))
+
+    def test_tampered_cursors_are_rejected(self):
+        valid = encode_cursor(self.posts[0].created_at, self.posts[0].pk)
+        self.assertEqual(decode_cursor(valid), (self.posts[0].created_at, self.posts[0].pk))
+        self.assertEqual(decode_cursor(encode_cursor(self.posts[0].created_at, 42))[1], 42)
+        tampered = [
+            "not base64!",
+            encode_cursor(self.posts[0].created_at, "not-a-uuid"),
+            encode_cursor(self.posts[0].created_at, ""),
+            base64.urlsafe_b64encode(b"2024-13-45T00:00:00|1").decode(),
+        ]
+        request = RequestFactory().post("/graphql")
+        request.user = AnonymousUser()
+        for cursor in tampered:
+            with self.subTest(cursor=cursor):
+                result = schema.execute(self.QUERY, context_value=request, variable_values={"after": cursor})
+                self.assertEqual([e.message for e in result.errors], ["Invalid cursor"])
+
+
+class VisibilityTests(GraphQLTestCase):
+    """Private and followers-only posts are enforced in SQL for lists and in Python for cached rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", "author@mail.com", "pw")
+        cls.follower = User.objects.create_user("follower", "follower@mail.com", "pw")
+        cls.stranger = User.objects.create_user("stranger", "stranger@mail.com", "pw")
+        Follow.objects.create(follower=cls.follower, followed=cls.author)
+
+        cls.root = Post.objects.create(author=cls.author, content="public")
+        cls.posts = {
+            name: Post.objects.create(author=cls.author, content=name, reply_to_post=cls.root, **fields)
+            for name, fields in {
+                "public reply": {},
+                "followers": {"visibility": "followers"},
+                "private": {"visibility": "private"},
+                "flagged": {"is_private": True},
+            }.items()
+        }
+        for post in [cls.root, *cls.posts.values()]:
+            TimelineEntry.objects.create(owner=cls.follower, post=post, author=cls.author, created_at=post.created_at)
+
+    def test_each_viewer_sees_what_they_may(self):
+        queries = {
+            "globalFeed": "{ globalFeed(limit: 10) { items { content } } }",
+            "authorFeed": "query($author: UUID!) { authorFeed(authorId: $author, limit: 10) { items { content } } }",
+            "replies": "query($id: UUID!) { replies(postId: $id) { content } }",
+            "thread": "query($id: UUID!) { thread(postId: $id) { replies { post { content } } } }",
+        }
+        public = ["public", "public reply"]
+        expected = {
+            None: {"globalFeed": public, "authorFeed": public, "replies": ["public reply"]},
+            self.stranger: {"globalFeed": public, "authorFeed": public, "replies": ["public reply"]},
+            self.follower: {"globalFeed": public, "authorFeed": ["followers", *public], "replies": ["followers", "public reply"]},
+            self.author: {
+                "globalFeed": public,
+                "authorFeed": ["flagged", "followers", "private", *public],
+                "replies": ["flagged", "followers", "private", "public reply"],
+            },
+        }
+        for user, fields in expected.items():
+            fields["thread"] = fields["replies"]
+            for field, contents in fields.items():
+                with self.subTest(user=user and user.username, field=field):
+                    data = self.execute(queries[field], user, id=str(self.root.id), author=str(self.author.id))[field]
+                    items = data["replies"] if field == "thread" else data if field == "replies" else data["items"]
+                    self.assertEqual(sorted(i["post"]["content"] if "post" in i else i["content"] for i in items), contents)
+
+    def test_per_post_fields_follow_the_post(self):
+        private = self.posts["private"]
+        top = Comment.objects.create(post=private, author=self.author, content="secret comment")
+        Comment.objects.create(post=private, author=self.author, content="secret reply", parent_comment=top)
+        Share.objects.create(user=self.author, post=private)
+        query = """
+            query($id: UUID!, $comment: UUID!) {
+                comments(postId: $id) { content post { content } }
+                commentReplies(commentId: $comment) { content }
+                commentTree(postId: $id) { items { comment { content } } }
+                shares(postId: $id) { post { content } }
+                commentCount(postId: $id)
+                shareCount(postId: $id)
+            }
+        """
+        # the author fills the shared comment cache first
+        data = self.execute(query, self.author, id=str(private.id), comment=str(top.id))
+        self.assertEqual(data["comments"], [{"content": "secret comment", "post": {"content": "private"}}])
+        self.assertEqual((len(data["commentReplies"]), len(data["shares"])), (1, 1))
+
+        hidden = {"comments": [], "commentReplies": [], "commentTree": {"items": []}, "shares": [], "commentCount": 0, "shareCount": 0}
+        for user in (None, self.stranger, self.follower):
+            with self.subTest(user=user and user.username):
+                self.assertEqual(self.execute(query, user, id=str(private.id), comment=str(top.id)), hidden)
+
+    def test_deleted_parents_are_not_returned_through_relations(self):
+        reply = self.posts["public reply"]
+        top = Comment.objects.create(post=reply, author=self.author, content="top")
+        Comment.objects.create(post=reply, author=self.author, content="nested", parent_comment=top)
+        Post.objects.filter(pk=self.root.pk).update(deleted_at=timezone.now())
+        Comment.objects.filter(pk=top.pk).update(deleted_at=timezone.now())
+
+        # joined by the optimizer
+        data = self.execute("query($id: UUID!) { post(id: $id) { replyToPost { content deletedAt } } }", id=str(reply.id))
+        self.assertIsNone(data["post"]["replyToPost"])
+        data = self.execute(
+            "query($id: UUID!) { authorFeed(authorId: $id) { items { replyToPost { content } } } }", id=str(self.author.id)
+        )
+        self.assertEqual([item["replyToPost"] for item in data["authorFeed"]["items"]], [None])
+        # or batched by the loaders
+        data = self.execute("query($id: UUID!) { thread(postId: $id) { post { replyToPost { content } } } }", id=str(reply.id))
+        self.assertIsNone(data["thread"]["post"]["replyToPost"])
+        data = self.execute(
+            "query($id: UUID!) { commentReplies(commentId: $id) { content parentComment { content } } }", id=str(top.id)
+        )
+        self.assertEqual(data["commentReplies"], [{"content": "nested", "parentComment": None}])
+
+    def test_hidden_posts_cannot_be_engaged_with(self):
+        request = RequestFactory().post("/graphql")
+        request.user = self.stranger
+        for mutation in (
+            "mutation($id: UUID!) { likePost(postId: $id) { like { post { content } } } }",
+            "mutation($id: UUID!) { sharePost(postId: $id) { share { post { content } } } }",
+            'mutation($id: UUID!) { createComment(input: {postId: $id, content: "hi"}) { comment { post { content } } } }',
+        ):
+            with self.subTest(mutation=mutation):
+                result = schema.execute(mutation, context_value=request, variable_values={"id": str(self.posts["followers"].id)})
+                self.assertEqual([e.message for e in result.errors], ["Post not found"])
+
+        ids = [str(post.id) for post in self.posts.values()]
+        data = self.execute("mutation($ids: [UUID!]!) { likePosts(postIds: $ids) { likes { post { content } } } }", self.stranger, ids=ids)
+        self.assertEqual([like["post"]["content"] for like in data["likePosts"]["likes"]], ["public reply"])
+        data = self.execute("mutation($ids: [UUID!]!) { likePosts(postIds: $ids) { likes { post { content } } } }", self.follower, ids=ids)
+        self.assertEqual(sorted(like["post"]["content"] for like in data["likePosts"]["likes"]), ["followers", "public reply"])
+        self.assertFalse(Like.objects.filter(post__in=[self.posts["private"], self.posts["flagged"]]).exists())
+
+    def test_home_feed_drops_private_entries(self):
+        data = self.execute("{ homeFeed(limit: 10) { items { content } } }", self.follower)
+        self.assertEqual(sorted(i["content"] for i in data["homeFeed"]["items"]), ["followers", "public", "public reply"])
+
+    def test_cached_posts_are_checked_per_viewer(self):
+        query = "query($id: UUID!) { post(id: $id) { content replies { content } } }"
+        followers_only = str(self.posts["followers"].id)
+        # the author warms the shared cache; others must still be filtered
+        self.assertEqual(self.execute(query, self.author, id=followers_only)["post"]["content"], "followers")
+        self.assertIsNone(self.execute(query, self.stranger, id=followers_only)["post"])
+        self.assertIsNone(self.execute(query, None, id=str(self.posts["private"].id))["post"])
+        # the post comes from the cache; the only query is the viewer's follow of the author
+        with self.assertNumQueries(1):
+            self.assertEqual(self.execute(query, self.follower, id=followers_only)["post"]["content"], "followers")
+
+    def test_enforcement_keeps_query_counts(self):
+        # the follow check is an EXISTS inside the page query, not a query per row
+        with self.assertNumQueries(1):
+            self.execute(
+                "query($id: UUID!) { authorFeed(authorId: $id, limit: 10) { items { author { username } } } }",
+                self.follower, id=str(self.author.id),
+            )
+        # replies come from one query; the follow check for the followers-only ones is one more
+        with self.assertNumQueries(2):
+            self.execute("query($id: UUID!) { replies(postId: $id) { content } }", self.follower, id=str(self.root.id))
+
+
+class IndexUsageTests(GraphQLTestCase):
+    """Each list resolver's SQL must be served by its partial (live rows only) index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", "author@mail.com", "pw")
+        cls.post = Post.objects.create(author=cls.author, content="root")
+        cls.comment = Comment.objects.create(post=cls.post, author=cls.author, content="top")
+
+    def plan(self, sql, params):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # tiny test tables would otherwise be scanned sequentially
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN " + sql, params)
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return "\n".join(str(row) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, index, query, **variables):
+        cache.clear()
+        with CaptureSQL() as statements:
+            self.execute(query, **variables)
+        plans = [self.plan(sql, params) for sql, params in statements]
+        self.assertTrue(any(index in plan for plan in plans), f"{index} not used:\n" + "\n".join(plans))
+
+    def test_resolvers_use_partial_indexes(self):
+        post_id, comment_id = str(self.post.id), str(self.comment.id)
+        self.assertUsesIndex("posts_public_global_idx", "{ globalFeed(limit: 5) { items { id } } }")
+        self.assertUsesIndex(
+            "posts_live_author_idx",
+            "query($id: UUID!) { authorFeed(authorId: $id, limit: 5) { items { id } } }",
+            id=str(self.author.id),
+        )
+        self.assertUsesIndex("posts_live_replies_idx", "query($id: UUID!) { replies(postId: $id) { id } }", id=post_id)
+        self.assertUsesIndex("posts_live_replies_idx", "query($id: UUID!) { post(id: $id) { replies { id } } }", id=post_id)
+        self.assertUsesIndex("comments_live_top_idx", "query($id: UUID!) { comments(postId: $id) { id } }", id=post_id)
+        self.assertUsesIndex(
+            "comments_live_replies_idx", "query($id: UUID!) { commentReplies(commentId: $id) { id } }", id=comment_id
+        )
+        self.assertUsesIndex(
+            "posts_live_replies_idx", "query($id: UUID!) { thread(postId: $id) { post { id } } }", id=post_id
+        )
+        self.assertUsesIndex(
+            "comments_live_top_idx", "query($id: UUID!) { commentTree(postId: $id) { items { comment { id } } } }", id=post_id
+        )
+
+
+class CaptureSQL:
+    """Collect ``(sql, params)`` for every SELECT run inside the block."""
+
+    def __enter__(self):
+        self.statements = []
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self.statements
+
+    def __exit__(self, *exc):
+        self.wrapper.__exit__(*exc)
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class EngagementCounterTests(GraphQLTestCase):
+    def test_counters_follow_mutations(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        fan = User.objects.create_user("fan", "fan@mail.com", "pw")
+        post = Post.objects.create(author=author, content="hello")
+        post_id = str(post.id)
+
+        self.execute("mutation($id: UUID!) { likePost(postId: $id) { like { id } } }", user=fan, id=post_id)
+        self.execute("mutation($id: UUID!) { likePost(postId: $id) { like { id } } }", user=fan, id=post_id)
+        self.execute("mutation($id: UUID!) { sharePost(postId: $id) { share { id } } }", user=fan, id=post_id)
+        self.execute('mutation($id: UUID!) { createComment(input: {postId: $id, content: "hi"}) { comment { id } } }', user=fan, id=post_id)
+        self.execute('mutation($id: UUID!) { createPost(input: {replyToPostId: $id, content: "re"}) { post { id } } }', user=fan, id=post_id)
+
+        with self.assertNumQueries(1):
+            data = self.execute(
+                "query($id: UUID!) { post(id: $id) { likeCount shareCount commentCount replyCount } }", id=post_id
+            )
+        self.assertEqual(data["post"], {"likeCount": 1, "shareCount": 1, "commentCount": 1, "replyCount": 1})
+
+        self.execute("mutation($id: UUID!) { unlikePost(postId: $id) { ok } }", user=fan, id=post_id)
+        self.execute("mutation($id: UUID!) { unsharePost(postId: $id) { ok } }", user=fan, id=post_id)
+        post.refresh_from_db()
+        self.assertEqual((post.like_count, post.share_count), (0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        post = Post.objects.create(author=author, content="hello", like_count=5)
+        Like.objects.create(user=author, post=post)
+
+        call_command("reconcile_post_counters", batch_size=1, stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+
+    def test_reconcile_sets_every_counter_in_one_statement(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        drifted = Post.objects.create(author=author, content="drifted")
+        exact = Post.objects.create(author=author, content="exact", like_count=1)
+        Like.objects.create(user=author, post=drifted)
+        Like.objects.create(user=author, post=exact)
+        Share.objects.create(user=author, post=drifted)
+        Comment.objects.create(author=author, post=drifted, content="kept")
+        Comment.objects.create(author=author, post=drifted, content="gone", deleted_at=timezone.now())
+        Post.objects.create(author=author, content="reply", reply_to_post=drifted)
+        Post.objects.filter(pk=drifted.pk).update(like_count=9, share_count=0, comment_count=4, reply_count=2)
+
+        # the row locks and the UPDATE, inside a savepoint
+        with self.assertNumQueries(4):
+            self.assertEqual(counters.reconcile([drifted.pk, exact.pk]), 1)
+
+        drifted.refresh_from_db()
+        self.assertEqual(
+            (drifted.like_count, drifted.share_count, drifted.comment_count, drifted.reply_count), (1, 1, 1, 1)
+        )
+        self.assertEqual(counters.reconcile([drifted.pk, exact.pk]), 0)
+
+    def test_reconcile_task_walks_every_batch_one_run_at_a_time(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        posts = Post.objects.bulk_create(Post(author=author, content=f"post {i}", like_count=3) for i in range(5))
+
+        cache.add(tasks.RECONCILE_LOCK_KEY, 1)  # a run in progress
+        self.assertEqual(tasks.reconcile_post_counters.delay(batch_size=2).get(), 0)
+        self.assertEqual(Post.objects.filter(like_count=3).count(), 5)
+
+        cache.delete(tasks.RECONCILE_LOCK_KEY)
+        self.assertEqual(tasks.reconcile_post_counters.delay(batch_size=2).get(), len(posts))
+        self.assertFalse(Post.objects.filter(like_count=3).exists())
+        self.assertIsNone(cache.get(tasks.RECONCILE_LOCK_KEY))
+
+    def test_reconcile_run_that_outlived_its_lock_leaves_the_next_one_alone(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        Post.objects.bulk_create(Post(author=author, content=f"post {i}") for i in range(5))
+        seen = []
+
+        def reconcile(batch):
+            seen.append(batch)
+            cache.set(tasks.RECONCILE_LOCK_KEY, "next run")  # ours expired and the next beat took it
+            return len(batch)
+
+        self.assertEqual(tasks.reconcile_in_batches(Post.objects.all(), reconcile, tasks.RECONCILE_LOCK_KEY, 2), 2)
+        self.assertEqual(len(seen), 1)  # stopped, leaving the rest to the newer run
+        self.assertEqual(cache.get(tasks.RECONCILE_LOCK_KEY), "next run")
+
+
+class SeedDataTests(GraphQLTestCase):
+    OPTIONS = dict(users=60, posts=300, comments=200, likes=600, shares=60, follows=8, chunk_size=50, stdout=StringIO())
+
+    def test_generates_consistent_searchable_data(self):
+        call_command("seed_data", **self.OPTIONS)
+
+        self.assertEqual((User.objects.count(), Post.objects.count(), Comment.objects.count()), (60, 300, 200))
+        self.assertTrue(Follow.objects.exists() and Like.objects.exists() and Share.objects.exists())
+        # counters are already right
+        out = StringIO()
+        call_command("reconcile_post_counters", stdout=out)
+        self.assertIn("corrected 0", out.getvalue())
+        followers = sorted(User.objects.values_list("follower_count", flat=True), reverse=True)
+        self.assertEqual(sum(followers), Follow.objects.count())
+        self.assertGreater(followers[0], 5 * followers[len(followers) // 2])  # a few accounts are popular
+        # comments come after what they answer
+        self.assertFalse(Comment.objects.filter(created_at__lt=F("post__created_at")).exists())
+        self.assertFalse(Comment.objects.filter(created_at__lt=F("parent_comment__created_at")).exists())
+
+        data = self.execute('{ searchPosts(query: "coffee", limit: 5) { items { id } } }')
+        self.assertTrue(data["searchPosts"]["items"])
+        # followers get their home timelines as fan-out would have written them
+        entry = TimelineEntry.objects.exclude(owner_id=F("author_id")).filter(post__visibility="public").first()
+        self.assertTrue(Follow.objects.filter(follower_id=entry.owner_id, followed_id=entry.author_id).exists())
+        data = self.execute("{ homeFeed(limit: 5) { items { id } } }", User.objects.get(pk=entry.owner_id))
+        self.assertTrue(data["homeFeed"]["items"])
+        self.assertTrue(self.client.login(username="user0", password="password"))
+
+    def test_same_seed_same_data(self):
+        call_command("seed_data", **self.OPTIONS)
+        first = list(Like.objects.order_by("user_id", "post_id").values_list("user_id", "post_id", "reaction"))
+        for model in (Like, Share, Comment, Follow, Post, User):
+            model.objects.all().delete()
+        call_command("seed_data", **self.OPTIONS)
+        self.assertEqual(list(Like.objects.order_by("user_id", "post_id").values_list("user_id", "post_id", "reaction")), first)
+
+
+class BenchmarkTests(TestCase):
+    def test_scenarios_run_and_regressions_are_caught(self):
+        generate(Plan(users=40, posts=200, comments=100, likes=200, shares=20, follows=5, chunk_size=50))
+        results = benchmarks.run_all(iterations=3)
+
+        self.assertEqual(set(results), {scenario.name for scenario in benchmarks.SCENARIOS})
+        self.assertEqual(benchmarks.compare(results, results), [])
+        slower = {name: {**measured, "queries": measured["queries"] + 1} for name, measured in results.items()}
+        self.assertEqual(len(benchmarks.compare(slower, results)), len(results))
+        # Latency within the tolerance passes
+        noisy = {name: {**measured, "p99_ms": measured["p99_ms"] * 1.4} for name, measured in results.items()}
+        self.assertEqual(benchmarks.compare(noisy, results, latency_tolerance=1.0), [])
+
+
+@skipUnless(connection.vendor == "postgresql", "single-statement upserts are PostgreSQL only")
+@override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+class ConcurrentEngagementTests(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author", "author@mail.com", "pw")
+        self.fans = User.objects.bulk_create(User(username=f"fan{i}", email=f"fan{i}@mail.com") for i in range(10))
+        self.post = Post.objects.create(author=self.author, content="hello")
+
+    def test_like_is_one_round_trip(self):
+        with self.assertNumQueries(1):
+            (like,) = engagement.like(self.fans[0], [self.post.id], "love")
+        self.assertEqual((like.post_id, like.reaction), (self.post.id, "love"))
+
+        Post.objects.filter(id=self.post.id).update(deleted_at=timezone.now())
+        with self.assertNumQueries(1):
+            self.assertEqual(engagement.like(self.fans[1], [self.post.id]), [])
+
+    def test_concurrent_double_taps_keep_one_row_and_exact_counters(self):
+        taps = [fan for fan in self.fans for _ in range(2)]
+        barrier = threading.Barrier(len(taps))
+        errors = []
+
+        def tap(fan):
+            try:
+                barrier.wait()
+                engagement.like(fan, [self.post.id])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tap, args=(fan,)) for fan in taps]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Like.objects.filter(post=self.post).count(), len(self.fans))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, len(self.fans))
+
+    def test_reconcile_during_likes_counts_each_once(self):
+        Post.objects.filter(id=self.post.id).update(like_count=7)
+        barrier = threading.Barrier(len(self.fans) + 1)
+        errors = []
+
+        def run(work):
+            try:
+                barrier.wait()
+                work()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        def reconcile():
+            for _ in range(5):
+                counters.reconcile([self.post.id])
+
+        threads = [threading.Thread(target=run, args=(lambda fan=fan: engagement.like(fan, [self.post.id]),)) for fan in self.fans]
+        threads.append(threading.Thread(target=run, args=(reconcile,)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, len(self.fans))
+
+
+class ResponseCacheTests(GraphQLTestCase):
+    QUERY = "query($id: UUID!) { post(id: $id) { content author { username } } }"
+
+    def test_warm_reads_skip_the_database_until_invalidated(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        post = Post.objects.create(author=author, content="hello")
+        post_id = str(post.id)
+
+        self.execute(self.QUERY, id=post_id)
+        with self.assertNumQueries(0):
+            data = self.execute(self.QUERY, id=post_id)
+        self.assertEqual(data["post"], {"content": "hello", "author": {"username": "author"}})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute('mutation($id: UUID!) { updatePost(input: {postId: $id, content: "edited"}) { post { id } } }', user=author, id=post_id)
+        self.assertEqual(self.execute(self.QUERY, id=post_id)["post"]["content"], "edited")
+
+    def test_first_feed_page_is_invalidated_by_new_posts(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        Post.objects.create(author=author, content="first")
+        query = "{ globalFeed(limit: 5) { items { content } } }"
+
+        self.execute(query)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute('mutation { createPost(input: {content: "second"}) { post { id } } }', user=author)
+        items = self.execute(query)["globalFeed"]["items"]
+        self.assertEqual([p["content"] for p in items], ["second", "first"])
+
+
+class SideEffectPipelineTests(GraphQLTestCase):
+    def test_fan_out_runs_after_commit(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        fans = User.objects.bulk_create(User(username=f"fan{i}", email=f"fan{i}@mail.com") for i in range(30))
+        Follow.objects.bulk_create(Follow(follower=fan, followed=author) for fan in fans)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            data = self.execute('mutation { createPost(input: {content: "hi"}) { post { id } } }', user=author)
+        post_id = data["createPost"]["post"]["id"]
+        # Only the author's own entry is written inside the request
+        self.assertEqual(TimelineEntry.objects.filter(post_id=post_id).count(), 1)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(TimelineEntry.objects.filter(post_id=post_id).count(), 31)
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=3)
+class HomeTimelineTests(GraphQLTestCase):
+    """Pushed entries and pulled celebrity posts merge into one ordered, duplicate-free timeline."""
+
+    QUERY = """
+        query($after: String) { homeFeed(limit: 3, after: $after) { hasNext endCursor items { id } } }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user("viewer", "viewer@mail.com", "pw")
+        cls.friend = User.objects.create_user("friend", "friend@mail.com", "pw")
+        cls.celebrity = User.objects.create_user("celebrity", "celebrity@mail.com", "pw")
+        fans = User.objects.bulk_create(User(username=f"fan{i}", email=f"fan{i}@mail.com") for i in range(2))
+        Follow.objects.bulk_create(
+            [Follow(follower=cls.viewer, followed=cls.friend), Follow(follower=cls.viewer, followed=cls.celebrity)]
+            + [Follow(follower=fan, followed=cls.celebrity) for fan in fans]
+        )
+        User.objects.filter(pk=cls.friend.pk).update(follower_count=1)
+
+        start = timezone.now() - timezone.timedelta(hours=1)
+        authors = [cls.friend, cls.celebrity] * 4
+        cls.posts = []
+        for i, author in enumerate(authors):
+            # the first two posts share a timestamp, so their order comes from the id
+            created_at = start + timezone.timedelta(minutes=max(i, 1))
+            cls.posts.append(Post.objects.create(author=author, content=f"post {i}", created_at=created_at))
+        # the celebrity's first post was pushed before they crossed the threshold; later ones are pulled
+        for post in cls.posts[:2]:
+            timeline.fan_out_post(post)
+        User.objects.filter(pk=cls.celebrity.pk).update(follower_count=3)
+        for post in cls.posts[2:]:
+            timeline.fan_out_post(post)
+
+    def pages(self, user):
+        ids, after = [], None
+        while True:
+            page = self.execute(self.QUERY, user, after=after)["homeFeed"]
+            ids.extend(item["id"] for item in page["items"])
+            if not page["hasNext"]:
+                return ids
+            after = page["endCursor"]
+
+    def test_fan_out_skips_celebrities(self):
+        self.assertEqual(timeline.celebrity_ids_followed_by(self.viewer.id), [self.celebrity.id])
+        pushed = TimelineEntry.objects.filter(owner=self.viewer).values_list("post_id", flat=True)
+        self.assertEqual(
+            sorted(pushed, key=str),
+            sorted([self.posts[0].id, self.posts[1].id, *(p.id for p in self.posts[2::2])], key=str),
+        )
+
+    def test_pages_merge_both_streams_once_in_order(self):
+        ordered = sorted(self.posts, key=lambda p: (p.created_at, p.id), reverse=True)
+        self.assertEqual(self.pages(self.viewer), [str(p.id) for p in ordered])
+
+    def test_unfollowing_drops_the_author(self):
+        for author in (self.friend, self.celebrity):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.execute(
+                    "mutation($id: UUID!) { unfollowUser(followedId: $id) }", self.viewer, id=str(author.id)
+                )
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.viewer).exists())
+        self.assertEqual(self.pages(self.viewer), [])
+
+
+class SearchPostsTests(GraphQLTestCase):
+    QUERY = """
+        query($q: String!, $after: String) {
+            searchPosts(query: $q, limit: 2, after: $after) { hasNext endCursor items { content cursor } }
+        }
+    """
+
+    def test_ranked_pages(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        with self.captureOnCommitCallbacks(execute=True):
+            for content in ["the quick brown fox", "quick quick fox jumps", "lazy dog", "fox fox fox quick"]:
+                Post.objects.create(author=author, content=content)
+            Post.objects.create(author=author, content="quick fox, deleted", deleted_at=timezone.now())
+
+        first = self.execute(self.QUERY, q="quick fox")["searchPosts"]
+        self.assertEqual([p["content"] for p in first["items"]], ["fox fox fox quick", "quick quick fox jumps"])
+        self.assertTrue(first["hasNext"])
+
+        second = self.execute(self.QUERY, q="quick fox", after=first["endCursor"])["searchPosts"]
+        self.assertEqual([p["content"] for p in second["items"]], ["the quick brown fox"])
+        self.assertFalse(second["hasNext"])
+        # an item's own cursor continues the ranked list too
+        self.assertEqual(first["items"][-1]["cursor"], first["endCursor"])
+        rest = self.execute(self.QUERY, q="quick fox", after=first["items"][0]["cursor"])["searchPosts"]
+        self.assertEqual([p["content"] for p in rest["items"]], ["quick quick fox jumps", "the quick brown fox"])
+
+    def test_edits_are_reindexed(self):
+        author = User.objects.create_user("author", "author@mail.com", "pw")
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=author, content="original words")
+        with self.captureOnCommitCallbacks(execute=True):
+            post.content = "replacement text"
+            post.save()
+
+        self.assertEqual(self.execute(self.QUERY, q="original")["searchPosts"]["items"], [])
+        self.assertEqual(len(self.execute(self.QUERY, q="replacement")["searchPosts"]["items"]), 1)
+
+
+@override_settings(GRAPHQL_TRACE_SAMPLE_RATE=0)
+class PersistedQueryTests(TestCase):
+    QUERY = "{ globalFeed(limit: 1) { hasNext } }"
+
+    def setUp(self):
+        cache.clear()
+        FeedGraphQLView.documents.clear()
+
+    def post(self, **body):
+        return self.client.post("/graphql", body, content_type="application/json").json()
+
+    def test_hash_only_requests_after_registration(self):
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": hashlib.sha256(self.QUERY.encode()).hexdigest()}}
+
+        missing = self.post(extensions=extensions)
+        self.assertEqual(missing["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND")
+
+        self.assertEqual(self.post(query=self.QUERY, extensions=extensions), {"data": {"globalFeed": {"hasNext": False}}})
+
+        hits = metrics.value("graphql_document_cache_hits_total")
+        self.assertEqual(self.post(extensions=extensions), {"data": {"globalFeed": {"hasNext": False}}})
+        self.assertEqual(metrics.value("graphql_document_cache_hits_total"), hits + 1)
+
+    @override_settings(GRAPHQL_PERSISTED_QUERY_TTL=60, GRAPHQL_PERSISTED_QUERY_MAX_BYTES=100)
+    def test_registrations_expire_and_large_documents_are_not_kept(self):
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": hashlib.sha256(self.QUERY.encode()).hexdigest()}}
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.post(query=self.QUERY, extensions=extensions)
+        cache_set.assert_any_call("apq:" + extensions["persistedQuery"]["sha256Hash"], self.QUERY, 60)
+
+        large = self.QUERY + " " * 100
+        digest = hashlib.sha256(large.encode()).hexdigest()
+        body = self.post(query=large, extensions={"persistedQuery": {"version": 1, "sha256Hash": digest}})
+        self.assertEqual(body, {"data": {"globalFeed": {"hasNext": False}}})
+        self.assertIsNone(cache.get("apq:" + digest))
+
+    def test_mismatched_hash_is_rejected(self):
+        body = self.post(query=self.QUERY, extensions={"persistedQuery": {"version": 1, "sha256Hash": "0" * 64}})
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "INVALID_PERSISTED_QUERY")
+
+
+@override_settings(GRAPHQL_TRACE_SAMPLE_RATE=0)
+class QueryCostTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("author", "author@mail.com", "pw")
+        cls.root = Post.objects.create(author=cls.user, content="root")
+
+    def setUp(self):
+        cache.clear()
+        FeedGraphQLView.documents.clear()
+
+    def post(self, query, token=None, **variables):
+        headers = {"HTTP_AUTHORIZATION": f"JWT {token}"} if token else {}
+        return self.client.post("/graphql", {"query": query, "variables": variables}, content_type="application/json", **headers)
+
+    def test_cost_weights_lists_by_limit_and_nesting(self):
+        document = parse("""
+            query($n: Int) {
+                globalFeed(limit: $n) { items { author { username } replies { id } } }
+                followers(userId: "00000000-0000-0000-0000-000000000000", limit: 100000) { items { username } }
+            }
+        """)
+        # 1 + 5 items + 5 authors + 5 * 5 replies (inheriting the limit), + 1 + 100 (clamped) followers
+        self.assertEqual(cost.operation_cost(schema.graphql_schema, document, variables={"n": 5}), 36 + 101)
+
+    def test_expensive_and_deep_documents_are_rejected_before_execution(self):
+        nested = "query($id: UUID!) { post(id: $id) { replies { replies { replies { replies { author { username } } } } } } }"
+        with self.assertNumQueries(0):
+            response = self.post(nested, id=str(self.root.id))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["extensions"]["code"], "QUERY_TOO_COMPLEX")
+
+        deep = "{ thread(postId: \"%s\") %s }" % (self.root.id, "{ replies " * 12 + "{ hasMoreReplies }" + " }" * 12)
+        self.assertIn("exceeds maximum operation depth", self.post(deep).json()["errors"][0]["message"])
+
+        # the cost is priced per request, so the same document passes with smaller variables
+        query = "query($n: Int) { globalFeed(limit: $n) { items { replies { replies { id } } } } }"
+        self.assertEqual(self.post(query, n=100).status_code, 400)
+        self.assertEqual(self.post(query, n=10).json(), {"data": {"globalFeed": {"items": [{"replies": []}]}}})
+
+    @override_settings(GRAPHQL_RATE_BUDGET=100, GRAPHQL_RATE_REFILL=0.01)
+    def test_each_client_spends_its_own_budget(self):
+        query = "{ globalFeed(limit: 30) { items { id } } }"  # costs 31
+        token = get_token(self.user)
+        for _ in range(3):
+            self.assertEqual(self.post(query, token).status_code, 200)
+        response = self.post(query, token)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["errors"][0]["extensions"]["code"], "RATE_LIMITED")
+
+        # anonymous clients (by address) have their own bucket
+        self.assertEqual(self.post(query).status_code, 200)
+
+    @override_settings(GRAPHQL_RATE_BUDGET=100, GRAPHQL_RATE_REFILL=0.01)
+    def test_junk_or_fresh_tokens_buy_no_extra_budget(self):
+        query = "{ globalFeed(limit: 30) { items { id } } }"  # costs 31
+        for _ in range(3):
+            self.assertEqual(self.post(query).status_code, 200)
+        # invalid tokens are charged to the address
+        for junk in ("junk", "a.b.c", get_token(self.user) + "x"):
+            self.assertEqual(self.post(query, junk).status_code, 429)
+
+        # a user's tokens share one bucket, however many they mint
+        for _ in range(3):
+            self.assertEqual(self.post(query, get_token(self.user)).status_code, 200)
+        fresh = jwt_encode({**jwt_payload(self.user), "jti": "another"})
+        self.assertEqual(self.post(query, fresh).status_code, 429)
+
+
+@override_settings(GRAPHQL_TRACE_SAMPLE_RATE=0)
+class JWTAuthTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("author", "author@mail.com", "pw")
+        cls.token = get_token(cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, query, token):
+        return self.client.post(
+            "/graphql", {"query": query}, content_type="application/json", HTTP_AUTHORIZATION=f"JWT {token}"
+        ).json()
+
+    def test_user_is_verified_once_and_loaded_only_when_needed(self):
+        query = "{ homeFeed(limit: 5) { items { id } } }"  # 2 queries of its own
+        with self.assertNumQueries(3):  # + the snapshot
+            self.assertEqual(self.post(query, self.token)["data"]["homeFeed"]["items"], [])
+        # later requests answer from the cached snapshot
+        with self.assertNumQueries(2):
+            self.post(query, self.token)
+        with self.assertNumQueries(1):  # the full row, for `me`
+            self.assertEqual(self.post("{ me { username } }", self.token), {"data": {"me": {"username": "author"}}})
+        # the mutation uses the row as a model instance
+        with CaptureSQL() as statements:
+            self.post('mutation { createPost(input: {content: "hi"}) { post { id } } }', self.token)
+        self.assertEqual(sum('FROM "accounts_user"' in sql for sql, _ in statements), 1)
+
+    @override_settings(GRAPHQL_RATE_BUDGET=0)
+    def test_documents_that_never_read_the_viewer_skip_verification(self):
+        self.post("{ globalFeed(limit: 5) { items { id } } }", self.token)
+        self.assertIsNone(cache.get(auth.CACHE_PREFIX + auth.token_digest(self.token)))
+
+    def test_invalid_token_fails_the_fields_that_read_the_user(self):
+        body = self.post("{ me { username } globalFeed(limit: 5) { items { id } } }", "not-a-token")
+        self.assertEqual(body["errors"][0]["message"], "Error decoding signature")
+        self.assertEqual(body["data"], {"me": None, "globalFeed": {"items": []}})
+
+
+@skipUnless(connection.vendor == "sqlite", "the replica stand-in is a second SQLite database")
+@override_settings(DATABASE_REPLICAS=["replica"], GRAPHQL_TRACE_SAMPLE_RATE=0)
+class ReplicaRoutingTests(TestCase):
+    """``replica`` is a separate SQLite file that replication never reaches, so it shows who read what."""
+
+    databases = "__all__"  # including `replica`, added before the databases are set up
+    FEED = "query($id: UUID!) { authorFeed(authorId: $id) { items { content } } }"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        name = os.path.join(cls.replica_dir.name, "replica.sqlite3")
+        connections.settings["replica"] = {**connections.settings["default"], "NAME": name}
+        call_command("migrate", database="replica", verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.replica_dir.cleanup()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", "author@mail.com", "pw")
+        User.objects.using("replica").create(id=cls.author.id, username="author", email="author@mail.com")
+        Post.objects.create(author=cls.author, content="only on the primary")
+
+    def setUp(self):
+        cache.clear()
+        replicas._health.clear()
+
+    def feed(self, token=None, addr="10.0.0.1"):
+        headers = {"HTTP_AUTHORIZATION": f"JWT {token}"} if token else {}
+        response = self.client.post(
+            "/graphql", {"query": self.FEED, "variables": {"id": str(self.author.id)}},
+            content_type="application/json", REMOTE_ADDR=addr, **headers,
+        )
+        return [item["content"] for item in response.json()["data"]["authorFeed"]["items"]]
+
+    def test_queries_read_replicas_and_writers_read_their_writes(self):
+        token = get_token(self.author)
+        self.assertEqual(self.feed(), [])
+        self.assertEqual(self.feed(token), [])
+
+        response = self.client.post(
+            "/graphql", {"query": 'mutation { createPost(input: {content: "new"}) { post { id } } }'},
+            content_type="application/json", HTTP_AUTHORIZATION=f"JWT {token}",
+        )
+        self.assertNotIn("errors", response.json())
+        self.assertFalse(Post.objects.using("replica").exists())  # written to the primary
+
+        self.assertEqual(self.feed(token), ["new", "only on the primary"])
+        self.assertEqual(self.feed(), [])  # other clients stay on the replica
+
+    @override_settings(ROOT_URLCONF="social_feed.asgi_urls")
+    async def test_async_queries_read_replicas(self):
+        body = {"query": self.FEED, "variables": {"id": str(self.author.id)}}
+        response = await self.async_client.post("/graphql", body, content_type="application/json")
+        self.assertEqual(response.json(), {"data": {"authorFeed": {"items": []}}})
+
+    def test_unhealthy_replicas_are_skipped(self):
+        self.assertEqual(self.feed(), [])
+        replicas._health["replica"] = (False, time.monotonic())
+        self.assertEqual(self.feed(), ["only on the primary"])
+
+
+@skipUnless(connection.vendor == "postgresql", "statement timeouts are PostgreSQL only")
+@override_settings(GRAPHQL_QUERY_STATEMENT_TIMEOUT_MS=1500, GRAPHQL_MUTATION_STATEMENT_TIMEOUT_MS=2500)
+class StatementTimeoutTests(TransactionTestCase):
+    def current(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            return cursor.fetchone()[0]
+
+    def test_operations_set_their_timeout_once_and_reset_it(self):
+        connection.ensure_connection()
+        default = self.current()
+        with timeouts.scope(OperationType.QUERY):
+            timeouts.apply()
+            self.assertEqual(self.current(), "1500ms")
+            with self.assertNumQueries(0):
+                timeouts.apply()
+        # whatever runs next on the connection gets the default back
+        self.assertFalse(timeouts.narrowed())
+        self.assertEqual(self.current(), default)
+        with timeouts.scope(OperationType.MUTATION):
+            self.assertTrue(timeouts.pending())
+            timeouts.apply()
+            self.assertEqual(self.current(), "2500ms")
+        self.assertEqual(self.current(), default)
+
+        # connections opened during an operation get it as they connect
+        connection.close()
+        with timeouts.scope(OperationType.QUERY):
+            self.assertEqual(self.current(), "1500ms")
+        self.assertEqual(self.current(), default)
+
+
+@override_settings(GRAPHQL_TRACE_SAMPLE_RATE=0, GRAPHQL_TRACING_RESPONSE=True)
+class TracingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("author", "author@mail.com", "pw")
+        cls.posts = [Post.objects.create(author=cls.user, content=f"post {i}") for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, query, **body):
+        return self.client.post("/graphql", {"query": query, **body}, content_type="application/json").json()
+
+    def test_fields_and_their_sql_are_reported(self):
+        calls = metrics.value("graphql_field_calls_total", field="Query.globalFeed")
+        with self.assertLogs("social_feed.tracing", "INFO"):
+            body = self.post("{ globalFeed(limit: 5) { items { content author { username } } } }", extensions={"tracing": True})
+        trace = body["extensions"]["tracing"]
+        fields = {f["field"]: f for f in trace["fields"]}
+        self.assertEqual(fields["Query.globalFeed"]["sqlCount"], 1)  # the page, joined with authors
+        self.assertEqual(fields["PostPage.items"]["calls"], 1)
+        self.assertEqual(fields["PostType.author"]["calls"], 3)
+        self.assertEqual(fields["PostType.author"]["sqlCount"], 0)
+        self.assertEqual(trace["duplicates"], [])
+        self.assertEqual(metrics.value("graphql_field_calls_total", field="Query.globalFeed"), calls + 1)
+
+        # unsampled requests are not traced
+        self.assertNotIn("extensions", self.post("{ globalFeed(limit: 5) { items { content } } }"))
+
+    def test_repeated_statements_are_flagged(self):
+        query = "query($a: UUID!, $b: UUID!, $c: UUID!) { a: post(id: $a) { id } b: post(id: $b) { id } c: post(id: $c) { id } }"
+        ids = dict(zip("abc", (str(post.id) for post in self.posts)))
+        with self.assertLogs("social_feed.tracing", "WARNING"):
+            body = self.post(query, variables=ids, extensions={"tracing": True})
+        (duplicate,) = body["extensions"]["tracing"]["duplicates"]
+        self.assertEqual((duplicate["count"], duplicate["fields"]), (3, ["Query.post"]))
+
+
+@override_settings(ROOT_URLCONF="social_feed.asgi_urls", GRAPHQL_TRACE_SAMPLE_RATE=0)
+class AsyncExecutionTests(TestCase):
+    QUERY = """
+        query($id: UUID!) {
+            post(id: $id) { content author { username } replies { content } }
+            comments(postId: $id) { content author { username } }
+            shareCount(postId: $id)
+            globalFeed(limit: 5) { total items { content author { username } } }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", "author@mail.com", "pw")
+        cls.post = Post.objects.create(author=cls.author, content="hello", share_count=2)
+        Post.objects.create(author=cls.author, content="reply", reply_to_post=cls.post)
+        Comment.objects.create(post=cls.post, author=cls.author, content="nice")
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_matches_sync_execution(self):
+        body = {"query": self.QUERY, "variables": {"id": str(self.post.id)}}
+        response = await self.async_client.post("/graphql", body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+
+        expected = await sync_to_async(schema.execute)(
+            self.QUERY, context_value=RequestFactory().post("/graphql"), variable_values=body["variables"]
+        )
+        self.assertEqual(response.json(), {"data": expected.data})
+
+    async def test_authenticated_mutation(self):
+        token = await sync_to_async(get_token)(self.author)
+        response = await self.async_client.post(
+            "/graphql",
+            {"query": 'mutation { createPost(input: {content: "async"}) { post { content author { username } } } }'},
+            content_type="application/json",
+            headers={"Authorization": f"JWT {token}"},
+        )
+        self.assertEqual(
+            response.json(), {"data": {"createPost": {"post": {"content": "async", "author": {"username": "author"}}}}}
+        )
+
+
+@override_settings(REALTIME_COALESCE_SECONDS=0.3)
+class SubscriptionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", "author@mail.com", "pw")
+        cls.fans = [User.objects.create_user(f"fan{i}", f"fan{i}@mail.com", "pw") for i in range(3)]
+        cls.post = Post.objects.create(author=cls.author, content="hello")
+
+    def setUp(self):
+        cache.clear()
+
+    async def connect(self, user=None):
+        from social_feed.consumers import GraphQLWSConsumer
+
+        communicator = WebsocketCommunicator(GraphQLWSConsumer.as_asgi(), "/graphql", subprotocols=["graphql-transport-ws"])
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        payload = {"Authorization": f"JWT {await sync_to_async(get_token)(user)}"} if user else {}
+        await communicator.send_json_to({"type": "connection_init", "payload": payload})
+        self.assertEqual(await communicator.receive_json_from(), {"type": "connection_ack"})
+        return communicator
+
+    def like_all(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for fan in self.fans:
+                GraphQLTestCase.execute(
+                    self, "mutation($id: UUID!) { likePost(postId: $id) { like { id } } }", user=fan, id=str(self.post.id)
+                )
+
+    async def test_engagement_updates_are_coalesced(self):
+        communicator = await self.connect()
+        await communicator.send_json_to({
+            "type": "subscribe",
+            "id": "1",
+            "payload": {
+                "query": "subscription($id: UUID!) { postEngagementChanged(postId: $id) { likeCount } }",
+                "variables": {"id": str(self.post.id)},
+            },
+        })
+        await asyncio.sleep(0.05)  # let the subscription join its group
+        await sync_to_async(self.like_all)()
+
+        # Three likes: the first is sent at once, the other two as one message
+        first = await communicator.receive_json_from(timeout=1)
+        second = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(second["payload"], {"data": {"postEngagementChanged": {"likeCount": 3}}})
+        self.assertEqual(first["type"], "next")
+        self.assertTrue(await communicator.receive_nothing(timeout=0.5))
+        await communicator.disconnect()
+
+    async def test_hidden_posts_cannot_be_watched(self):
+        private = await Post.objects.acreate(author=self.author, content="secret", visibility="private")
+        communicator = await self.connect(self.fans[0])
+        for field in ("postEngagementChanged(postId: $id) { likeCount }", "commentAdded(postId: $id) { content }"):
+            await communicator.send_json_to({
+                "type": "subscribe",
+                "id": field[:5],
+                "payload": {"query": "subscription($id: UUID!) { %s }" % field, "variables": {"id": str(private.id)}},
+            })
+            message = await communicator.receive_json_from(timeout=1)
+            self.assertEqual((message["type"], message["payload"][0]["message"]), ("error", "Post not found"))
+        await communicator.disconnect()
+
+    @override_settings(GRAPHQL_MAX_DEPTH=2, GRAPHQL_MAX_COST=2)
+    async def test_deep_and_expensive_documents_are_rejected(self):
+        communicator = await self.connect()
+        for op_id, query, expected in (
+            ("deep", "subscription { postCreated { replyToPost { replyToPost { id } } } }", "depth"),
+            ("costly", "subscription { postCreated { author { username } replyToPost { id } } }", "cost"),
+        ):
+            await communicator.send_json_to({"type": "subscribe", "id": op_id, "payload": {"query": query}})
+            message = await communicator.receive_json_from(timeout=1)
+            self.assertEqual((message["type"], message["id"]), ("error", op_id))
+            self.assertTrue(any(expected in error["message"] for error in message["payload"]), message)
+        await communicator.disconnect()
+
+    async def test_post_created_for_followed_authors(self):
+        fan = self.fans[0]
+        await Follow.objects.acreate(follower=fan, followed=self.author)
+        communicator = await self.connect(fan)
+        await communicator.send_json_to({
+            "type": "subscribe",
+            "id": "1",
+            "payload": {"query": "subscription { postCreated { content author { username } } }"},
+        })
+        await asyncio.sleep(0.05)
+
+        def create_post():
+            with self.captureOnCommitCallbacks(execute=True):
+                GraphQLTestCase.execute(self, 'mutation { createPost(input: {content: "fresh"}) { post { id } } }', user=self.author)
+
+        await sync_to_async(create_post)()
+        message = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(message["payload"], {"data": {"postCreated": {"content": "fresh", "author": {"username": "author"}}}})
+        await communicator.disconnect()
@@ -0,0 +1,156 @@
+# apps/posts/threads.py
+"""
+Whole reply trees and comment trees in a constant number of queries.
+
+One recursive CTE walks ``Post.reply_to_post`` (or ``Comment.parent_comment``)
+down from the root and returns only ``(id, parent_id, depth, created_at)`` for
+the subtree, down to one level below ``depth`` (so leaves know whether they have
+replies). The tree is assembled in memory, each node
+keeps its first ``limit`` children (the rest are reported through
+``has_more``), and the surviving rows are fetched with one ``IN (...)`` query.
+Cost is O(subtree) rows in three queries (tree, rows, authors) whatever the
+depth, instead of one query per node.
+
+Deleted nodes, and posts the viewer may not see, are pruned together with
+their subtrees (a comment tree is empty when its post is deleted or hidden), as in the one-level ``replies`` / ``commentReplies`` resolvers. The walk keeps
+at most ``THREAD_MAX_NODES`` rows, shallowest levels first (``ORDER BY depth``),
+so a huge thread is cut at its deepest levels; nodes on the levels the cut may
+have thinned report ``has_more``, so clients know to page them.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from .models import Post, Comment
+from .visibility import visible_sql
+
+User = get_user_model()
+
+MAX_DEPTH = 10
+MAX_LIMIT = 100
+
+# For post rows aliased `c`; params: viewer id twice
+VISIBLE_SQL = visible_sql("c", "%s")
+
+
+class Node:
+    """One tree node: ``obj`` plus its first ``limit`` children."""
+
+    __slots__ = ("obj", "depth", "children", "has_more")
+
+    def __init__(self, obj, depth):
+        self.obj = obj
+        self.depth = depth
+        self.children = []
+        self.has_more = False
+
+
+def max_nodes():
+    return getattr(settings, "THREAD_MAX_NODES", 2000)
+
+
+def _clamp(depth, limit):
+    return max(0, min(depth, MAX_DEPTH)), max(1, min(limit, MAX_LIMIT))
+
+
+def post_thread(post_id, depth=3, limit=10, viewer_id=None):
+    """The reply tree under ``post_id`` (oldest replies first) as seen by ``viewer_id``, or ``None``."""
+    depth, limit = _clamp(depth, limit)
+    viewer = _db_pk(User, viewer_id) if viewer_id is not None else None
+    anchor = f"""
+        SELECT id, reply_to_post_id, 0, created_at FROM {Post._meta.db_table} c
+        WHERE id = %s AND deleted_at IS NULL AND {VISIBLE_SQL}
+    """
+    rows = _walk(
+        Post, "reply_to_post_id", anchor, [_db_pk(Post, post_id), viewer, viewer], depth,
+        step_filter=f"AND {VISIBLE_SQL}", step_params=[viewer, viewer],
+    )
+    roots, _ = _assemble(Post, rows, limit, depth, newest_first=False)
+    return roots[0] if roots else None
+
+
+def comment_tree(post_id, depth=3, limit=20, viewer_id=None):
+    """
+    Top-level comments on ``post_id`` (newest first) with their replies (oldest
+    first) as seen by ``viewer_id``; returns ``(nodes, has_more)``, empty when
+    the post is deleted or hidden from the viewer.
+    """
+    depth, limit = _clamp(depth, limit)
+    viewer = _db_pk(User, viewer_id) if viewer_id is not None else None
+    post = _db_pk(Post, post_id)
+    # Only the first `limit` top-level comments seed the walk (+1 to detect more)
+    anchor = f"""
+        SELECT * FROM (
+            SELECT id, parent_comment_id, 0, created_at FROM {Comment._meta.db_table}
+            WHERE post_id = %s AND parent_comment_id IS NULL AND deleted_at IS NULL
+            AND EXISTS (
+                SELECT 1 FROM {Post._meta.db_table} c WHERE c.id = %s AND c.deleted_at IS NULL AND {VISIBLE_SQL}
+            )
+            ORDER BY created_at DESC, id DESC LIMIT %s
+        ) top_level
+    """
+    rows = _walk(Comment, "parent_comment_id", anchor, [post, post, viewer, viewer, limit + 1], depth)
+    return _assemble(Comment, rows, limit, depth, newest_first=True)
+
+
+def _db_pk(model, value):
+    return model._meta.pk.get_db_prep_value(value, connection)
+
+
+def _walk(model, parent_column, anchor, params, depth, step_filter="", step_params=()):
+    # One level past `depth` is read (ids only) so leaves can report `has_more`
+    table = model._meta.db_table
+    sql = f"""
+        WITH RECURSIVE tree(id, parent_id, depth, created_at) AS (
+            {anchor}
+            UNION ALL
+            SELECT c.id, c.{parent_column}, t.depth + 1, c.created_at
+            FROM {table} c JOIN tree t ON c.{parent_column} = t.id
+            WHERE t.depth <= %s AND c.deleted_at IS NULL {step_filter}
+        )
+        SELECT id, parent_id, depth, created_at FROM tree ORDER BY depth, created_at, id LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, depth, *step_params, max_nodes()])
+        rows = cursor.fetchall()
+
+    to_pk = model._meta.pk.to_python
+    return [(to_pk(pk), parent and to_pk(parent), level, created_at) for pk, parent, level, created_at in rows]
+
+
+def _assemble(model, rows, limit, depth, newest_first):
+    roots, children = [], defaultdict(list)
+    for pk, parent, level, created_at in rows:
+        (roots if level == 0 else children[parent]).append((created_at, pk))
+    for siblings in children.values():
+        siblings.sort()
+
+    # A capped walk lost rows at its last level, so that level's parents may miss
+    # children and its own nodes miss all of theirs
+    cut = rows[-1][2] if len(rows) >= max_nodes() else None
+
+    roots.sort(reverse=newest_first)
+    has_more = len(roots) > limit or cut == 0
+    roots = [pk for _, pk in roots[:limit]]
+
+    # Keep the first `limit` children of every node, level by level down to `depth`
+    levels, shown, more = {}, {}, {}
+    level = roots
+    for d in range(depth + 1):
+        below_level = []
+        for pk in level:
+            below = [child for _, child in children.get(pk, ())]
+            levels[pk] = d
+            shown[pk] = below[:limit] if d < depth else []
+            more[pk] = len(below) > len(shown[pk]) or (cut is not None and d >= cut - 1)
+            below_level += shown[pk]
+        level = below_level
+
+    objs = model.objects.in_bulk(list(levels))
+    nodes = {pk: Node(objs[pk], d) for pk, d in levels.items() if pk in objs}
+    for pk, node in nodes.items():
+        node.children = [nodes[child] for child in shown[pk] if child in nodes]
+        node.has_more = more[pk]
+    return [nodes[pk] for pk in roots if pk in nodes], has_more
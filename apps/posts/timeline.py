@@ -0,0 +1,142 @@
+# apps/posts/timeline.py
+"""
+Home timeline maintenance.
+
+New posts are pushed (fan-out-on-write) into the ``TimelineEntry`` rows of every
+follower. Authors at or above ``FEED_FANOUT_THRESHOLD`` followers are skipped on
+write; their posts are pulled (fan-out-on-read) and merged in when a home feed
+page is read.
+
+Mutations only write the author's own entry inline; follower fan-out, removal
+and follow backfills run in Celery tasks (``apps.posts.tasks``,
+``apps.social.tasks``).
+"""
+import heapq
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from apps.social.models import Follow
+from .models import Post, TimelineEntry
+from .pagination import keyset_filter, page_of
+from .visibility import visible_to
+
+User = get_user_model()
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def fanout_threshold():
+    return getattr(settings, "FEED_FANOUT_THRESHOLD", 10_000)
+
+
+def is_celebrity(user_id):
+    return User.objects.filter(id=user_id, follower_count__gte=fanout_threshold()).exists()
+
+
+def celebrity_ids_followed_by(user_id):
+    return list(
+        Follow.objects.filter(follower_id=user_id, followed__follower_count__gte=fanout_threshold())
+        .values_list("followed_id", flat=True)
+    )
+
+
+def _entry(owner_id, post):
+    return TimelineEntry(owner_id=owner_id, post_id=post.id, author_id=post.author_id, created_at=post.created_at)
+
+
+def _write(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=FANOUT_BATCH_SIZE, ignore_conflicts=True)
+
+
+# -------------------------
+# Write path
+# -------------------------
+def push_own_post(post):
+    """Put ``post`` in its author's timeline, so it is visible to them at once."""
+    _write([_entry(post.author_id, post)])
+
+
+def fan_out_post(post):
+    """Push ``post`` into every follower's timeline, unless its author is a celebrity."""
+    if is_celebrity(post.author_id):
+        return
+
+    follower_ids = (
+        Follow.objects.filter(followed_id=post.author_id)
+        .values_list("follower_id", flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    batch = []
+    for follower_id in follower_ids:
+        batch.append(_entry(follower_id, post))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            _write(batch)
+            batch = []
+    if batch:
+        _write(batch)
+
+
+def remove_post(post_id):
+    TimelineEntry.objects.filter(post_id=post_id).delete()
+
+
+def backfill_author(owner_id, author_id):
+    """Copy an author's recent posts into a new follower's timeline."""
+    if is_celebrity(author_id) or not Follow.objects.filter(follower_id=owner_id, followed_id=author_id).exists():
+        return
+    limit = getattr(settings, "FEED_BACKFILL_LIMIT", 200)
+    recent = Post.live.filter(author_id=author_id).order_by("-created_at")[:limit]
+    _write([_entry(owner_id, post) for post in recent])
+
+
+def drop_author(owner_id, author_id):
+    TimelineEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+
+
+# -------------------------
+# Read path
+# -------------------------
+def home_feed(user_id, limit, after=None, prepare=None):
+    """
+    Return ``(posts, has_next, end_cursor)`` for the user's home timeline.
+
+    ``prepare(qs, prefix="")`` may reshape the underlying querysets (e.g. with the
+    GraphQL optimizer); ``prefix`` is ``"post"`` for the timeline entry queryset.
+
+    Pushed entries come from one range scan over the timeline index; posts by
+    followed celebrities come from one scan over the per-author index. Both are
+    already ordered by (created_at, id), so they are merged without sorting.
+    """
+    window = limit + 1
+    prepare = prepare or (lambda qs, prefix="": qs)
+
+    entries = keyset_filter(
+        prepare(
+            TimelineEntry.objects.filter(visible_to(user_id, "post__"), owner_id=user_id, post__deleted_at__isnull=True)
+            .select_related("post"),
+            "post",
+        ),
+        after,
+        pk_field="post_id",
+    ).order_by("-created_at", "-post_id")[:window]
+    streams = [(entry.post for entry in entries)]
+
+    celebrity_ids = celebrity_ids_followed_by(user_id)
+    if celebrity_ids:
+        pulled = keyset_filter(
+            prepare(Post.live.filter(visible_to(user_id), author_id__in=celebrity_ids)), after
+        ).order_by("-created_at", "-id")[:window]
+        streams.append(pulled)
+
+    seen = set()
+    posts = []
+    for post in heapq.merge(*streams, key=lambda p: (p.created_at, p.id), reverse=True):
+        if post.id in seen:
+            continue
+        seen.add(post.id)
+        posts.append(post)
+        if len(posts) >= window:
+            break
+
+    return page_of(posts, limit)
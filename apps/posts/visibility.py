@@ -0,0 +1,65 @@
+# apps/posts/visibility.py
+"""
+Who may see a post.
+
+- ``public`` posts (and not ``is_private``) are visible to everyone,
+- ``followers`` posts to their author and the author's followers,
+- ``private`` posts, and any post flagged ``is_private``, to their author only,
+- soft-deleted posts to no one (list queries read ``Post.live``; ``can_see``
+  also rejects them, for parents joined with ``select_related``).
+
+List queries apply this as one SQL predicate (``visible_to``, or
+``visible_sql`` in raw statements): the followers
+case is an ``EXISTS`` probe of the viewer's row in ``follows``, which the
+``unique_follow`` (follower, followed) index answers without touching the
+table, so a page costs the same single query as before. The global feed only
+ever shows public posts, so it keeps one shared cache entry and its own
+partial index. Single posts read from the shared cache are checked in Python
+(``can_see``), with the follow looked up through the per-request
+``viewer_follows`` loader.
+"""
+from django.db.models import Exists, OuterRef, Q
+
+from apps.social.models import Follow
+from .models import PUBLIC
+
+
+def viewer_id(info):
+    user = getattr(info.context, "user", None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def visible_to(user_id, prefix=""):
+    """Q for posts ``user_id`` (``None`` when anonymous) may see; ``prefix`` targets a related post, e.g. ``"post__"``."""
+    public = Q(**{f"{prefix}{name}": value for name, value in PUBLIC.children})
+    if user_id is None:
+        return public
+    follows = Follow.objects.filter(follower_id=user_id, followed_id=OuterRef(f"{prefix}author_id"))
+    followers_only = Q(**{f"{prefix}visibility": "followers", f"{prefix}is_private": False})
+    return public | Q(**{f"{prefix}author_id": user_id}) | (followers_only & Exists(follows))
+
+
+def visible_sql(alias, viewer):
+    """``visible_to`` as raw SQL for post rows aliased ``alias``; ``viewer`` is the viewer id's placeholder."""
+    return f"""(
+        ({alias}.visibility = 'public' AND NOT {alias}.is_private)
+        OR {alias}.author_id = {viewer}
+        OR ({alias}.visibility = 'followers' AND NOT {alias}.is_private AND EXISTS (
+            SELECT 1 FROM {Follow._meta.db_table} f WHERE f.follower_id = {viewer} AND f.followed_id = {alias}.author_id
+        ))
+    )"""
+
+
+def is_public(post):
+    return post.visibility == "public" and not post.is_private
+
+
+def can_see(post, user_id):
+    """``True`` or ``False``, or ``None`` when it depends on ``user_id`` following the author."""
+    if post.deleted_at is not None:
+        return False  # e.g. a `select_related` parent that was deleted since
+    if is_public(post) or (user_id is not None and post.author_id == user_id):
+        return True
+    if user_id is None or post.is_private or post.visibility != "followers":
+        return False
+    return None
@@ -0,0 +1,50 @@
+# apps/social/counters.py
+"""
+Denormalized follower/following counters on the user model.
+
+Follow writes adjust both sides with single ``F()`` updates; ``reconcile``
+locks a batch of users and sets their real counts with one ``UPDATE``, so a
+follow that commits meanwhile is counted exactly once (see
+``apps.posts.counters``) and it can run while traffic is flowing.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Follow
+
+User = get_user_model()
+
+
+def _adjust(user_id, field, delta):
+    qs = User.objects.filter(pk=user_id)
+    if delta < 0:
+        # never drive a drifted counter below zero
+        qs = qs.filter(**{f"{field}__gte": -delta})
+    qs.update(**{field: F(field) + delta})
+
+
+def adjust_follow(follower_id, followed_id, delta):
+    _adjust(follower_id, "following_count", delta)
+    _adjust(followed_id, "follower_count", delta)
+
+
+def _count(qs, field):
+    return Coalesce(Subquery(
+        qs.filter(**{field: OuterRef("pk")}).order_by().values(field).annotate(n=Count("*")).values("n")
+    ), 0)
+
+
+def reconcile(user_ids):
+    """Repair counter drift for ``user_ids``; returns the number of users corrected."""
+    actual = {
+        "follower_count": _count(Follow.objects, "followed"),
+        "following_count": _count(Follow.objects, "follower"),
+    }
+    drifted = Q()
+    for field, count in actual.items():
+        drifted |= ~Q(**{field: count})
+    with transaction.atomic():
+        list(User.objects.filter(pk__in=user_ids).order_by("pk").select_for_update().values_list("pk"))
+        return User.objects.filter(drifted, pk__in=user_ids).update(**actual)
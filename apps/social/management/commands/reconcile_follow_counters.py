@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.social.counters import reconcile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Recompute user follower/following counters in batches and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        scanned = fixed = 0
+        last_id = None
+
+        while True:
+            qs = User.objects.order_by("pk")
+            if last_id is not None:
+                qs = qs.filter(pk__gt=last_id)
+            batch = list(qs.values_list("pk", flat=True)[:batch_size])
+            if not batch:
+                break
+
+            fixed += reconcile(batch)
+            scanned += len(batch)
+            last_id = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Scanned {scanned} users, corrected {fixed}"))
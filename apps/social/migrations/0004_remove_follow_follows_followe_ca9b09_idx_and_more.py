@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0003_delete_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follows_followe_ca9b09_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follows_followe_a0ecff_idx',
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['follower', '-created_at', '-id'], name='follows_followe_92efa4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['followed', '-created_at', '-id'], name='follows_followe_fa8fc8_idx'),
+        ),
+    ]
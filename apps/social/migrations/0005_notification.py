@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0004_remove_follow_follows_followe_ca9b09_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('verb', models.CharField(max_length=50)),
+                ('target_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('target_id', models.UUIDField(blank=True, null=True)),
+                ('group_key', models.CharField(max_length=100)),
+                ('actor_count', models.PositiveIntegerField(default=1)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'notifications',
+                'indexes': [models.Index(fields=['recipient', '-updated_at', '-id'], name='notificatio_recipie_48d8a9_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_read', False)), fields=('recipient', 'group_key'), name='unique_open_notification_group')],
+            },
+        ),
+    ]
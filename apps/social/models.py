@@ -1,4 +1,6 @@
 # apps/social/models.py
+import uuid
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
@@ -18,9 +20,57 @@ class Follow(models.Model):
             models.CheckConstraint(check=~models.Q(follower=models.F('followed')), name="prevent_self_follow")
         ]
         indexes = [
-            models.Index(fields=["follower"]),
-            models.Index(fields=["followed"]),
+            # Following / followers lists, newest first (id breaks ties for keyset pagination)
+            models.Index(fields=["follower", "-created_at", "-id"]),
+            models.Index(fields=["followed", "-created_at", "-id"]),
         ]
 
     def __str__(self):
         return f"{self.follower_id} -> {self.followed_id}"
+
+
+class Notification(models.Model):
+    """
+    One row per burst of similar events for a recipient ("42 people liked your post").
+
+    Rows are written in bulk by ``apps.social.notifications.flush`` from a buffer
+    of raw events. While a row is unread, new events with the same ``group_key``
+    are folded into it; once it has been read, the next event starts a new row.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notifications")
+    verb = models.CharField(max_length=50)  # like / share / follow / reply / comment
+    target_type = models.CharField(max_length=50, blank=True, null=True)
+    target_id = models.UUIDField(blank=True, null=True)
+    group_key = models.CharField(max_length=100)
+
+    # Most recent actor, how many events were folded in, and a few recent actor ids
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    actor_count = models.PositiveIntegerField(default=1)
+    data = models.JSONField(default=dict, blank=True)
+
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "notifications"
+        constraints = [
+            # At most one open (unread) group per recipient and key
+            models.UniqueConstraint(
+                fields=["recipient", "group_key"], condition=models.Q(is_read=False), name="unique_open_notification_group"
+            ),
+        ]
+        indexes = [
+            # Notification list, most recently active first (id breaks ties for keyset pagination)
+            models.Index(fields=["recipient", "-updated_at", "-id"]),
+        ]
+
+    @property
+    def actor_ids(self):
+        """Most recent distinct actors, newest first (at most a few)."""
+        return [uuid.UUID(pk) for pk in self.data.get("actors", [])]
+
+    def __str__(self):
+        return f"Notification({self.id}) {self.verb} x{self.actor_count} for {self.recipient_id}"
@@ -0,0 +1,223 @@
+# apps/social/notifications.py
+"""
+Batched, grouped notifications.
+
+Mutations never write notification rows themselves. ``notify`` appends a small
+event to a buffer once the transaction commits (a Redis list when
+``REDIS_URL`` is set, process memory otherwise), and ``flush`` (run every few
+seconds by the ``flush_notifications`` beat task) drains it in batches. A batch
+is read without removing it and trimmed only once it has been applied, so a
+failed batch (a deadlock, the database going away) stays queued for the next
+tick; delivery is at least once.
+
+
+- events are folded per (recipient, group key), so a burst of 5,000 likes on one
+  post becomes a single "5,000 people liked your post" row,
+- each batch costs one SELECT for the open groups, one bulk UPDATE, one bulk
+  INSERT and a handful of counter UPDATEs, however many events it holds,
+- ``User.unread_notification_count`` counts unread groups; it moves only when a
+  group is opened or read, so the badge never needs ``COUNT(*)``.
+"""
+import json
+import threading
+from collections import Counter, defaultdict, deque
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Notification
+
+User = get_user_model()
+
+BUFFER_KEY = "notifications:buffer"
+FLUSH_LOCK_KEY = "notifications:flush-lock"
+FLUSH_LOCK_SECONDS = 60
+BATCH_SIZE = 1000
+SAMPLE_ACTORS = 3  # actor ids kept on a group for "alice, bob and 40 others"
+
+
+def group_key(verb, target_id=None):
+    return f"{verb}:{target_id}" if target_id else verb
+
+
+# -------------------------
+# Buffer
+# -------------------------
+class LocalBuffer:
+    """Process-local buffer for local work and tests (single process)."""
+
+    def __init__(self):
+        self.events = deque()
+        self.lock = threading.Lock()
+
+    def push(self, events):
+        with self.lock:
+            self.events.extend(events)
+
+    def peek(self, limit):
+        with self.lock:
+            return list(islice(self.events, limit))
+
+    def trim(self, count):
+        with self.lock:
+            for _ in range(min(count, len(self.events))):
+                self.events.popleft()
+
+    def __len__(self):
+        return len(self.events)
+
+
+class RedisBuffer:
+    """Shared list in Redis: web processes RPUSH, the flush task reads a batch from the head (LRANGE) and LTRIMs it once applied."""
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def push(self, events):
+        self.client.rpush(BUFFER_KEY, *[json.dumps(event) for event in events])
+
+    def peek(self, limit):
+        return [json.loads(raw) for raw in self.client.lrange(BUFFER_KEY, 0, limit - 1)]
+
+    def trim(self, count):
+        # Pushes only ever append, so the first `count` entries are still the batch read
+        self.client.ltrim(BUFFER_KEY, count, -1)
+
+    def __len__(self):
+        return self.client.llen(BUFFER_KEY)
+
+
+_buffer = None
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        url = getattr(settings, "REDIS_URL", None)
+        _buffer = RedisBuffer(url) if url else LocalBuffer()
+    return _buffer
+
+
+# -------------------------
+# Writing
+# -------------------------
+def notify(recipient_id, verb, actor_id, target_id=None):
+    """Queue a notification event for ``recipient_id`` once the current transaction commits."""
+    if str(recipient_id) == str(actor_id):
+        return
+    event = {
+        "recipient": str(recipient_id),
+        "verb": verb,
+        "actor": str(actor_id),
+        "target": str(target_id) if target_id else None,
+    }
+    transaction.on_commit(lambda: _push([event]), robust=True)
+
+
+def _push(events):
+    get_buffer().push(events)
+    if getattr(settings, "CELERY_TASK_ALWAYS_EAGER", False):
+        # No worker or beat without a broker: deliver right away
+        flush()
+
+
+def flush(batch_size=BATCH_SIZE):
+    """Drain the buffer into grouped rows; returns the number of events applied."""
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_SECONDS):
+        return 0  # another flush is running; the next tick picks up the rest
+    try:
+        applied, buffer = 0, get_buffer()
+        while events := buffer.peek(batch_size):
+            apply(events)  # commits, or raises with the batch still queued
+            buffer.trim(len(events))
+            applied += len(events)
+        return applied
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def _fold(events):
+    groups = {}
+    for event in events:
+        key = (event["recipient"], group_key(event["verb"], event["target"]))
+        group = groups.setdefault(key, {**event, "count": 0, "actors": []})
+        group["count"] += 1
+        group["actor"] = event["actor"]
+        if event["actor"] in group["actors"]:
+            group["actors"].remove(event["actor"])
+        group["actors"] = [event["actor"], *group["actors"]][:SAMPLE_ACTORS]
+    return groups
+
+
+@transaction.atomic
+def apply(events):
+    """Fold ``events`` into the recipients' open groups, opening new groups as needed."""
+    now = timezone.now()
+    groups = _fold(events)
+
+    # One query for every open group the batch touches
+    open_rows = Notification.objects.select_for_update().filter(
+        is_read=False,
+        recipient_id__in={recipient for recipient, _ in groups},
+        group_key__in={key for _, key in groups},
+    )
+    open_groups = {(str(row.recipient_id), row.group_key): row for row in open_rows}
+
+    updated, created = [], []
+    for key, group in groups.items():
+        row = open_groups.get(key)
+        if row is not None:
+            actors = group["actors"] + [a for a in row.data.get("actors", []) if a not in group["actors"]]
+            row.actor_count += group["count"]
+            row.actor_id = group["actor"]
+            row.data = {**row.data, "actors": actors[:SAMPLE_ACTORS]}
+            row.updated_at = now
+            updated.append(row)
+        else:
+            created.append(Notification(
+                recipient_id=key[0],
+                verb=group["verb"],
+                target_type="post" if group["target"] else None,
+                target_id=group["target"],
+                group_key=key[1],
+                actor_id=group["actor"],
+                actor_count=group["count"],
+                data={"actors": group["actors"]},
+                created_at=now,
+                updated_at=now,
+            ))
+
+    Notification.objects.bulk_update(updated, ["actor", "actor_count", "data", "updated_at"], batch_size=BATCH_SIZE)
+    Notification.objects.bulk_create(created, batch_size=BATCH_SIZE)
+
+    # Each new row is a new unread group; recipients that gained the same number share one UPDATE
+    by_delta = defaultdict(list)
+    for recipient_id, n in Counter(row.recipient_id for row in created).items():
+        by_delta[n].append(recipient_id)
+    for n, recipient_ids in by_delta.items():
+        User.objects.filter(pk__in=recipient_ids).update(unread_notification_count=F("unread_notification_count") + n)
+
+
+# -------------------------
+# Reading
+# -------------------------
+def mark_read(user, ids=None):
+    """Mark ``ids`` (or everything) read for ``user``; returns the new unread count."""
+    with transaction.atomic():
+        qs = Notification.objects.filter(recipient=user, is_read=False)
+        if ids is not None:
+            qs = qs.filter(id__in=ids)
+        marked = qs.update(is_read=True)
+        if marked:
+            User.objects.filter(pk=user.pk).update(
+                unread_notification_count=Greatest(F("unread_notification_count") - marked, 0)
+            )
+        return User.objects.filter(pk=user.pk).values_list("unread_notification_count", flat=True).first() or 0
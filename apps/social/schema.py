@@ -1,12 +1,18 @@
 # apps/social/schema.py
 import graphene
 from graphene_django import DjangoObjectType
+from django.db import transaction
 from graphql_jwt.decorators import login_required
 
-from .models import Follow
+from .models import Follow, Notification
+from . import counters, notifications, tasks
 from django.contrib.auth import get_user_model
 
 from apps.accounts.schema import UserType
+from apps.posts import aio
+from apps.posts.loaders import get_loaders, load_key, load_one
+from apps.posts.optimizer import optimize
+from apps.posts.pagination import clamp_limit, keyset_window, page_of
 
 User = get_user_model()
 
@@ -16,6 +22,30 @@ class FollowType(DjangoObjectType):
         model = Follow
         fields = ("id", "follower", "followed", "created_at")
 
+    def resolve_follower(self, info):
+        return load_one(info, self, "follower", "users")
+
+    def resolve_followed(self, info):
+        return load_one(info, self, "followed", "users")
+
+
+class NotificationType(DjangoObjectType):
+    actors = graphene.List(UserType, description="A few of the most recent actors, newest first.")
+    post = graphene.Field("apps.posts.schema.PostType")
+
+    class Meta:
+        model = Notification
+        fields = ("id", "verb", "actor", "actor_count", "target_type", "target_id", "is_read", "created_at", "updated_at")
+
+    def resolve_actor(self, info):
+        return load_one(info, self, "actor", "users")
+
+    def resolve_actors(self, info):
+        return [load_key(info, "users", pk) for pk in self.actor_ids]
+
+    def resolve_post(self, info):
+        return load_key(info, "posts", self.target_id) if self.target_type == "post" else None
+
 
 class FollowMutations(graphene.ObjectType):
     follow_user = graphene.Field(FollowType, followed_id=graphene.UUID(required=True))
@@ -31,33 +61,107 @@ class FollowMutations(graphene.ObjectType):
         if not followed_user:
             raise Exception("User not found")
 
-        follow, created = Follow.objects.get_or_create(follower=user, followed=followed_user)
+        with transaction.atomic():
+            follow, created = Follow.objects.get_or_create(follower=user, followed=followed_user)
+            if created:
+                counters.adjust_follow(user.id, followed_user.id, 1)
+                tasks.backfill_author.delay_on_commit(str(user.id), str(followed_user.id))
+                notifications.notify(followed_user.id, "follow", user.id)
         # return the follow object (created or existing)
         return follow
 
     @login_required
     def resolve_unfollow_user(self, info, followed_id):
         user = info.context.user
-        deleted, _ = Follow.objects.filter(follower=user, followed_id=followed_id).delete()
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower=user, followed_id=followed_id).delete()
+            if deleted:
+                counters.adjust_follow(user.id, followed_id, -1)
+                tasks.drop_author.delay_on_commit(str(user.id), str(followed_id))
         return deleted > 0
 
 
+class UserPage(graphene.ObjectType):
+    items = graphene.List(UserType)
+    has_next = graphene.Boolean()
+    end_cursor = graphene.String(description="Pass as `after` to fetch the next page.")
+
+
 class FollowQuery(graphene.ObjectType):
-    followers = graphene.List(UserType, user_id=graphene.UUID(required=True), limit=graphene.Int(), offset=graphene.Int())
-    following = graphene.List(UserType, user_id=graphene.UUID(required=True), limit=graphene.Int(), offset=graphene.Int())
+    followers = graphene.Field(UserPage, user_id=graphene.UUID(required=True), limit=graphene.Int(), after=graphene.String())
+    following = graphene.Field(UserPage, user_id=graphene.UUID(required=True), limit=graphene.Int(), after=graphene.String())
     follower_count = graphene.Int(user_id=graphene.UUID(required=True))
     following_count = graphene.Int(user_id=graphene.UUID(required=True))
 
-    def resolve_followers(self, info, user_id, limit=50, offset=0):
-        qs = User.objects.filter(following__followed_id=user_id).distinct().order_by("-id")
-        return qs[offset: offset + limit]
+    # Both lists page over the follows table by (created_at, id), newest first,
+    # straight off the (followed|follower, -created_at, -id) indexes.
+    def resolve_followers(self, info, user_id, limit=50, after=None):
+        limit = clamp_limit(limit)
+        qs = optimize(Follow.objects.filter(followed_id=user_id), info, "items", prefix="follower")
+        rows = aio.fetch_all(info, keyset_window(qs, after, limit))
+        return aio.then(rows, lambda rows: _user_page(rows, limit, "follower"))
 
-    def resolve_following(self, info, user_id, limit=50, offset=0):
-        qs = User.objects.filter(followers__follower_id=user_id).distinct().order_by("-id")
-        return qs[offset: offset + limit]
+    def resolve_following(self, info, user_id, limit=50, after=None):
+        limit = clamp_limit(limit)
+        qs = optimize(Follow.objects.filter(follower_id=user_id), info, "items", prefix="followed")
+        rows = aio.fetch_all(info, keyset_window(qs, after, limit))
+        return aio.then(rows, lambda rows: _user_page(rows, limit, "followed"))
 
     def resolve_follower_count(self, info, user_id):
-        return Follow.objects.filter(followed_id=user_id).count()
+        count = aio.fetch_first(info, User.objects.filter(id=user_id).values_list("follower_count", flat=True))
+        return aio.then(count, lambda count: count or 0)
 
     def resolve_following_count(self, info, user_id):
-        return Follow.objects.filter(follower_id=user_id).count()
+        count = aio.fetch_first(info, User.objects.filter(id=user_id).values_list("following_count", flat=True))
+        return aio.then(count, lambda count: count or 0)
+
+
+def _user_page(rows, limit, side):
+    rows, has_next, end_cursor = page_of(rows, limit)
+    return UserPage(items=[getattr(row, side) for row in rows], has_next=has_next, end_cursor=end_cursor)
+
+
+# -------------------------
+# Notifications
+# -------------------------
+class NotificationPage(graphene.ObjectType):
+    items = graphene.List(NotificationType)
+    has_next = graphene.Boolean()
+    end_cursor = graphene.String(description="Pass as `after` to fetch the next page.")
+
+
+class NotificationQuery(graphene.ObjectType):
+    notifications = graphene.Field(NotificationPage, limit=graphene.Int(), after=graphene.String(), unread_only=graphene.Boolean())
+    unread_notification_count = graphene.Int()
+
+    # Most recently active groups first, straight off the (recipient, -updated_at, -id) index
+    @login_required
+    def resolve_notifications(self, info, limit=20, after=None, unread_only=False):
+        limit = clamp_limit(limit)
+        qs = Notification.objects.filter(recipient_id=info.context.user.id)
+        if unread_only:
+            qs = qs.filter(is_read=False)
+        rows = aio.fetch_all(info, keyset_window(qs, after, limit, created_field="updated_at"))
+        return aio.then(rows, lambda rows: _notification_page(info, rows, limit))
+
+    @login_required
+    def resolve_unread_notification_count(self, info):
+        # Denormalized on the user row; JWT requests do not load it up front (see social_feed.auth)
+        qs = User.objects.filter(pk=info.context.user.id).values_list("unread_notification_count", flat=True)
+        return aio.fetch_first(info, qs)
+
+
+def _notification_page(info, rows, limit):
+    rows, has_next, end_cursor = page_of(rows, limit, created_field="updated_at")
+    return NotificationPage(items=get_loaders(info).track(rows), has_next=has_next, end_cursor=end_cursor)
+
+
+class NotificationMutations(graphene.ObjectType):
+    mark_notifications_read = graphene.Int(
+        ids=graphene.List(graphene.NonNull(graphene.ID)),
+        description="Mark the given notifications (all when `ids` is omitted) read; returns the unread count.",
+    )
+
+    @login_required
+    def resolve_mark_notifications_read(self, info, ids=None):
+        return notifications.mark_read(info.context.user, ids)
@@ -0,0 +1,41 @@
+# apps/social/tasks.py
+"""
+Celery tasks for follow follow-on work (timeline backfill and cleanup) and for
+draining the notification buffer.
+
+Enqueued by the follow mutations with ``delay_on_commit``; see
+``apps/posts/tasks.py`` for the conventions.
+"""
+from celery import shared_task
+from django.contrib.auth import get_user_model
+
+from apps.posts import timeline
+from apps.posts.tasks import reconcile_in_batches
+from . import counters, notifications
+
+User = get_user_model()
+
+RECONCILE_BATCH_SIZE = 1000
+RECONCILE_LOCK_KEY = "reconcile:follow-counters"
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def backfill_author(owner_id, author_id):
+    timeline.backfill_author(owner_id, author_id)
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def drop_author(owner_id, author_id):
+    timeline.drop_author(owner_id, author_id)
+
+
+@shared_task(ignore_result=True)
+def reconcile_follow_counters(batch_size=RECONCILE_BATCH_SIZE):
+    """Beat task: reconcile every user, a batch (one short transaction) at a time."""
+    return reconcile_in_batches(User.objects.all(), counters.reconcile, RECONCILE_LOCK_KEY, batch_size)
+
+
+@shared_task(ignore_result=True)
+def flush_notifications():
+    """Beat task: fold buffered notification events into grouped rows."""
+    notifications.flush()
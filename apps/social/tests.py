@@ -1,3 +1,192 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from social_feed.schema import schema
+from apps.posts.models import Post
+from . import counters, notifications
+from .models import Follow, Notification
+
+User = get_user_model()
+
+
+class FollowTests(TestCase):
+    PAGE = """
+        query($id: UUID!, $after: String) {
+            followers(userId: $id, limit: 2, after: $after) { hasNext endCursor items { username } }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.star = User.objects.create_user("star", "star@mail.com", "pw")
+        cls.fans = [User.objects.create_user(f"fan{i}", f"fan{i}@mail.com", "pw") for i in range(5)]
+
+    def setUp(self):
+        cache.clear()
+
+    def execute(self, query, user=None, **variables):
+        request = RequestFactory().post("/graphql")
+        request.user = user or AnonymousUser()
+        result = schema.execute(query, context_value=request, variable_values=variables)
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def follow(self, fan, user=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute("mutation($id: UUID!) { followUser(followedId: $id) { id } }", fan, id=str((user or self.star).id))
+
+    def counts(self, user):
+        data = self.execute(
+            "query($id: UUID!) { followerCount(userId: $id) followingCount(userId: $id) }", id=str(user.id)
+        )
+        return data["followerCount"], data["followingCount"]
+
+    def test_counters_follow_mutations(self):
+        for fan in self.fans:
+            self.follow(fan)
+        self.follow(self.fans[0])  # already following: no change
+        self.assertEqual(self.counts(self.star), (5, 0))
+        self.assertEqual(self.counts(self.fans[0]), (0, 1))
+
+        unfollow = "mutation($id: UUID!) { unfollowUser(followedId: $id) }"
+        self.assertTrue(self.execute(unfollow, self.fans[0], id=str(self.star.id))["unfollowUser"])
+        self.assertFalse(self.execute(unfollow, self.fans[0], id=str(self.star.id))["unfollowUser"])
+        self.assertEqual(self.counts(self.star), (4, 0))
+        self.assertEqual(self.counts(self.fans[0]), (0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Follow.objects.bulk_create(Follow(follower=fan, followed=self.star) for fan in self.fans)
+        User.objects.filter(pk=self.star.pk).update(follower_count=2, following_count=3)
+        User.objects.filter(pk=self.fans[0].pk).update(following_count=1)
+
+        self.assertEqual(counters.reconcile([self.star.pk, self.fans[0].pk]), 1)
+        call_command("reconcile_follow_counters", batch_size=2, stdout=StringIO())
+
+        self.assertEqual(self.counts(self.star), (5, 0))
+        for fan in self.fans:
+            self.assertEqual(self.counts(fan), (0, 1))
+        self.assertEqual(counters.reconcile(User.objects.values_list("pk", flat=True)), 0)
+
+    def test_follower_pages_are_keyset_paginated_newest_first(self):
+        now = timezone.now()
+        # two follows share a timestamp; the id breaks the tie
+        Follow.objects.bulk_create(
+            Follow(follower=fan, followed=self.star, created_at=now - timezone.timedelta(minutes=min(i, 3)))
+            for i, fan in enumerate(self.fans)
+        )
+        expected = list(
+            Follow.objects.filter(followed=self.star).order_by("-created_at", "-id").values_list("follower__username", flat=True)
+        )
+
+        usernames, after, pages = [], None, 0
+        while True:
+            page = self.execute(self.PAGE, id=str(self.star.id), after=after)["followers"]
+            usernames.extend(user["username"] for user in page["items"])
+            pages += 1
+            if not page["hasNext"]:
+                break
+            after = page["endCursor"]
+        self.assertEqual(usernames, expected)
+        self.assertEqual(pages, 3)
+
+        data = self.execute(
+            "query($id: UUID!) { following(userId: $id, limit: 5) { hasNext items { username } } }", id=str(self.fans[2].id)
+        )
+        self.assertEqual(data["following"], {"hasNext": False, "items": [{"username": "star"}]})
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+class NotificationTests(TestCase):
+    QUERY = """
+        query($after: String) {
+            unreadNotificationCount
+            notifications(limit: 10, after: $after) {
+                hasNext endCursor
+                items { id verb actorCount isRead actor { username } actors { username } post { content } }
+            }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", "author@mail.com", "pw")
+        cls.fans = User.objects.bulk_create(User(username=f"fan{i}", email=f"fan{i}@mail.com") for i in range(42))
+        cls.post = Post.objects.create(author=cls.author, content="viral")
+
+    def setUp(self):
+        cache.clear()
+        notifications._buffer = None
+
+    def execute(self, query, user, **variables):
+        request = RequestFactory().post("/graphql")
+        request.user = user or AnonymousUser()
+        result = schema.execute(query, context_value=request, variable_values=variables)
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def like(self, fan):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute("mutation($id: UUID!) { likePost(postId: $id) { like { id } } }", fan, id=str(self.post.id))
+
+    def test_burst_of_likes_becomes_one_grouped_row(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.assertEqual(Notification.objects.count(), 0)  # nothing is written by the mutations
+
+        # open-group lookup, insert and counter update (inside a savepoint), however many events
+        with self.assertNumQueries(5):
+            self.assertEqual(notifications.flush(), 42)
+
+        self.author.refresh_from_db()
+        data = self.execute(self.QUERY, self.author)
+        self.assertEqual(data["unreadNotificationCount"], 1)
+        (item,) = data["notifications"]["items"]
+        self.assertEqual((item["verb"], item["actorCount"], item["isRead"]), ("like", 42, False))
+        self.assertEqual(item["actor"]["username"], "fan41")
+        self.assertEqual([a["username"] for a in item["actors"]], ["fan41", "fan40", "fan39"])
+        self.assertEqual(item["post"]["content"], "viral")
+
+    def test_reading_closes_the_group_and_the_counter(self):
+        self.like(self.fans[0])
+        notifications.flush()
+
+        data = self.execute("mutation { markNotificationsRead }", self.author)
+        self.assertEqual(data["markNotificationsRead"], 0)
+
+        # later likes fold into the open group, not into the read one
+        self.like(self.fans[1])
+        self.like(self.fans[2])
+        notifications.flush()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.unread_notification_count, 1)
+        self.assertEqual(
+            list(Notification.objects.order_by("id").values_list("is_read", "actor_count")), [(True, 1), (False, 2)]
+        )
+
+        data = self.execute(self.QUERY, self.author)
+        self.assertEqual([n["actorCount"] for n in data["notifications"]["items"]], [2, 1])
+
+    def test_failed_batches_stay_queued(self):
+        for fan in self.fans[:3]:
+            self.like(fan)
+        with mock.patch.object(notifications, "apply", side_effect=DatabaseError("deadlock detected")):
+            with self.assertRaises(DatabaseError):
+                notifications.flush()
+        self.assertEqual(len(notifications.get_buffer()), 3)
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(notifications.flush(), 3)
+        self.assertEqual(len(notifications.get_buffer()), 0)
+        self.assertEqual(Notification.objects.get().actor_count, 3)
+
+    def test_no_notification_for_own_actions(self):
+        self.like(self.author)
+        self.assertEqual(notifications.flush(), 0)
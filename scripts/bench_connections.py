@@ -0,0 +1,132 @@
+# scripts/bench_connections.py
+"""
+Request latency with and without connection reuse.
+
+Sends the same uncached GraphQL query (one SQL statement) through the WSGI
+handler, including the end-of-request connection handling that the test
+client turns off, once per connection strategy:
+
+- ``per-request``: ``CONN_MAX_AGE = 0``, a new connection for every request
+  (the previous behaviour),
+- ``persistent``: ``CONN_MAX_AGE`` with ``CONN_HEALTH_CHECKS``, the default,
+- ``pool``: Django's native pool (psycopg 3 on PostgreSQL only).
+
+and prints how many connections each opened with their latency percentiles:
+
+    python scripts/bench_connections.py --requests 500
+
+Run it against the production-like PostgreSQL (TLS included) for
+representative numbers: the gap between the first two rows is the connection
+setup that persistent connections remove from every request. Nothing is
+written to the database.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "social_feed.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment
+
+QUERY = "query($id: UUID!) { authorFeed(authorId: $id, limit: 5) { items { id } } }"
+
+STRATEGIES = {
+    "per-request": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "pool": None},
+    "persistent": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True, "pool": None},
+    "pool": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "pool": {"min_size": 1, "max_size": 4}},
+}
+
+
+def pool_available(connection):
+    if connection.vendor != "postgresql":
+        return False
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def configure(connection, strategy):
+    connection.close()
+    if connection.vendor == "postgresql":
+        connection.close_pool()
+    connection.settings_dict["CONN_MAX_AGE"] = strategy["CONN_MAX_AGE"]
+    connection.settings_dict["CONN_HEALTH_CHECKS"] = strategy["CONN_HEALTH_CHECKS"]
+    options = connection.settings_dict["OPTIONS"]
+    options.pop("pool", None)
+    if strategy["pool"]:
+        options["pool"] = strategy["pool"]
+
+
+def post(handler, body):
+    environ = RequestFactory().post("/graphql", body, content_type="application/json").environ
+    statuses = []
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    response.close()  # request_finished: closes the connection unless it is reused
+    return statuses[0], response.content
+
+
+def run(handler, requests):
+    opened = []
+
+    def count(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    connection_created.connect(count, weak=False, dispatch_uid="bench_connections")
+    try:
+        samples = []
+        body = {"query": QUERY, "variables": {"id": str(uuid.uuid4())}}
+        for _ in range(requests):
+            started = time.perf_counter()
+            status, content = post(handler, body)
+            samples.append(time.perf_counter() - started)
+            if not status.startswith("200"):
+                raise SystemExit(f"Request failed: {content.decode()}")
+    finally:
+        connection_created.disconnect(dispatch_uid="bench_connections")
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return len(opened), statistics.median(samples) * 1000, p99 * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("strategies", nargs="*", default=list(STRATEGIES))
+    args = parser.parse_args()
+
+    setup_test_environment()
+    settings.GRAPHQL_RATE_BUDGET = 0
+    settings.GRAPHQL_TRACE_SAMPLE_RATE = 0
+    connection = connections["default"]
+    handler = WSGIHandler()
+
+    print(f"{connection.vendor}: {args.requests} requests per strategy")
+    print(f"{'':<14}{'connections':>12}{'p50':>10}{'p99':>10}")
+    for name in args.strategies:
+        if name == "pool" and not pool_available(connection):
+            print(f"{name:<14}skipped: needs PostgreSQL and psycopg[pool]")
+            continue
+        configure(connection, STRATEGIES[name])
+        run(handler, 5)  # warm up
+        opened, p50, p99 = run(handler, args.requests)
+        print(f"{name:<14}{opened:>12}{p50:>8.2f}ms{p99:>8.2f}ms")
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# scripts/bench_visibility.py
+"""
+Feed latency with and without visibility enforcement.
+
+Fills the configured database with a synthetic graph inside a transaction that
+is rolled back at the end, then times the first page of each feed query
+unfiltered and with visibility enforced (``apps.posts.visibility``), and prints
+the plan of the enforced query so the index choice can be checked:
+
+    python scripts/bench_visibility.py --users 2000 --posts 200000 --follows 50
+
+Run it against PostgreSQL for representative numbers; SQLite works for a quick
+check. The enforced column should stay within noise of the unfiltered one: the
+global feed reads its partial index over public posts (the unfiltered global
+query no longer has an index of its own), and the follow check is one probe of
+the ``unique_follow`` index per candidate row.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "social_feed.settings")
+
+import django
+
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.posts.models import Post, TimelineEntry
+from apps.posts.visibility import PUBLIC, visible_to
+from apps.social.models import Follow
+
+User = get_user_model()
+
+VISIBILITIES = ["public"] * 7 + ["followers"] * 2 + ["private"]
+
+
+class Rollback(Exception):
+    pass
+
+
+def populate(users, posts, follows, home_owner_entries):
+    now = timezone.now()
+    people = User.objects.bulk_create(
+        User(username=f"bench{i}", email=f"bench{i}@mail.com") for i in range(users)
+    )
+    rows = [
+        Post(
+            author=random.choice(people),
+            content=f"bench post {i}",
+            visibility=random.choice(VISIBILITIES),
+            is_private=random.random() < 0.02,
+            created_at=now - timedelta(seconds=i),
+        )
+        for i in range(posts)
+    ]
+    Post.objects.bulk_create(rows, batch_size=5000)
+
+    pairs = set()
+    for user in people:
+        for target in random.sample(people, min(follows, len(people))):
+            if target != user:
+                pairs.add((user.pk, target.pk))
+    Follow.objects.bulk_create((Follow(follower_id=a, followed_id=b) for a, b in pairs), batch_size=5000)
+
+    # A materialized home timeline for the viewer, as fan-out would have written it
+    viewer = people[0]
+    followed = set(Follow.objects.filter(follower=viewer).values_list("followed_id", flat=True))
+    entries = [
+        TimelineEntry(owner=viewer, post=post, author_id=post.author_id, created_at=post.created_at)
+        for post in rows if post.author_id in followed
+    ][:home_owner_entries]
+    TimelineEntry.objects.bulk_create(entries, batch_size=5000)
+    return viewer, random.choice(list(followed) or [viewer.pk])
+
+
+def timed(qs, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        list(qs.all())  # a fresh clone, so the result cache is not reused
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def explain(qs):
+    sql, params = qs.query.sql_with_params()
+    prefix = "EXPLAIN ANALYZE " if connection.vendor == "postgresql" else "EXPLAIN QUERY PLAN "
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return "\n".join("    " + " ".join(str(col) for col in row) for row in cursor.fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=50000)
+    parser.add_argument("--follows", type=int, default=50, help="Accounts followed by each user")
+    parser.add_argument("--timeline", type=int, default=5000, help="Home timeline rows for the viewer")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        with transaction.atomic():
+            viewer, author_id = populate(args.users, args.posts, args.follows, args.timeline)
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+            page = slice(0, args.limit + 1)
+            order = ("-created_at", "-id")
+
+            cases = {
+                "global feed": (
+                    Post.live.order_by(*order)[page],
+                    Post.live.filter(PUBLIC).order_by(*order)[page],
+                ),
+                "author feed": (
+                    Post.live.filter(author_id=author_id).order_by(*order)[page],
+                    Post.live.filter(visible_to(viewer.pk), author_id=author_id).order_by(*order)[page],
+                ),
+                "home feed": (
+                    TimelineEntry.objects.filter(owner=viewer, post__deleted_at__isnull=True)
+                    .select_related("post").order_by("-created_at", "-post_id")[page],
+                    TimelineEntry.objects.filter(visible_to(viewer.pk, "post__"), owner=viewer, post__deleted_at__isnull=True)
+                    .select_related("post").order_by("-created_at", "-post_id")[page],
+                ),
+            }
+
+            print(f"{connection.vendor}: {args.users} users, {args.posts} posts, median of {args.repeats} runs")
+            print(f"{'':<14}{'unfiltered':>12}{'enforced':>12}")
+            for name, (unfiltered, enforced) in cases.items():
+                timed(unfiltered, 3), timed(enforced, 3)  # warm up
+                print(f"{name:<14}{timed(unfiltered, args.repeats):>10.2f}ms{timed(enforced, args.repeats):>10.2f}ms")
+            for name, (_, enforced) in cases.items():
+                print(f"\n{name} plan (enforced):\n{explain(enforced)}")
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# scripts/loadtest.py
+"""
+Closed-loop load test for the /graphql endpoint.
+
+Runs ``--concurrency`` clients for ``--duration`` seconds, each sending the same
+document back to back, and prints throughput and latency percentiles. Point it
+at the WSGI and the ASGI deployment in turn to compare them:
+
+    gunicorn social_feed.wsgi -w 4 -b 127.0.0.1:8000
+    uvicorn social_feed.asgi:application --workers 4 --port 8001
+
+    python scripts/loadtest.py --url http://127.0.0.1:8000/graphql --post-id <uuid>
+    python scripts/loadtest.py --url http://127.0.0.1:8001/graphql --post-id <uuid>
+
+All clients share one address, so start the servers with GRAPHQL_RATE_BUDGET=0
+or most requests will be answered 429 by the per-client rate budget.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Independent root fields: the async view awaits them concurrently
+DEFAULT_QUERY = """
+query PostPage($id: UUID!) {
+  post(id: $id) { id content likeCount author { username } }
+  comments(postId: $id) { id content author { username } }
+  shareCount(postId: $id)
+  globalFeed(limit: 20) { hasNext items { id content author { username } } }
+}
+"""
+
+
+def worker(url, body, headers, deadline, latencies, errors, lock):
+    while time.monotonic() < deadline:
+        request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                payload = json.loads(response.read())
+            failed = bool(payload.get("errors"))
+        except (urllib.error.URLError, OSError, ValueError):
+            failed = True
+        elapsed = time.perf_counter() - started
+        with lock:
+            if failed:
+                errors.append(elapsed)
+            else:
+                latencies.append(elapsed)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000/graphql")
+    parser.add_argument("--post-id", required=True, help="Post id used as the $id variable")
+    parser.add_argument("--query-file", help="Send this document instead of the default one")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--token", help="JWT sent as 'Authorization: JWT <token>'")
+    args = parser.parse_args()
+
+    query = DEFAULT_QUERY
+    if args.query_file:
+        with open(args.query_file) as fh:
+            query = fh.read()
+    body = json.dumps({"query": query, "variables": {"id": args.post_id}}).encode()
+    headers = {"Content-Type": "application/json"}
+    if args.token:
+        headers["Authorization"] = f"JWT {args.token}"
+
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(args.url, body, headers, deadline, latencies, errors, lock))
+        for _ in range(args.concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - started
+
+    print(f"url          {args.url}")
+    print(f"concurrency  {args.concurrency}")
+    print(f"requests     {len(latencies)} ok, {len(errors)} failed")
+    print(f"throughput   {len(latencies) / wall:.1f} req/s")
+    if latencies:
+        print(f"latency mean {statistics.mean(latencies) * 1000:.1f} ms")
+        for pct in (50, 95, 99):
+            print(f"latency p{pct:<3} {percentile(latencies, pct) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
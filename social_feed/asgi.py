@@ -3,14 +3,42 @@ ASGI config for social_feed project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP requests resolve URLs through ``social_feed.asgi_urls``, which mounts the
+async GraphQL view. WebSocket connections to ``/graphql`` carry GraphQL
+subscriptions (``social_feed.consumers``).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_feed.settings')
 
-application = get_asgi_application()
+
+class FeedASGIRequest(ASGIRequest):
+    urlconf = "social_feed.asgi_urls"
+
+
+class FeedASGIHandler(ASGIHandler):
+    request_class = FeedASGIRequest
+
+
+# Same as django.core.asgi.get_asgi_application(), with our request class
+django.setup(set_prefix=False)
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+from django.urls import path  # noqa: E402
+
+from .consumers import GraphQLWSConsumer  # noqa: E402
+
+application = ProtocolTypeRouter({
+    "http": FeedASGIHandler(),
+    "websocket": AllowedHostsOriginValidator(
+        URLRouter([path("graphql", GraphQLWSConsumer.as_asgi())])
+    ),
+})
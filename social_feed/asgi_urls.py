@@ -0,0 +1,16 @@
+"""
+URL configuration used under ASGI (see ``social_feed.asgi``).
+
+Same routes as ``social_feed.urls``, except that ``/graphql`` executes
+asynchronously.
+"""
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
+
+from .urls import urlpatterns as sync_urlpatterns
+from .views import AsyncFeedGraphQLView
+
+urlpatterns = [
+    path("graphql", csrf_exempt(AsyncFeedGraphQLView.as_view(graphiql=True))),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,128 @@
+# social_feed/auth.py
+"""
+JWT authentication for the GraphQL endpoint: verified once, loaded lazily.
+
+``graphql_jwt``'s middleware runs for every resolved field and its backend
+loads the ``User`` row on every request. Instead the view calls
+``authenticate`` once, which sets ``request.user`` to a ``TokenUser`` when the
+request carries an ``Authorization: JWT ...`` header:
+
+- the token is verified on first use only, and the claims plus a snapshot of
+  the user (``SNAPSHOT_FIELDS``) are cached under a hash of the token for
+  ``GRAPHQL_AUTH_CACHE_SECONDS``, never past the token's expiry; a client's
+  later requests cost one cache read, with no signature check and no query,
+- ``id``/``pk``, the snapshot fields and ``is_authenticated``/``is_anonymous``
+  are answered from the snapshot; any other attribute, or using the user as a
+  model instance (as mutations do), loads the row once,
+- nothing is verified until something reads the user or the claims, so with
+  rate budgets off a document that never looks at the viewer does no JWT work
+  (with budgets on, ``social_feed.cost.client_key`` reads the cached claims).
+
+A token takes precedence over a session. Deactivating a user takes effect
+once cached snapshots expire. Invalid or expired tokens raise
+``JSONWebTokenError`` from whichever resolver first reads the user, as the
+middleware did.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject, empty
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_http_authorization, get_payload, get_user_by_payload
+
+User = get_user_model()
+
+CACHE_PREFIX = "jwt:"
+SNAPSHOT_FIELDS = ("id", "username", "is_staff", "is_active")
+ANONYMOUS = AnonymousUser()
+
+
+def cache_seconds():
+    return getattr(settings, "GRAPHQL_AUTH_CACHE_SECONDS", 60)
+
+
+def token_digest(token):
+    """A fixed-length name for ``token``, safe to use in cache keys."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _verify(token):
+    """``(claims, snapshot)`` for ``token``; ``snapshot`` is ``None`` when the user does not exist."""
+    key = CACHE_PREFIX + token_digest(token)
+    entry = cache.get(key)
+    if entry is None:
+        claims = get_payload(token)
+        user = get_user_by_payload(claims)  # raises for inactive users
+        entry = (claims, {name: getattr(user, name) for name in SNAPSHOT_FIELDS} if user else None)
+        timeout = cache_seconds()
+        if "exp" in claims:
+            timeout = min(timeout, int(claims["exp"] - time.time()))
+        if timeout > 0:
+            cache.set(key, entry, timeout)
+    return entry
+
+
+def verify(request):
+    """
+    ``(claims, snapshot)`` for the request's token, or ``None`` without one.
+
+    Memoized on the request; raises ``JSONWebTokenError`` for a bad token.
+    """
+    if not hasattr(request, "_jwt_verified"):
+        token = get_http_authorization(request)
+        try:
+            request._jwt_verified = _verify(token) if token else None
+        except JSONWebTokenError as e:
+            request._jwt_verified = e
+    if isinstance(request._jwt_verified, JSONWebTokenError):
+        raise request._jwt_verified
+    return request._jwt_verified
+
+
+def _snapshot_field(name):
+    def get(self):
+        if self._wrapped is not empty:
+            return getattr(self._wrapped, name)
+        snapshot = self.snapshot()
+        return snapshot[name] if snapshot else getattr(ANONYMOUS, name)
+    return property(get)
+
+
+class TokenUser(SimpleLazyObject):
+    """``request.user`` for a JWT request: the snapshot without a query, the full row on demand."""
+
+    def __init__(self, request):
+        self.__dict__["_request"] = request
+        super().__init__(self._load)
+
+    def snapshot(self):
+        return verify(self._request)[1]
+
+    def _load(self):
+        snapshot = self.snapshot()
+        user = User._default_manager.filter(pk=snapshot["id"]).first() if snapshot else None
+        return user or AnonymousUser()
+
+    id = pk = _snapshot_field("id")
+    username = _snapshot_field("username")
+    is_staff = _snapshot_field("is_staff")
+    is_active = _snapshot_field("is_active")
+
+    @property
+    def is_authenticated(self):
+        return self.pk is not None
+
+    @property
+    def is_anonymous(self):
+        return self.pk is None
+
+
+def authenticate(request):
+    """Make ``request.user`` a ``TokenUser`` when the request carries a JWT."""
+    # `type`, not `isinstance`: the latter would evaluate a lazy session user
+    if get_http_authorization(request) is not None and type(getattr(request, "user", None)) is not TokenUser:
+        request.user = TokenUser(request)
@@ -0,0 +1,20 @@
+"""
+Celery application for social_feed.
+
+Workers run follow-on work that mutations enqueue after their transaction
+commits (``task.delay_on_commit``); see ``apps/posts/tasks.py`` and
+``apps/social/tasks.py``. Start one with:
+
+    celery -A social_feed worker -l info
+    celery -A social_feed beat -l info   # periodic counter reconciliation
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_feed.settings')
+
+app = Celery("social_feed", task_cls="celery.contrib.django.task:DjangoTask")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
@@ -0,0 +1,159 @@
+# social_feed/consumers.py
+"""
+GraphQL subscriptions over WebSocket (``graphql-transport-ws`` protocol).
+
+Clients authenticate in ``connection_init`` with
+``{"Authorization": "JWT <token>"}`` and then ``subscribe`` to documents from
+the ``Subscription`` root type. Subscription resolvers call ``context.listen``
+(see ``apps.posts.realtime``) to join channel layer groups; this consumer
+routes group messages to the queues of the subscriptions that asked for them.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.contrib.auth.models import AnonymousUser
+from graphene.validation import depth_limit_validator
+from graphql import ExecutionResult, GraphQLError, OperationType, get_operation_ast, parse, specified_rules, subscribe, validate
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.shortcuts import get_user_by_token
+
+from . import cost
+from .schema import schema
+
+PROTOCOL = "graphql-transport-ws"
+
+
+class SubscriptionContext:
+    """``info.context`` for subscriptions: the connection's user plus group listening."""
+
+    is_async = True
+
+    def __init__(self, consumer, user):
+        self.user = user
+        self.loaders = None
+        self.listen = consumer.listen
+
+
+class GraphQLWSConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        if PROTOCOL not in self.scope.get("subprotocols", []):
+            await self.close()
+            return
+        self.context = None
+        self.operations = {}
+        self.listeners = {}
+        await self.accept(PROTOCOL)
+
+    async def disconnect(self, code):
+        for task in list(getattr(self, "operations", {}).values()):
+            task.cancel()
+
+    async def receive_json(self, message):
+        kind = message.get("type")
+        if kind == "connection_init":
+            await self.init_connection(message.get("payload") or {})
+        elif kind == "ping":
+            await self.send_json({"type": "pong"})
+        elif kind == "subscribe":
+            if self.context is None:
+                await self.close(code=4401)  # Unauthorized: subscribe before connection_ack
+                return
+            await self.start(message["id"], message.get("payload") or {})
+        elif kind == "complete":
+            task = self.operations.pop(message.get("id"), None)
+            if task is not None:
+                task.cancel()
+
+    async def init_connection(self, payload):
+        if self.context is not None:
+            await self.close(code=4429)  # Too many initialisation requests
+            return
+        user = AnonymousUser()
+        token = (payload.get("Authorization") or "").split()
+        if len(token) == 2:
+            try:
+                user = await sync_to_async(get_user_by_token)(token[1])
+            except JSONWebTokenError:
+                await self.close(code=4403)
+                return
+        self.context = SubscriptionContext(self, user)
+        await self.send_json({"type": "connection_ack"})
+
+    # -------------------------
+    # Operations
+    # -------------------------
+    async def start(self, op_id, payload):
+        if op_id in self.operations:
+            await self.close(code=4409)  # Subscriber for <id> already exists
+            return
+
+        result = await self.subscribe(payload)
+        if isinstance(result, ExecutionResult):
+            await self.send_json({"type": "error", "id": op_id, "payload": [e.formatted for e in result.errors]})
+            return
+        self.operations[op_id] = asyncio.create_task(self.stream(op_id, result))
+
+    async def subscribe(self, payload):
+        try:
+            document = parse(payload.get("query") or "")
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        # The same depth and cost limits as HTTP operations
+        rules = (
+            *specified_rules,
+            depth_limit_validator(cost.max_depth()),
+            cost.cost_limit_validator(cost.max_cost(), payload.get("variables"), payload.get("operationName")),
+        )
+        errors = validate(schema.graphql_schema, document, rules)
+        if errors:
+            return ExecutionResult(errors=errors)
+
+        operation = get_operation_ast(document, payload.get("operationName"))
+        if operation is None or operation.operation != OperationType.SUBSCRIPTION:
+            return ExecutionResult(errors=[GraphQLError("Only subscription operations are supported over WebSocket")])
+
+        return await subscribe(
+            schema.graphql_schema,
+            document,
+            context_value=self.context,
+            variable_values=payload.get("variables"),
+            operation_name=payload.get("operationName"),
+        )
+
+    async def stream(self, op_id, results):
+        try:
+            async for result in results:
+                await self.send_json({"type": "next", "id": op_id, "payload": result.formatted})
+            await self.send_json({"type": "complete", "id": op_id})
+        except Exception as e:
+            await self.send_json({"type": "error", "id": op_id, "payload": [{"message": str(e)}]})
+        finally:
+            self.operations.pop(op_id, None)
+
+    # -------------------------
+    # Channel layer groups
+    # -------------------------
+    @asynccontextmanager
+    async def listen(self, groups):
+        queue = asyncio.Queue()
+        for group in groups:
+            queues = self.listeners.setdefault(group, set())
+            if not queues:
+                await self.channel_layer.group_add(group, self.channel_name)
+            queues.add(queue)
+        try:
+            yield queue
+        finally:
+            for group in groups:
+                queues = self.listeners.get(group, set())
+                queues.discard(queue)
+                if not queues:
+                    self.listeners.pop(group, None)
+                    await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def feed_event(self, message):
+        for queue in self.listeners.get(message["group"], ()):
+            queue.put_nowait(message["event"])
@@ -0,0 +1,199 @@
+# social_feed/cost.py
+"""
+Static query cost and per-client rate budgets.
+
+Every operation is priced from its document and variables before it runs:
+
+- a field that returns an object costs 1 for each instance it is resolved for;
+  scalars are free,
+- a field with a ``limit`` argument resolves ``limit`` instances of the list
+  under it (directly, or through a page's ``items``), clamped to
+  ``MAX_PAGE_SIZE`` as the resolvers clamp it; a list without its own
+  ``limit`` inherits the nearest enclosing one, else ``GRAPHQL_COST_LIST_SIZE``,
+- nested lists multiply.
+
+``{ globalFeed(limit: 20) { items { author { username } } } }`` costs
+1 + 20 + 20 = 41. Operations above ``GRAPHQL_MAX_COST`` are rejected with
+``QUERY_TOO_COMPLEX``; documents nested deeper than ``GRAPHQL_MAX_DEPTH`` fail
+validation (which is cached per document, unlike the cost, which depends on
+variables).
+
+Accepted operations are charged to a token bucket per client: the verified JWT
+user, or the remote address when anonymous or the token is invalid (so minting
+junk tokens buys no extra budget). A bucket holds ``GRAPHQL_RATE_BUDGET`` cost
+units and refills at ``GRAPHQL_RATE_REFILL`` per second; a client that runs dry
+is answered ``RATE_LIMITED`` (HTTP 429) without touching the database, so one
+heavy client cannot push everyone else's p99 up.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    ValidationRule,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+    is_composite_type,
+    is_list_type,
+    value_from_ast,
+)
+from graphql_jwt.exceptions import JSONWebTokenError
+
+from apps.posts.pagination import clamp_limit
+from . import auth
+
+BUCKET_PREFIX = "ratelimit:"
+
+
+def max_depth():
+    return getattr(settings, "GRAPHQL_MAX_DEPTH", 12)
+
+
+def max_cost():
+    return getattr(settings, "GRAPHQL_MAX_COST", 10000)
+
+
+def default_list_size():
+    return getattr(settings, "GRAPHQL_COST_LIST_SIZE", 20)
+
+
+# -------------------------
+# Cost
+# -------------------------
+def operation_cost(schema, document, operation_name=None, variables=None):
+    """The cost of the operation ``operation_name`` in ``document`` (see the module docstring)."""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0
+    fragments = {d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)}
+    walker = _Walker(schema, fragments, variables or {})
+    return walker.cost(schema.get_root_type(operation.operation), operation.selection_set, 1, None)
+
+
+class _Walker:
+    def __init__(self, schema, fragments, variables):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables
+
+    def cost(self, parent_type, selection_set, instances, size):
+        total = 0
+        for selection in selection_set.selections if selection_set else ():
+            if isinstance(selection, FieldNode):
+                total += self.field_cost(parent_type, selection, instances, size)
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                fragment_type = self.schema.get_type(condition.name.value) if condition else parent_type
+                total += self.cost(fragment_type, selection.selection_set, instances, size)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments[selection.name.value]
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                total += self.cost(fragment_type, fragment.selection_set, instances, size)
+        return total
+
+    def field_cost(self, parent_type, node, instances, size):
+        name = node.name.value
+        field = getattr(parent_type, "fields", {}).get(name)
+        if name.startswith("__") or field is None or not is_composite_type(get_named_type(field.type)):
+            return 0
+
+        limit = self.limit(field, node)
+        if limit is not None:
+            size = limit
+        if is_list_type(get_nullable_type(field.type)):
+            instances *= size or default_list_size()
+        return instances + self.cost(get_named_type(field.type), node.selection_set, instances, size)
+
+    def limit(self, field, node):
+        if "limit" not in field.args:
+            return None
+        argument = next((a for a in node.arguments if a.name.value == "limit"), None)
+        value = value_from_ast(argument.value, field.args["limit"].type, self.variables) if argument else None
+        return clamp_limit(value) if isinstance(value, int) else None
+
+
+def cost_limit_validator(limit, variables=None, operation_name=None, callback=None):
+    """
+    A validation rule rejecting operations that cost more than ``limit``.
+
+    Like ``graphene.validation.depth_limit_validator``; ``callback`` receives
+    the computed cost.
+    """
+
+    class CostLimitValidator(ValidationRule):
+        def __init__(self, context):
+            super().__init__(context)
+            cost = operation_cost(context.schema, context.document, operation_name, variables)
+            if callable(callback):
+                callback(cost)
+            if cost > limit:
+                context.report_error(GraphQLError(
+                    f"Query cost {cost} exceeds the maximum of {limit}",
+                    extensions={"code": "QUERY_TOO_COMPLEX", "cost": cost, "maxCost": limit},
+                ))
+
+    return CostLimitValidator
+
+
+# -------------------------
+# Rate budgets
+# -------------------------
+class TokenBucket:
+    """
+    ``capacity`` units per client, refilled continuously at ``rate`` per second.
+
+    Levels live in the default cache, so every process shares them. The
+    read-modify-write is not atomic: a client's simultaneous requests may
+    spend the same units, which bounds the overshoot to its concurrency.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+
+    def take(self, key, units):
+        """Spend ``units`` from ``key``'s bucket; returns ``0`` or the seconds until they are available."""
+        now = time.time()
+        level, updated = cache.get(BUCKET_PREFIX + key) or (self.capacity, now)
+        level = min(self.capacity, level + (now - updated) * self.rate)
+        if units > level:
+            return (units - level) / self.rate
+        # Untouched buckets expire once they would have refilled completely
+        cache.set(BUCKET_PREFIX + key, (level - units, now), math.ceil(self.capacity / self.rate))
+        return 0
+
+
+def budget():
+    """The configured bucket, or ``None`` when rate budgets are disabled."""
+    capacity = getattr(settings, "GRAPHQL_RATE_BUDGET", 50000)
+    return TokenBucket(capacity, getattr(settings, "GRAPHQL_RATE_REFILL", 1000)) if capacity else None
+
+
+def client_key(request):
+    """
+    The verified JWT user's id, or the remote address for anonymous (or invalid-token) requests.
+
+    Verification is cached per token digest (``auth.verify``), so a client's
+    later requests cost one cache read.
+    """
+    try:
+        verified = auth.verify(request)
+    except JSONWebTokenError:
+        verified = None
+    if verified and verified[1]:
+        return "user:" + str(verified[1]["id"])
+    return "addr:" + request.META.get("REMOTE_ADDR", "")
+
+
+def rate_limited_error(retry_after):
+    return GraphQLError(
+        "Rate limit exceeded, retry later",
+        extensions={"code": "RATE_LIMITED", "retryAfter": math.ceil(retry_after)},
+    )
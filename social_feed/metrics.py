@@ -0,0 +1,80 @@
+# social_feed/metrics.py
+"""
+Process-local counters exposed at ``/metrics`` in the Prometheus text format.
+
+Each worker process keeps its own counts; the scraper aggregates across
+processes, so counters only ever go up. Gauges are computed when scraped from
+the answering process's counters alone: a ratio gauge describes that worker,
+and the fleet-wide ratio is the ratio of the counters summed across workers.
+Counters may carry labels (``incr(name, field="Query.post")``); keep their
+values to a small, fixed set such as schema field names.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+
+HELP = {}
+_gauges = {}
+
+
+def describe(name, text):
+    HELP[name] = text
+
+
+def gauge(name, fn, text=None):
+    """Register ``fn()`` to be reported as ``name``; ``None`` results are skipped."""
+    _gauges[name] = fn
+    if text:
+        describe(name, text)
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    pairs = ",".join(f'{label}="{value}"' for label, value in sorted(labels.items()))
+    return f"{name}{{{pairs}}}"
+
+
+def incr(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += amount
+
+
+def value(name, **labels):
+    return _counters.get(_key(name, labels), 0)
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters)
+
+
+def ratio(hits, misses):
+    """``hits / (hits + misses)`` from two counters, or ``None`` before any traffic."""
+    total = value(hits) + value(misses)
+    return value(hits) / total if total else None
+
+
+def render():
+    lines = []
+    described = set()
+    for key, count in sorted(snapshot().items()):
+        name = key.split("{", 1)[0]
+        if name not in described:
+            described.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{key} {count}")
+    for name, fn in sorted(_gauges.items()):
+        reading = fn()
+        if reading is None:
+            continue
+        if name in HELP:
+            lines.append(f"# HELP {name} {HELP[name]}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {reading}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,169 @@
+# social_feed/replicas.py
+"""
+Read-replica routing for GraphQL operations.
+
+``DATABASE_REPLICAS`` lists database aliases that hold streaming copies of
+``default`` (see ``DATABASE_REPLICA_URLS`` in settings). The GraphQL view
+routes each operation:
+
+- query operations read from one replica, taken round-robin among the healthy
+  ones, for their whole execution (``reading_from`` sets a context variable,
+  which follows ``sync_to_async`` onto the ORM thread, and ``ReplicaRouter``
+  sends reads there),
+- mutations, and everything outside the view (Celery tasks, admin, commands),
+  use ``default``,
+- a client that ran a mutation in the last ``DATABASE_STICKY_SECONDS`` reads
+  from ``default`` too, so it sees its own writes; such requests also bypass
+  the read-through cache (``apps.posts.caching``), which another client may
+  have refilled from a replica that had not caught up yet.
+
+A replica is healthy when it answers, and on PostgreSQL when it replays
+within ``DATABASE_REPLICA_MAX_LAG`` seconds; each process probes a replica at
+most every ``DATABASE_REPLICA_CHECK_SECONDS``. A query that fails on a replica
+which then fails its probe is run again on ``default``.
+"""
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_PREFIX = "primary:"
+PINNED = "pinned"  # the primary, for a client that must read its own writes
+_route = contextvars.ContextVar("db_route", default=None)
+_turn = itertools.count()
+_health = {}  # alias -> (healthy, monotonic time of the last probe)
+_probe_lock = threading.Lock()
+
+
+def aliases():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def sticky_seconds():
+    return getattr(settings, "DATABASE_STICKY_SECONDS", 5)
+
+
+def check_seconds():
+    return getattr(settings, "DATABASE_REPLICA_CHECK_SECONDS", 5)
+
+
+def max_lag():
+    return getattr(settings, "DATABASE_REPLICA_MAX_LAG", 5)
+
+
+# -------------------------
+# Health
+# -------------------------
+_LAG_SQL = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+
+def probe(alias):
+    """Check ``alias`` now and remember the outcome."""
+    try:
+        with connections[alias].cursor() as cursor:
+            if connections[alias].vendor == "postgresql":
+                cursor.execute(_LAG_SQL)
+                lag = float(cursor.fetchone()[0])
+                healthy = lag <= max_lag()
+                if not healthy:
+                    logger.warning("Replica %s is %.1fs behind", alias, lag)
+            else:
+                cursor.execute("SELECT 1")
+                healthy = True
+    except DatabaseError as e:
+        logger.warning("Replica %s is unavailable: %s", alias, e)
+        connections[alias].close()
+        healthy = False
+    _health[alias] = (healthy, time.monotonic())
+    return healthy
+
+
+def is_healthy(alias):
+    state = _health.get(alias)
+    if state is None or time.monotonic() - state[1] >= check_seconds():
+        with _probe_lock:
+            state = _health.get(alias)
+            if state is None or time.monotonic() - state[1] >= check_seconds():
+                return probe(alias)
+    return state[0]
+
+
+# -------------------------
+# Routing
+# -------------------------
+def pin(key):
+    """Send ``key``'s reads to the primary for the next ``DATABASE_STICKY_SECONDS``."""
+    cache.set(PIN_PREFIX + key, 1, sticky_seconds())
+
+
+def choose(key):
+    """
+    The alias a query operation by client ``key`` reads from.
+
+    ``None`` when there are no replicas, ``PINNED`` when the client is pinned,
+    ``default`` when no replica is healthy.
+    """
+    replicas = aliases()
+    if not replicas:
+        return None
+    if cache.get(PIN_PREFIX + key):
+        return PINNED
+    start = next(_turn)
+    for i in range(len(replicas)):
+        alias = replicas[(start + i) % len(replicas)]
+        if is_healthy(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def reading_from(alias):
+    token = _route.set(alias)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+def pinned():
+    """Whether the current operation must read the primary's latest writes."""
+    return _route.get() == PINNED
+
+
+def failed(alias, result):
+    """Whether ``result`` failed because replica ``alias`` went away (it is then marked unhealthy)."""
+    errors = [getattr(e, "original_error", None) for e in result.errors or ()]
+    return any(isinstance(e, DatabaseError) for e in errors) and not probe(alias)
+
+
+class ReplicaRouter:
+    """Reads go where ``reading_from`` points (the primary by default); writes always go to the primary."""
+
+    def db_for_read(self, model, **hints):
+        alias = _route.get()
+        return DEFAULT_DB_ALIAS if alias == PINNED else alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows
+        databases = {DEFAULT_DB_ALIAS, *aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas receive the schema through replication
+        return db not in aliases()
@@ -1,15 +1,19 @@
 import graphene
 from apps.accounts.schema import AuthQuery, AuthMutations
-from apps.posts.schema import Query as PostsQuery, PostMutations
-from apps.social.schema import FollowQuery, FollowMutations
+from apps.posts.schema import Query as PostsQuery, PostMutations, PostSubscriptions
+from apps.social.schema import FollowQuery, FollowMutations, NotificationQuery, NotificationMutations
 
 
-class Query(AuthQuery, PostsQuery, FollowQuery, graphene.ObjectType):
+class Query(AuthQuery, PostsQuery, FollowQuery, NotificationQuery, graphene.ObjectType):
     pass
 
 
-class Mutation(AuthMutations, PostMutations, FollowMutations, graphene.ObjectType):
+class Mutation(AuthMutations, PostMutations, FollowMutations, NotificationMutations, graphene.ObjectType):
     pass
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+class Subscription(PostSubscriptions, graphene.ObjectType):
+    pass
+
+
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
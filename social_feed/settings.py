@@ -85,17 +85,110 @@ WSGI_APPLICATION = 'social_feed.wsgi.application'
 # Database
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-DATABASES = {
-    "default": dj_database_url.parse(
-        DATABASE_URL,
-        ssl_require=False
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds and checked before
+# reuse. DATABASE_POOL=true switches to Django's native pool instead (psycopg 3
+# only: pip install "psycopg[binary,pool]"), the better fit for ASGI workers,
+# whose requests do not keep a thread of their own.
+DATABASE_CONN_MAX_AGE = int(os.getenv("DATABASE_CONN_MAX_AGE", "60"))
+DATABASE_POOL = os.getenv("DATABASE_POOL", "false").lower() in ("1", "true", "yes")
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "2"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "10"))
+# Statement timeouts in milliseconds (PostgreSQL; 0 disables): the connection
+# default, which bounds Celery tasks, the admin and commands, and the values
+# GraphQL queries and mutations run with (see social_feed/timeouts.py)
+DATABASE_STATEMENT_TIMEOUT_MS = int(os.getenv("DATABASE_STATEMENT_TIMEOUT_MS", "30000"))
+GRAPHQL_QUERY_STATEMENT_TIMEOUT_MS = int(os.getenv("GRAPHQL_QUERY_STATEMENT_TIMEOUT_MS", "5000"))
+GRAPHQL_MUTATION_STATEMENT_TIMEOUT_MS = int(os.getenv("GRAPHQL_MUTATION_STATEMENT_TIMEOUT_MS", "10000"))
+
+
+def _database(url):
+    config = dj_database_url.parse(
+        url,
+        conn_max_age=0 if DATABASE_POOL else DATABASE_CONN_MAX_AGE,
+        conn_health_checks=not DATABASE_POOL,
+        ssl_require=False,
     )
-}
-
-# Force SSL manually
-DATABASES["default"]["OPTIONS"] = {
-    "sslmode": "require",
-    "options": "-c enable_ipv6=off",
+    if config["ENGINE"] == "django.db.backends.postgresql":
+        options = "-c enable_ipv6=off"
+        if DATABASE_STATEMENT_TIMEOUT_MS:
+            options += f" -c statement_timeout={DATABASE_STATEMENT_TIMEOUT_MS}"
+        # Force SSL manually
+        config["OPTIONS"] = {**config.get("OPTIONS", {}), "sslmode": "require", "options": options}
+        if DATABASE_POOL:
+            config["OPTIONS"]["pool"] = {
+                "min_size": DATABASE_POOL_MIN_SIZE,
+                "max_size": DATABASE_POOL_MAX_SIZE,
+                "timeout": DATABASE_POOL_TIMEOUT,
+            }
+    return config
+
+
+DATABASES = {"default": _database(DATABASE_URL)}
+
+# Read replicas (comma-separated URLs): GraphQL query operations read from them
+# round-robin (see social_feed/replicas.py); tests read them from `default`
+DATABASE_REPLICAS = []
+for _i, _url in enumerate(filter(None, os.getenv("DATABASE_REPLICA_URLS", "").split(",")), 1):
+    DATABASES[f"replica{_i}"] = {**_database(_url.strip()), "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(f"replica{_i}")
+
+DATABASE_ROUTERS = ["social_feed.replicas.ReplicaRouter"]
+# After a mutation its client reads from the primary for this long (read-your-writes)
+DATABASE_STICKY_SECONDS = float(os.getenv("DATABASE_STICKY_SECONDS", "5"))
+# Replicas are probed at most this often per process, and skipped when further behind
+DATABASE_REPLICA_CHECK_SECONDS = float(os.getenv("DATABASE_REPLICA_CHECK_SECONDS", "5"))
+DATABASE_REPLICA_MAX_LAG = float(os.getenv("DATABASE_REPLICA_MAX_LAG", "5"))
+
+# Cache: Redis in production (REDIS_URL), process-local memory otherwise
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Channel layer for GraphQL subscriptions: Redis pub/sub across processes in
+# production, in-process memory for local work and tests
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+            "CONFIG": {"hosts": [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        }
+    }
+
+# Celery: mutations enqueue follow-on work on commit. Without a broker (local
+# work, tests) tasks run eagerly in-process right after the commit.
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL or "memory://")
+CELERY_TASK_ALWAYS_EAGER = os.getenv(
+    "CELERY_TASK_ALWAYS_EAGER", str(CELERY_BROKER_URL == "memory://")
+).lower() in ("1", "true", "yes")
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_SERIALIZER = "json"
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-post-counters": {"task": "apps.posts.tasks.reconcile_post_counters", "schedule": 60 * 60},
+    "reconcile-follow-counters": {"task": "apps.social.tasks.reconcile_follow_counters", "schedule": 60 * 60},
+    "flush-notifications": {
+        "task": "apps.social.tasks.flush_notifications",
+        "schedule": float(os.getenv("NOTIFICATIONS_FLUSH_SECONDS", "5")),
+    },
 }
 
 # Password validation
@@ -144,10 +237,55 @@ AUTH_USER_MODEL = "accounts.User"
 GRAPHENE = {
     "SCHEMA": "social_feed.schema.schema",
     "MIDDLEWARE": [
-        "graphql_jwt.middleware.JSONWebTokenMiddleware",
+        # JWTs are handled by the view, once per request (see social_feed/auth.py)
+        "social_feed.tracing.TracingMiddleware",
     ],
 }
 
+# Home timeline: authors with at least this many followers are merged in at read
+# time (fan-out-on-read) instead of being pushed into every follower's timeline.
+FEED_FANOUT_THRESHOLD = int(os.getenv("FEED_FANOUT_THRESHOLD", "10000"))
+# Number of recent posts copied into a timeline when a user follows someone
+FEED_BACKFILL_LIMIT = int(os.getenv("FEED_BACKFILL_LIMIT", "200"))
+# Feed `total` is an approximate COUNT reused for this many seconds
+FEED_TOTAL_CACHE_SECONDS = int(os.getenv("FEED_TOTAL_CACHE_SECONDS", "60"))
+# Read-through cache lifetimes (see apps/posts/caching.py). Mutations invalidate
+# entries immediately; the TTL bounds how stale engagement counters can get.
+POST_CACHE_SECONDS = int(os.getenv("POST_CACHE_SECONDS", "30"))
+FEED_CACHE_SECONDS = int(os.getenv("FEED_CACHE_SECONDS", "10"))
+# Engagement subscriptions send at most one message per post per interval
+REALTIME_COALESCE_SECONDS = float(os.getenv("REALTIME_COALESCE_SECONDS", "1"))
+# Parsed and validated GraphQL documents kept per process, keyed by SHA-256
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.getenv("GRAPHQL_DOCUMENT_CACHE_SIZE", "500"))
+# Persisted query registrations expire after this long (clients re-register on a
+# miss); larger documents still run but are not registered
+GRAPHQL_PERSISTED_QUERY_TTL = int(os.getenv("GRAPHQL_PERSISTED_QUERY_TTL", "86400"))
+GRAPHQL_PERSISTED_QUERY_MAX_BYTES = int(os.getenv("GRAPHQL_PERSISTED_QUERY_MAX_BYTES", "16384"))
+# Verified JWT claims and user snapshots are cached this long (capped by the token's expiry)
+GRAPHQL_AUTH_CACHE_SECONDS = int(os.getenv("GRAPHQL_AUTH_CACHE_SECONDS", "60"))
+# Query cost limits and per-client rate budgets (see social_feed/cost.py)
+GRAPHQL_MAX_DEPTH = int(os.getenv("GRAPHQL_MAX_DEPTH", "12"))
+GRAPHQL_MAX_COST = int(os.getenv("GRAPHQL_MAX_COST", "10000"))
+GRAPHQL_COST_LIST_SIZE = int(os.getenv("GRAPHQL_COST_LIST_SIZE", "20"))
+# Cost units a client may spend in a burst (0 disables budgets), and their refill per second
+GRAPHQL_RATE_BUDGET = int(os.getenv("GRAPHQL_RATE_BUDGET", "50000"))
+GRAPHQL_RATE_REFILL = float(os.getenv("GRAPHQL_RATE_REFILL", "1000"))
+# Share of requests traced per resolver and SQL statement (see social_feed/tracing.py),
+# and whether clients may ask for the trace in `extensions.tracing`
+GRAPHQL_TRACE_SAMPLE_RATE = float(os.getenv("GRAPHQL_TRACE_SAMPLE_RATE", "0.01"))
+GRAPHQL_TRACE_DUPLICATE_THRESHOLD = int(os.getenv("GRAPHQL_TRACE_DUPLICATE_THRESHOLD", "3"))
+GRAPHQL_TRACING_RESPONSE = os.getenv("GRAPHQL_TRACING_RESPONSE", str(DEBUG)).lower() in ("1", "true", "yes")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "social_feed.tracing": {"handlers": ["console"], "level": os.getenv("GRAPHQL_TRACE_LOG_LEVEL", "INFO")},
+        "social_feed.replicas": {"handlers": ["console"], "level": "WARNING"},
+    },
+}
+
 AUTHENTICATION_BACKENDS = [
     "graphql_jwt.backends.JSONWebTokenBackend",
     "django.contrib.auth.backends.ModelBackend",
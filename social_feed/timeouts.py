@@ -0,0 +1,139 @@
+# social_feed/timeouts.py
+"""
+Statement timeouts per GraphQL operation type (PostgreSQL).
+
+Connections start with ``DATABASE_STATEMENT_TIMEOUT_MS`` (passed in the
+connection ``options``), which bounds Celery tasks, the admin and commands.
+The GraphQL view narrows it for the duration of each operation: query
+operations get ``GRAPHQL_QUERY_STATEMENT_TIMEOUT_MS``, mutations
+``GRAPHQL_MUTATION_STATEMENT_TIMEOUT_MS`` (0 keeps the connection default).
+
+The value is set with a session-level ``SET`` outside any transaction (once
+per connection per operation, however many statements follow) and undone
+with ``RESET`` when the operation ends, so a persistent or pooled connection
+goes back to the connection default before anything else (another view, a
+pooled checkout) runs on it. Connections opened during the operation get the
+value as they connect. Async views use ``ascope``, which resets on the ORM
+thread.
+"""
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from graphql import OperationType
+
+_wanted = contextvars.ContextVar("statement_timeout", default=None)
+
+
+def connection_default():
+    return getattr(settings, "DATABASE_STATEMENT_TIMEOUT_MS", 0)
+
+
+def for_operation(operation_type):
+    if operation_type == OperationType.MUTATION:
+        return getattr(settings, "GRAPHQL_MUTATION_STATEMENT_TIMEOUT_MS", 0)
+    return getattr(settings, "GRAPHQL_QUERY_STATEMENT_TIMEOUT_MS", 0)
+
+
+@contextmanager
+def scope(operation_type):
+    """Statements of the current operation should run with its timeout (see ``apply``) until it ends."""
+    token = _wanted.set(for_operation(operation_type) or None)
+    try:
+        yield
+    finally:
+        _wanted.reset(token)
+        restore()
+
+
+@asynccontextmanager
+async def ascope(operation_type):
+    """``scope`` for async views."""
+    token = _wanted.set(for_operation(operation_type) or None)
+    try:
+        yield
+    finally:
+        _wanted.reset(token)
+        if narrowed():
+            await sync_to_async(restore)()
+
+
+def _stale(connection, ms):
+    return (
+        connection.vendor == "postgresql"
+        and connection.connection is not None
+        and not connection.in_atomic_block
+        and getattr(connection, "_statement_timeout", None) != (connection.connection, ms)
+    )
+
+
+def _narrowed(connection):
+    current = getattr(connection, "_statement_timeout", None)
+    return (
+        connection.vendor == "postgresql"
+        and current is not None
+        and current[0] is connection.connection
+        and connection.connection is not None
+        and not connection.in_atomic_block
+        and current[1] != (connection_default() or None)
+    )
+
+
+def _set(connection, ms):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET statement_timeout = {int(ms)}")
+    # Keyed by the DB-API connection, so a reconnect is noticed
+    connection._statement_timeout = (connection.connection, ms)
+
+
+def pending():
+    """Whether an open connection still needs the current operation's timeout (no database access)."""
+    ms = _wanted.get()
+    return ms is not None and any(_stale(c, ms) for c in connections.all(initialized_only=True))
+
+
+def apply():
+    """Set the current operation's timeout on this thread's open connections that lack it."""
+    ms = _wanted.get()
+    if ms is None:
+        return
+    for connection in connections.all(initialized_only=True):
+        if _stale(connection, ms):
+            _set(connection, ms)
+
+
+def narrowed():
+    """Whether an open connection still runs with an operation's timeout (no database access)."""
+    return any(_narrowed(c) for c in connections.all(initialized_only=True))
+
+
+def restore():
+    """Put this thread's connections back to the connection default (``RESET statement_timeout``)."""
+    for connection in connections.all(initialized_only=True):
+        if not _narrowed(connection):
+            continue
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("RESET statement_timeout")
+        except DatabaseError:
+            # A session we cannot reset must not be reused with the narrower timeout
+            connection.close()
+            continue
+        connection._statement_timeout = (connection.connection, connection_default() or None)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    if connection.vendor != "postgresql":
+        return
+    if not connection.settings_dict["OPTIONS"].get("pool"):
+        # A new session starts from the `options` default
+        connection._statement_timeout = (connection.connection, connection_default() or None)
+    ms = _wanted.get()
+    if ms is not None and _stale(connection, ms):
+        _set(connection, ms)
+
+
+connection_created.connect(_on_connection_created)
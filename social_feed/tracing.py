@@ -0,0 +1,242 @@
+# social_feed/tracing.py
+"""
+Per-request resolver and SQL instrumentation.
+
+A sampled request (``GRAPHQL_TRACE_SAMPLE_RATE``) carries a ``Trace`` in a
+context variable for its whole execution:
+
+- ``TracingMiddleware`` times every resolver and marks it as the current field,
+- a database execute wrapper, installed on every connection, times each
+  statement and charges it to the current field (context variables follow
+  ``sync_to_async`` onto the ORM thread, so this holds under ASGI too),
+- statements that run three or more times (``GRAPHQL_TRACE_DUPLICATE_THRESHOLD``)
+  with the same shape are reported as duplicates, the usual sign of an N+1.
+
+When the request finishes, the totals per field (``ParentType.field``) are
+added to labelled counters at ``/metrics``, and a JSON summary is logged to
+``social_feed.tracing`` (at WARNING when it found duplicates). Clients may send
+``extensions: {"tracing": true}`` to get the summary back as
+``extensions.tracing``; that also forces sampling, so it is honoured only when
+``GRAPHQL_TRACING_RESPONSE`` is on (default: ``DEBUG``).
+
+Unsampled requests pay one context variable lookup per field and per
+statement.
+"""
+import contextvars
+import inspect
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_trace = contextvars.ContextVar("graphql_trace", default=None)
+_field = contextvars.ContextVar("graphql_trace_field", default=None)
+
+# `IN (%s, %s, ...)` lists differ only by batch size; compare statements without them
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+metrics.describe("graphql_traced_requests_total", "Requests sampled for tracing")
+metrics.describe("graphql_field_calls_total", "Resolver calls in sampled requests, by field")
+metrics.describe("graphql_field_seconds_total", "Resolver time in sampled requests, by field")
+metrics.describe("graphql_field_sql_queries_total", "SQL statements run by resolvers in sampled requests, by field")
+metrics.describe("graphql_field_sql_seconds_total", "SQL time of resolvers in sampled requests, by field")
+metrics.describe("graphql_duplicate_queries_total", "Repeated statements (likely N+1) in sampled requests, by field")
+
+
+def sample_rate():
+    return getattr(settings, "GRAPHQL_TRACE_SAMPLE_RATE", 0.01)
+
+
+def duplicate_threshold():
+    return getattr(settings, "GRAPHQL_TRACE_DUPLICATE_THRESHOLD", 3)
+
+
+def response_enabled():
+    return getattr(settings, "GRAPHQL_TRACING_RESPONSE", settings.DEBUG)
+
+
+class FieldStats:
+    __slots__ = ("calls", "seconds", "sql_queries", "sql_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+
+
+class Trace:
+    def __init__(self, operation_name=None, respond=False):
+        self.operation_name = operation_name
+        self.respond = respond
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.fields = defaultdict(FieldStats)
+        self.statements = Counter()
+        self.statement_fields = defaultdict(set)
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        # Resolvers and statements run on other threads under ASGI
+        self.lock = threading.Lock()
+
+    def add_field(self, field, seconds):
+        with self.lock:
+            stats = self.fields[field]
+            stats.calls += 1
+            stats.seconds += seconds
+
+    def add_query(self, field, sql, seconds):
+        shape = _IN_LIST.sub("IN (...)", sql)
+        with self.lock:
+            self.sql_queries += 1
+            self.sql_seconds += seconds
+            self.statements[shape] += 1
+            self.statement_fields[shape].add(field)
+            if field is not None:
+                stats = self.fields[field]
+                stats.sql_queries += 1
+                stats.sql_seconds += seconds
+
+    def duplicates(self):
+        threshold = duplicate_threshold()
+        return [
+            {"sql": sql, "count": count, "fields": sorted(f or "(request)" for f in self.statement_fields[sql])}
+            for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def summary(self):
+        fields = sorted(self.fields.items(), key=lambda item: item[1].seconds, reverse=True)
+        return {
+            "operation": self.operation_name,
+            "durationMs": round(self.duration * 1000, 3),
+            "sql": {"count": self.sql_queries, "durationMs": round(self.sql_seconds * 1000, 3)},
+            "fields": [
+                {
+                    "field": field,
+                    "calls": stats.calls,
+                    "durationMs": round(stats.seconds * 1000, 3),
+                    "sqlCount": stats.sql_queries,
+                    "sqlMs": round(stats.sql_seconds * 1000, 3),
+                }
+                for field, stats in fields
+            ],
+            "duplicates": self.duplicates(),
+        }
+
+
+# -------------------------
+# Request lifecycle (called by social_feed.views)
+# -------------------------
+def start(extensions, operation_name=None):
+    """A ``Trace`` if this request is sampled, else ``None``."""
+    respond = bool(extensions.get("tracing")) and response_enabled()
+    if not respond and random.random() >= sample_rate():
+        return None
+    return Trace(operation_name, respond)
+
+
+def activate(trace):
+    """Make ``trace`` current; pass the returned token to ``deactivate``."""
+    return _trace.set(trace)
+
+
+def deactivate(token):
+    _trace.reset(token)
+
+
+def finish(trace, result):
+    """Report ``trace`` and attach ``extensions.tracing`` to ``result`` when asked for."""
+    if trace is None:
+        return result
+    trace.duration = time.perf_counter() - trace.started
+    summary = trace.summary()
+
+    metrics.incr("graphql_traced_requests_total")
+    for field, stats in trace.fields.items():
+        metrics.incr("graphql_field_calls_total", stats.calls, field=field)
+        metrics.incr("graphql_field_seconds_total", stats.seconds, field=field)
+        if stats.sql_queries:
+            metrics.incr("graphql_field_sql_queries_total", stats.sql_queries, field=field)
+            metrics.incr("graphql_field_sql_seconds_total", stats.sql_seconds, field=field)
+    for duplicate in summary["duplicates"]:
+        for field in duplicate["fields"]:
+            metrics.incr("graphql_duplicate_queries_total", field=field)
+
+    logger.log(logging.WARNING if summary["duplicates"] else logging.INFO, json.dumps(summary))
+    if trace.respond and result is not None:
+        result.extensions = {**(result.extensions or {}), "tracing": summary}
+    return result
+
+
+# -------------------------
+# Resolvers
+# -------------------------
+class TracingMiddleware:
+    """Times resolvers of traced requests and charges their SQL to them."""
+
+    def resolve(self, next, root, info, **kwargs):
+        trace = _trace.get()
+        if trace is None:
+            return next(root, info, **kwargs)
+
+        field = f"{info.parent_type.name}.{info.field_name}"
+        token = _field.set(field)
+        started = time.perf_counter()
+        try:
+            result = next(root, info, **kwargs)
+        finally:
+            _field.reset(token)
+        if inspect.isawaitable(result):
+            return self._await(trace, field, started, result)
+        trace.add_field(field, time.perf_counter() - started)
+        return result
+
+    @staticmethod
+    async def _await(trace, field, started, result):
+        token = _field.set(field)
+        try:
+            return await result
+        finally:
+            _field.reset(token)
+            trace.add_field(field, time.perf_counter() - started)
+
+
+# -------------------------
+# SQL
+# -------------------------
+def _record_query(execute, sql, params, many, context):
+    trace = _trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.add_query(_field.get(), sql, time.perf_counter() - started)
+
+
+def install(connection):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_on_connection_created)
+# Connections opened before this module was imported
+for _connection in connections.all(initialized_only=True):
+    install(_connection)
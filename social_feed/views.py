@@ -0,0 +1,453 @@
+# social_feed/views.py
+"""
+GraphQL endpoint with automatic persisted queries and a parsed-document cache.
+
+Clients send ``extensions.persistedQuery.sha256Hash`` (Apollo APQ protocol).
+A hash the server has not seen yet is answered with ``PersistedQueryNotFound``;
+the client then retries once with the full query, which is registered under its
+hash. From then on requests carry only the hash and variables. Registrations
+expire after ``GRAPHQL_PERSISTED_QUERY_TTL`` seconds, and documents over
+``GRAPHQL_PERSISTED_QUERY_MAX_BYTES`` are run without being registered, so
+anonymous clients cannot grow the shared cache without bound.
+
+Every document, persisted or not, is parsed and validated once per process and
+kept in an LRU keyed by its SHA-256, so the hot path skips lexing, parsing and
+validation entirely. JWTs are verified once per request, and the user row is
+loaded only when a resolver needs more than its id and flags (see
+``social_feed.auth``). Each operation is then priced against its variables and
+charged to the client's rate budget before it runs (see ``social_feed.cost``).
+Query operations read from a replica when replicas are configured (see
+``social_feed.replicas``), and each operation type runs under its own
+statement timeout (see ``social_feed.timeouts``). A sample of requests is traced per resolver and SQL
+statement (see ``social_feed.tracing``).
+
+``AsyncFeedGraphQLView`` serves the same endpoint under ASGI with async
+execution; WSGI deployments keep using ``FeedGraphQLView``.
+"""
+import hashlib
+import inspect
+import json
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed
+from django.views.generic import View
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphene.validation import depth_limit_validator
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, parse, specified_rules, validate
+from graphql.type import validate_schema
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_http_authorization
+
+from apps.posts.aio import SyncMutationMiddleware
+from . import auth, cost, metrics, replicas, timeouts, tracing
+
+PERSISTED_QUERY_PREFIX = "apq:"
+
+metrics.describe("graphql_document_cache_hits_total", "Documents served from the parsed-document cache")
+metrics.describe("graphql_document_cache_misses_total", "Documents parsed and validated")
+metrics.describe("graphql_persisted_query_hits_total", "Hash-only requests whose document was loaded from the registry")
+metrics.describe("graphql_persisted_query_misses_total", "Hash-only requests answered with PersistedQueryNotFound")
+metrics.describe("graphql_cost_rejections_total", "Operations rejected for exceeding GRAPHQL_MAX_COST")
+metrics.describe("graphql_rate_limited_total", "Operations rejected because the client's rate budget was spent")
+metrics.gauge(
+    "graphql_document_cache_hit_ratio",
+    lambda: metrics.ratio("graphql_document_cache_hits_total", "graphql_document_cache_misses_total"),
+    "Share of this worker's requests that skipped parsing and validation",
+)
+
+
+class DocumentCache:
+    """Thread-safe LRU of ``sha256 -> (document, validation_errors)``."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def persisted_query_ttl():
+    return getattr(settings, "GRAPHQL_PERSISTED_QUERY_TTL", 86400)
+
+
+def persisted_query_max_bytes():
+    return getattr(settings, "GRAPHQL_PERSISTED_QUERY_MAX_BYTES", 16384)
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def _persisted_error(message, code):
+    return GraphQLError(message, extensions={"code": code})
+
+
+class Answer(Exception):
+    """Short-circuits request preparation with a ready ``ExecutionResult`` (or ``None``)."""
+
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+
+
+class FeedGraphQLView(GraphQLView):
+    documents = DocumentCache(getattr(settings, "GRAPHQL_DOCUMENT_CACHE_SIZE", 500))
+    validation_rules = (*specified_rules, depth_limit_validator(cost.max_depth()))
+
+    @staticmethod
+    def get_extensions(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions or {}
+
+    # -------------------------
+    # Persisted queries
+    # -------------------------
+    def resolve_persisted(self, request, data, query):
+        """
+        Return ``(query, digest)`` for the request.
+
+        ``query`` is ``None`` when the client sent only a hash; the document is
+        then looked up by ``get_document``.
+        """
+        persisted = self.get_extensions(request, data).get("persistedQuery")
+        if not persisted:
+            return query, (query_hash(query) if query else None)
+
+        digest = persisted.get("sha256Hash")
+        if persisted.get("version") != 1 or not digest:
+            raise _persisted_error("Unsupported persisted query version", "PERSISTED_QUERY_NOT_SUPPORTED")
+
+        if query:
+            if query_hash(query) != digest:
+                raise _persisted_error("provided sha does not match query", "INVALID_PERSISTED_QUERY")
+            if len(query.encode()) <= persisted_query_max_bytes():
+                cache.set(PERSISTED_QUERY_PREFIX + digest, query, persisted_query_ttl())
+        return query, digest
+
+    # -------------------------
+    # Parsing and validation
+    # -------------------------
+    def get_document(self, schema, query, digest):
+        """Return ``(document, validation_errors)`` from the cache, parsing on a miss."""
+        entry = self.documents.get(digest)
+        if entry is not None:
+            metrics.incr("graphql_document_cache_hits_total")
+            return entry
+
+        if query is None:
+            query = cache.get(PERSISTED_QUERY_PREFIX + digest)
+            if query is None:
+                metrics.incr("graphql_persisted_query_misses_total")
+                raise _persisted_error("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+            metrics.incr("graphql_persisted_query_hits_total")
+
+        metrics.incr("graphql_document_cache_misses_total")
+        document = parse(query)
+        errors = validate(schema, document, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+        entry = (document, errors)
+        self.documents.put(digest, entry)
+        return entry
+
+    # -------------------------
+    # Cost and rate budgets
+    # -------------------------
+    def charge(self, request, schema, document, variables, operation_name):
+        """Reject the operation (``Answer``) if it is too expensive or the client's budget is spent."""
+        costs = []
+        rule = cost.cost_limit_validator(cost.max_cost(), variables, operation_name, costs.append)
+        errors = validate(schema, document, [rule])
+        if errors:
+            metrics.incr("graphql_cost_rejections_total")
+            raise Answer(ExecutionResult(data=None, errors=errors))
+
+        bucket = cost.budget()
+        retry_after = bucket.take(cost.client_key(request), max(costs[0], 1)) if bucket else 0
+        if retry_after:
+            metrics.incr("graphql_rate_limited_total")
+            raise Answer(ExecutionResult(data=None, errors=[cost.rate_limited_error(retry_after)]))
+
+    # -------------------------
+    # Execution
+    # -------------------------
+    def prepare_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """Return ``(schema, document, operation_ast)``, or raise ``Answer`` to reply early."""
+        auth.authenticate(request)
+        try:
+            query, digest = self.resolve_persisted(request, data, query)
+        except GraphQLError as e:
+            raise Answer(ExecutionResult(data=None, errors=[e]))
+        if not digest:
+            if show_graphiql:
+                raise Answer(None)
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            raise Answer(ExecutionResult(data=None, errors=schema_validation_errors))
+
+        try:
+            document, validation_errors = self.get_document(schema, query, digest)
+        except Exception as e:
+            raise Answer(ExecutionResult(errors=[e]))
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                raise Answer(None)
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    f"Can only perform a {operation_ast.operation.value} operation from a POST request.",
+                )
+            )
+
+        if validation_errors:
+            raise Answer(ExecutionResult(data=None, errors=validation_errors))
+        self.charge(request, schema, document, variables, operation_name)
+        return schema, document, operation_ast
+
+    def get_execute_options(self, request, variables, operation_name):
+        options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            options["execution_context_class"] = self.execution_context_class
+        return options
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        try:
+            schema, document, operation_ast = self.prepare_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+        except Answer as answer:
+            return answer.result
+
+        with timeouts.scope(operation_ast.operation if operation_ast is not None else None):
+            try:
+                timeouts.apply()
+                execute_options = self.get_execute_options(request, variables, operation_name)
+
+                if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+                    try:
+                        return self.execute_mutation(request, schema, document, execute_options)
+                    finally:
+                        self.pin(request)
+
+                route = self.route(request, operation_ast)
+                if route is not None:
+                    with replicas.reading_from(route):
+                        result = execute(schema, document, **execute_options)
+                    if not replicas.failed(route, result):
+                        return result
+                return execute(schema, document, **execute_options)
+            except Exception as e:
+                return ExecutionResult(errors=[e])
+
+    @staticmethod
+    def execute_mutation(request, schema, document, execute_options):
+        if (
+            graphene_settings.ATOMIC_MUTATIONS is True
+            or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+        ):
+            with transaction.atomic():
+                result = execute(schema, document, **execute_options)
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                    transaction.set_rollback(True)
+            return result
+        return execute(schema, document, **execute_options)
+
+    @staticmethod
+    def pin(request):
+        """Keep the client on the primary after a mutation, so it reads its own writes."""
+        if replicas.aliases():
+            replicas.pin(cost.client_key(request))
+
+    @staticmethod
+    def route(request, operation_ast):
+        """The database alias a query operation reads from, or ``None`` for the default routing."""
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY or not replicas.aliases():
+            return None
+        return replicas.choose(cost.client_key(request))
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        trace = tracing.start(self.get_extensions(request, data), operation_name)
+        token = tracing.activate(trace)
+        try:
+            result = self.execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        finally:
+            tracing.deactivate(token)
+        result = tracing.finish(trace, result)
+        return self.build_response(request, result, id, show_graphiql)
+
+    def build_response(self, request, execution_result, id=None, show_graphiql=False):
+        """Encode ``execution_result`` as ``(body, status)`` the way ``GraphQLView`` does."""
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        if not execution_result:
+            return None, 200
+
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            set_rollback()
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(not getattr(e, "path", None) for e in execution_result.errors):
+            status_code = 429 if _rate_limited(execution_result) else 400
+        else:
+            response["data"] = execution_result.data
+
+        if execution_result.extensions:
+            response["extensions"] = execution_result.extensions
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+
+def _rate_limited(execution_result):
+    return any((getattr(e, "extensions", None) or {}).get("code") == "RATE_LIMITED" for e in execution_result.errors)
+
+
+class AsyncFeedGraphQLView(FeedGraphQLView):
+    """
+    ASGI variant of ``FeedGraphQLView``, mounted by ``social_feed.asgi``.
+
+    Resolvers return awaitables when ``context.is_async`` is set (see
+    ``apps.posts.aio``), so independent root fields are awaited concurrently and
+    a slow query suspends the request instead of blocking a worker. Mutations
+    run on the request's ORM thread; ``ATOMIC_MUTATIONS`` is not supported here.
+    """
+
+    dispatch = View.dispatch
+
+    def get_middleware(self, request):
+        return [*self.middleware, SyncMutationMiddleware()]
+
+    async def get(self, request, *args, **kwargs):
+        data = self.parse_body(request)
+        if self.graphiql and self.can_display_graphiql(request, data):
+            return await sync_to_async(FeedGraphQLView.dispatch)(self, request, *args, **kwargs)
+
+        try:
+            result, status_code = await self.get_response_async(request, data)
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+        return HttpResponse(status=status_code, content=result, content_type="application/json")
+
+    post = get
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        trace = tracing.start(self.get_extensions(request, data), operation_name)
+        token = tracing.activate(trace)
+        try:
+            result = await self.execute_graphql_request_async(request, data, query, variables, operation_name)
+        finally:
+            tracing.deactivate(token)
+        result = tracing.finish(trace, result)
+        return self.build_response(request, result, id)
+
+    async def execute_graphql_request_async(self, request, data, query, variables, operation_name):
+        await self.authenticate(request)
+        try:
+            schema, document, operation_ast = self.prepare_request(request, data, query, variables, operation_name)
+        except Answer as answer:
+            return answer.result
+
+        async with timeouts.ascope(operation_ast.operation if operation_ast is not None else None):
+            try:
+                request.is_async = True
+                if timeouts.pending():
+                    await sync_to_async(timeouts.apply)()
+                execute_options = self.get_execute_options(request, variables, operation_name)
+                if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+                    try:
+                        return await self.execute_async(schema, document, execute_options)
+                    finally:
+                        self.pin(request)
+
+                # Choosing may probe a replica, so it runs on the ORM thread
+                route = await sync_to_async(self.route)(request, operation_ast) if replicas.aliases() else None
+                if route is not None:
+                    with replicas.reading_from(route):
+                        result = await self.execute_async(schema, document, execute_options)
+                    if not await sync_to_async(replicas.failed)(route, result):
+                        return result
+                return await self.execute_async(schema, document, execute_options)
+            except Exception as e:
+                return ExecutionResult(errors=[e])
+
+    @staticmethod
+    async def execute_async(schema, document, execute_options):
+        result = execute(schema, document, **execute_options)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def authenticate(self, request):
+        if get_http_authorization(request) is None:
+            request.user = await request.auser()
+            return
+        # Verify off the event loop (a cold token reads the user row); resolvers
+        # then answer from the snapshot, and the full row only loads in mutations
+        auth.authenticate(request)
+        try:
+            await sync_to_async(auth.verify)(request)
+        except JSONWebTokenError:
+            pass  # raised again by the first resolver that reads the user
+
+
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")